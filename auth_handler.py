@@ -1,10 +1,16 @@
+import asyncio
 import models
+import os
+import time
 
+from cache import TTLCache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Depends
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 SECRET_KEY = "9ed8cd9c50055d34a34af36279d3cd608c0341b588af37388be37039eb699ac4"
@@ -12,7 +18,28 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# every extra round doubles the time bcrypt takes, hashes made with
+# other rounds are still verified
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=int(os.environ.get("BCRYPT_ROUNDS", 12)),
+)
+
+# bcrypt runs here instead of on the event loop, it releases the GIL
+# so up to PASSWORD_HASH_WORKERS hashes run in parallel while other
+# requests are served, more logins than that wait for a free thread
+password_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)),
+    thread_name_prefix="bcrypt",
+)
+
+# users of tokens verified against the users table, a token
+# is dropped when it expires even if AUTH_CACHE_TTL hasn't passed
+token_cache = TTLCache(
+    maxsize=int(os.environ.get("AUTH_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", 60)),
+)
 
 
 def verify_password(plain_password, hashed_password):
@@ -23,11 +50,32 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(models.Users).filter_by(username=username).first()
+async def verify_password_async(plain_password, hashed_password):
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password):
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, get_password_hash, password
+    )
+
+
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(models.Users).filter_by(username=username))
+    return result.scalars().first()
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.password):
+    # logins can wait a while for a bcrypt thread, give the connection
+    # back to the pool meanwhile instead of starving the other routes
+    db.expunge(user)
+    await db.rollback()
+    if not await verify_password_async(password, user.password):
         return False
     return user
 
@@ -40,12 +88,15 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
-def get_current_user(db: Session, token: str):
+async def get_current_user(db: AsyncSession, token: str):
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    user = token_cache.get(token)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -53,7 +104,18 @@ def get_current_user(db: Session, token: str):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.Users).filter_by(username=username).first()
+    user = await get_user(db, username)
     if user is None:
         raise credentials_exception
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        token_cache.set(token, user, ttl=min(token_cache.ttl, expires_in))
     return user
+
+
+def revoke_user_tokens(username: str):
+    """
+    Forget the verified tokens of the user, call when the user is removed
+    or changes password so the next request checks the users table again
+    """
+    return token_cache.pop_matching(lambda token, user: user.username == username)
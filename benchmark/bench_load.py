@@ -0,0 +1,203 @@
+"""
+Load benchmark of the read routes against a seeded sqlite database
+
+Starts the app with uvicorn in a separate process and reports
+throughput and latency of /list and /single per number of
+concurrent clients. sqlite runs one query at a time, pass
+--database-url of a MySQL database to see how the routes scale
+when queries wait on the network
+
+run from the root of the repo:
+python -m benchmark.bench_load --movies 10000 --concurrency 1 4 16 64
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmark.omdb_stub import movie_for
+from datetime import datetime
+
+
+def movie_rows(count):
+    """
+    Deterministic rows for the movie table
+    """
+    for number in range(1, count + 1):
+        movie = movie_for("tt%07d" % number, title=f"Movie {number:07d}")
+        yield {
+            "imdbid": movie["imdbID"],
+            "title": movie["Title"],
+            "year": int(movie["Year"]),
+            "genre": movie["Genre"],
+            "released": movie["Released"],
+            "language": movie["Language"],
+            "director": movie["Director"],
+            "writer": movie["Writer"],
+            "actors": movie["Actors"],
+        }
+
+
+def seed_database(database_url, count, batch_size=10_000):
+    """
+    Migrate the given database and insert count movies, the app
+    processes started on it have no migration left to run
+    """
+    os.environ["DATABASE_URL"] = database_url
+    import models
+    import sqlalchemy
+    from database import SYNC_DRIVERS, run_migrations
+
+    # an engine of its own, database.engine keeps the url of the first call
+    url = sqlalchemy.engine.make_url(database_url)
+    engine = sqlalchemy.create_engine(
+        url.set(drivername=SYNC_DRIVERS.get(url.drivername, url.drivername))
+    )
+    with engine.begin() as conn:
+        run_migrations(conn)
+    rows = movie_rows(count)
+    with engine.begin() as conn:
+        while batch := list(itertools.islice(rows, batch_size)):
+            conn.execute(models.Movie.__table__.insert(), batch)
+        # the app doesn't seed a table marked as seeded
+        conn.execute(
+            sqlalchemy.update(models.CatalogueVersion).values(
+                seeded_at=datetime.utcnow()
+            )
+        )
+    engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(env, port=None, workers=1):
+    """
+    Start uvicorn in a separate process and wait until it serves requests,
+    returns the process and the base url
+    """
+    port = port or free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            f"--port={port}",
+            f"--workers={workers}",
+            "--log-level=warning",
+        ],
+        env=dict(os.environ, **env),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("app exited during startup")
+        try:
+            httpx.get(base_url + "/docs", timeout=1)
+            return process, base_url
+        except httpx.TransportError:
+            time.sleep(0.02)
+    process.terminate()
+    raise RuntimeError("app didn't start in 60 seconds")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_load(base_url, make_request, concurrency, duration):
+    """
+    Send requests built by make_request(client) from concurrency clients
+    for duration seconds, returns the latencies in seconds and the error count
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, errors
+
+
+def report(name, concurrency, latencies, errors, duration):
+    print(
+        f"{name:<8} clients={concurrency:<4} rps={len(latencies) / duration:>8.1f} "
+        f"p50={percentile(latencies, 0.5) * 1000:>7.2f}ms "
+        f"p95={percentile(latencies, 0.95) * 1000:>7.2f}ms "
+        f"p99={percentile(latencies, 0.99) * 1000:>7.2f}ms errors={errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="read routes load benchmark")
+    parser.add_argument("--movies", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--database-url", help="empty database to use instead of a sqlite file"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite+aiosqlite:///{tmp}/bench.db"
+        seed_database(database_url, args.movies)
+        process, base_url = start_app(
+            {"DATABASE_URL": database_url, "OMDB_API_KEY": "benchmark"},
+            workers=args.workers,
+        )
+        pages = max(1, args.movies // 10)
+
+        def list_movies(client):
+            return client.get(f"/list?page={random.randint(1, pages)}&perpage=10")
+
+        def single_movie(client):
+            number = random.randint(1, args.movies)
+            return client.get(f"/single?title=Movie {number:07d}")
+
+        try:
+            for name, make_request in [
+                ("/list", list_movies),
+                ("/single", single_movie),
+            ]:
+                for concurrency in args.concurrency:
+                    latencies, errors = asyncio.run(
+                        run_load(base_url, make_request, concurrency, args.duration)
+                    )
+                    report(name, concurrency, latencies, errors, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark /list latency while logins are in flight
+
+bcrypt takes a few hundred milliseconds per login, the app runs it
+in a thread pool so the event loop keeps serving other routes.
+Reports /list latency alone and next to --logins clients which
+log in again and again
+
+run from the root of the repo:
+python -m benchmark.bench_login --logins 50 --rounds 12
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+
+from benchmark.bench_load import percentile, report, run_load, seed_database, start_app
+
+
+async def run(base_url, args):
+    pages = max(1, args.movies // 10)
+
+    def list_movies(client):
+        return client.get(f"/list?page={random.randint(1, pages)}&perpage=10")
+
+    def login(client):
+        return client.post(
+            "/token",
+            data={"username": "bench", "password": "password"},
+            timeout=120,
+        )
+
+    latencies, errors = await run_load(
+        base_url, list_movies, args.concurrency, args.duration
+    )
+    report("/list", args.concurrency, latencies, errors, args.duration)
+
+    (latencies, errors), (login_latencies, login_errors) = await asyncio.gather(
+        run_load(base_url, list_movies, args.concurrency, args.duration),
+        run_load(base_url, login, args.logins, args.duration),
+    )
+    report("/list", args.concurrency, latencies, errors, args.duration)
+    report("/token", args.logins, login_latencies, login_errors, args.duration)
+    print(
+        f"/list p99 while {args.logins} logins are in flight: "
+        f"{percentile(latencies, 0.99) * 1000:.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/list latency during logins")
+    parser.add_argument("--movies", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--hash-workers", type=int, help="PASSWORD_HASH_WORKERS")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        seed_database(database_url, args.movies)
+        env = {
+            "DATABASE_URL": database_url,
+            "OMDB_API_KEY": "benchmark",
+            "BCRYPT_ROUNDS": str(args.rounds),
+            # every /list request has to reach the database
+            "MOVIE_CACHE_SIZE": "0",
+        }
+        if args.hash_workers:
+            env["PASSWORD_HASH_WORKERS"] = str(args.hash_workers)
+        process, base_url = start_app(env)
+        try:
+            import httpx
+
+            httpx.post(
+                base_url + "/singup",
+                json={"username": "bench", "password": "password"},
+                timeout=60,
+            ).raise_for_status()
+            asyncio.run(run(base_url, args))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
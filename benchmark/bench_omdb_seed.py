@@ -0,0 +1,66 @@
+"""
+Benchmark the startup seed against the local OMDB stub
+
+run from the root of the repo:
+python -m benchmark.bench_omdb_seed --latency 0.2 --concurrency 1 10 25 --async
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmark.omdb_stub import OMDBStubServer
+
+# database.py reads these at import time, nothing connects to the database here
+os.environ.setdefault("DB_PASS", "benchmark")
+os.environ.setdefault("INSTANCE_UNIX_SOCKET", "/tmp/benchmark.sock")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OMDB seed benchmark")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 25])
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true", help="use AsyncOMDBUtil"
+    )
+    args = parser.parse_args()
+
+    stub = OMDBStubServer(args.latency, args.jitter, args.failure_rate).start()
+    os.environ["OMDB_URL"] = stub.url
+    os.environ.setdefault("OMDB_API_KEY", "benchmark")
+
+    from omdb_util import AsyncOMDBUtil, OMDBUtil
+    from operations import Operations
+
+    async def seed_async(operations):
+        try:
+            return await operations.get_100_movies_information_from_omdb_async()
+        finally:
+            await operations.async_omdb_util.aclose()
+
+    print(f"OMDB stub latency {args.latency}s (+{args.jitter}s jitter)")
+    for concurrency in args.concurrency:
+        os.environ["OMDB_FETCH_CONCURRENCY"] = str(concurrency)
+        requests_before = stub.request_count
+        started = time.perf_counter()
+        if args.use_async:
+            operations = Operations(
+                OMDBUtil(), concurrency=concurrency, async_omdb_util=AsyncOMDBUtil()
+            )
+            movies = asyncio.run(seed_async(operations))
+        else:
+            operations = Operations(OMDBUtil(), concurrency=concurrency)
+            movies = operations.get_100_movies_information_from_omdb()
+        elapsed = time.perf_counter() - started
+        print(
+            f"concurrency={concurrency:<4} movies={len(movies):<4} "
+            f"requests={stub.request_count - requests_before:<4} seconds={elapsed:.2f}"
+        )
+        operations.executor.shutdown()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark OFFSET pagination against cursor pagination of /list
+
+Seeds a sqlite database and times the first and a deep page of
+both modes with the same queries the route runs
+
+run from the root of the repo:
+python -m benchmark.bench_pagination --movies 1000000 --pages 1 100 10000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmark.bench_load import seed_database
+
+
+async def run(args):
+    import models
+    import pagination
+    from database import AsyncSessionLocal, async_engine
+    from fastapi_pagination import Params
+    from sqlalchemy import select
+
+    async def timed(coro_factory):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await coro_factory()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    async with AsyncSessionLocal() as db:
+        for page in args.pages:
+            offset_ms = await timed(
+                lambda: pagination.paginate_by_offset(
+                    db, Params(page=page, size=args.perpage)
+                )
+            )
+
+            # cursor pointing at the last row of the previous page
+            cursor = None
+            if page > 1:
+                previous = (
+                    await db.execute(
+                        select(models.Movie)
+                        .order_by(models.Movie.title, models.Movie.id)
+                        .offset((page - 1) * args.perpage - 1)
+                        .limit(1)
+                    )
+                ).scalar_one()
+                cursor = pagination.encode_cursor(previous, pagination.NEXT)
+            cursor_ms = await timed(
+                lambda: pagination.paginate_by_cursor(db, args.perpage, cursor)
+            )
+            print(
+                f"page={page:<8} offset={offset_ms:>9.2f}ms cursor={cursor_ms:>7.2f}ms"
+            )
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/list pagination benchmark")
+    parser.add_argument("--movies", type=int, default=1_000_000)
+    parser.add_argument("--perpage", type=int, default=10)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        started = time.perf_counter()
+        seed_database(database_url, args.movies)
+        print(f"seeded {args.movies} movies in {time.perf_counter() - started:.1f}s")
+        os.environ["DATABASE_URL"] = database_url
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark /search's in-process index against LIKE queries
+
+Builds the index over generated movies and times a few kinds
+of searches, next to the LIKE '%word%' scan of the table a
+search would run without an index
+
+run from the root of the repo:
+python -m benchmark.bench_search --movies 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmark.bench_load import movie_rows, percentile, seed_database
+from types import SimpleNamespace
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name, timings):
+    print(
+        f"{name:<24} p50={percentile(timings, 0.5) * 1000:>8.2f}ms "
+        f"p95={percentile(timings, 0.95) * 1000:>8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/search benchmark")
+    parser.add_argument("--movies", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    from search_index import SearchIndex
+
+    movies = [
+        SimpleNamespace(id=id, **row)
+        for id, row in enumerate(movie_rows(args.movies), start=1)
+    ]
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.build(movies)
+    build_seconds = time.perf_counter() - started
+    # traced separately, tracing slows the build down a lot
+    tracemalloc.start()
+    traced = SearchIndex()
+    traced.build(movies)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"indexed {args.movies} movies in {build_seconds:.2f}s, "
+        f"{len(index.words)} words, {memory / 2**20:.0f}MiB"
+    )
+
+    def number():
+        return random.randint(1, args.movies)
+
+    searches = [
+        # one title
+        ("exact title", lambda: index.search(f"Movie {number():07d}")),
+        # rare word given as prefix
+        ("title prefix", lambda: index.search(f"{number():07d}"[:5])),
+        # a few hundred movies per actor and director
+        ("actor + director", lambda: index.search(f"actor {number() % 79} director")),
+        ("actor + year facet", lambda: index.search("actor 7", year=1960)),
+        # matches every movie
+        ("common word", lambda: index.search("movie")),
+        ("genre facet only", lambda: index.search("", genre="Comedy")),
+    ]
+    for name, search in searches:
+        report(name, timed(search, args.repeat))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        seed_database(os.environ["DATABASE_URL"], args.movies)
+        import models
+        from database import engine
+        from sqlalchemy import func, or_, select
+
+        def like(word):
+            # a page and the number of matches, like /search returns
+            pattern = f"%{word}%"
+            query = select(models.Movie.id).filter(
+                or_(
+                    models.Movie.title.like(pattern),
+                    models.Movie.actors.like(pattern),
+                    models.Movie.director.like(pattern),
+                )
+            )
+            with engine.connect() as conn:
+                conn.execute(query.limit(10)).all()
+                conn.execute(select(func.count()).select_from(query.subquery()))
+
+        report("LIKE title prefix", timed(lambda: like(f"{number():07d}"[:5]), 5))
+        report("LIKE actor", timed(lambda: like(f"Actor {number() % 79},"), 5))
+        report("LIKE common word", timed(lambda: like("Movie"), 5))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark the serialization of /list pages
+
+Seeds a sqlite database and times building the JSON of the first
+page with the previous path (ORM objects, a pydantic model per
+row, model_dump_json) against the row path /list uses now (plain
+rows encoded with orjson), once for the whole route body and once
+for the encoding alone. Sizes over the API limit of 100 show how
+both grow with the page
+
+run from the root of the repo:
+python -m benchmark.bench_serialization --perpage 10 100 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmark.bench_load import seed_database
+
+
+async def run(args):
+    import models
+    import pagination
+    import serializers
+    from database import AsyncSessionLocal, async_engine
+    from fastapi_pagination import Page, Params
+    from fastapi_pagination.ext.sqlalchemy import paginate
+    from sqlalchemy import select
+
+    def timed(function):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    async def timed_async(coro_factory):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await coro_factory()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    def pydantic_page(items, params, total):
+        return Page[serializers.Movie].create(
+            [
+                serializers.Movie.model_validate(item, from_attributes=True)
+                for item in items
+            ],
+            params,
+            total=total,
+        )
+
+    async with AsyncSessionLocal() as db:
+        for size in args.perpage:
+            # skips the limit of 100 of Params to show bigger pages
+            params = Params.model_construct(page=1, size=size)
+
+            async def pydantic_path():
+                result = await paginate(
+                    db,
+                    select(models.Movie).order_by(models.Movie.title),
+                    params,
+                    transformer=lambda items: [
+                        serializers.Movie.model_validate(item, from_attributes=True)
+                        for item in items
+                    ],
+                )
+                # like the route the ORM objects don't outlive the request
+                db.expunge_all()
+                return result.model_dump_json()
+
+            async def row_path():
+                result = await pagination.paginate_by_offset(db, params)
+                return pagination.encode_page(result)
+
+            assert (await pydantic_path()).encode() == await row_path()
+            pydantic_ms = await timed_async(pydantic_path)
+            row_ms = await timed_async(row_path)
+
+            orm_items = (
+                (
+                    await db.execute(
+                        select(models.Movie).order_by(models.Movie.title).limit(size)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            page = await pagination.paginate_by_offset(db, params)
+            pydantic_encode_ms = timed(
+                lambda: pydantic_page(
+                    orm_items, params, page["total"]
+                ).model_dump_json()
+            )
+            row_encode_ms = timed(lambda: pagination.encode_page(page))
+            db.expunge_all()
+
+            print(
+                f"perpage={size:<5} "
+                f"route pydantic={pydantic_ms:>7.2f}ms rows={row_ms:>7.2f}ms "
+                f"({pydantic_ms / row_ms:.1f}x) "
+                f"encode pydantic={pydantic_encode_ms:>7.3f}ms "
+                f"rows={row_encode_ms:>7.3f}ms "
+                f"({pydantic_encode_ms / row_encode_ms:.1f}x)"
+            )
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/list serialization benchmark")
+    parser.add_argument("--movies", type=int, default=10_000)
+    parser.add_argument("--perpage", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        started = time.perf_counter()
+        seed_database(database_url, args.movies)
+        print(f"seeded {args.movies} movies in {time.perf_counter() - started:.1f}s")
+        os.environ["DATABASE_URL"] = database_url
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Benchmark suite of /list, /single, /add and /token with a baseline
+
+Seeds --movies movies into a sqlite file (or the empty database of
+--database-url), starts the local OMDB stub with --omdb-latency
+and the app, then drives every endpoint with --concurrency clients
+for --duration seconds and reports throughput and latency. The
+time from starting the app to its first answered request is
+reported too, with --seed-startup also for an app started on an
+empty database, with the time until it seeded the table. --save
+writes the results to a JSON file, --baseline compares the run with
+such a file and exits with 1 when the throughput of an endpoint fell
+or its p95 grew by more than --tolerance. Baselines are only worth
+comparing when taken on the same machine with the same settings,
+both are saved with the results. benchmark/baseline.json is the
+baseline of the default settings on the machine it names, save
+your own to compare runs on another one
+
+run from the root of the repo:
+python -m benchmark.bench_suite --baseline benchmark/baseline.json
+python -m benchmark.bench_suite --save my_baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from benchmark.bench_load import percentile, report, run_load, seed_database, start_app
+from benchmark.omdb_stub import OMDBStubServer, imdb_id_for
+
+ENDPOINTS = ["/list", "/single", "/add", "/token"]
+
+
+def endpoint_requests(movies):
+    """
+    Return the request builder of every endpoint
+    """
+    pages = max(1, movies // 10)
+    # /add gets titles the stub answers with imdbIDs not in the table yet
+    used_imdbids = {"tt%07d" % number for number in range(1, movies + 1)}
+    numbers = itertools.count()
+
+    def add_title():
+        while True:
+            title = f"Bench Added {next(numbers)}"
+            imdbid = imdb_id_for(title)
+            if imdbid not in used_imdbids:
+                used_imdbids.add(imdbid)
+                return title
+
+    return {
+        "/list": lambda client: client.get(
+            f"/list?page={random.randint(1, pages)}&perpage=10"
+        ),
+        "/single": lambda client: client.get(
+            f"/single?title=Movie {random.randint(1, movies):07d}"
+        ),
+        "/add": lambda client: client.post("/add", params={"title": add_title()}),
+        "/token": lambda client: client.post(
+            "/token",
+            data={"username": "bench", "password": "password"},
+            timeout=120,
+        ),
+    }
+
+
+def summarize(latencies, errors, duration):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def machine():
+    """
+    Return what the results depend on besides the settings
+    """
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def measure_startup(env, workers):
+    """
+    Start the app, returns the seconds until it answered the first request
+    and the running process and base url
+    """
+    started = time.perf_counter()
+    process, base_url = start_app(env, workers=workers)
+    return time.perf_counter() - started, process, base_url
+
+
+def measure_seed_startup(env, workers, timeout=300):
+    """
+    Start the app on an empty database, returns the seconds until it
+    answered the first request and until it seeded the movie table
+    """
+    import httpx
+
+    started = time.perf_counter()
+    first_request, process, base_url = measure_startup(env, workers)
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            seed = httpx.get(base_url + "/health/ready", timeout=5).json()["seed"]
+            if seed["state"] == "done":
+                return first_request, time.perf_counter() - started
+            time.sleep(0.05)
+        raise RuntimeError(f"app didn't seed the table in {timeout} seconds")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change of every endpoint against the baseline,
+    returns the endpoints which regressed
+    """
+    if baseline["settings"] != results["settings"]:
+        print(f"baseline was taken with other settings: {baseline['settings']}")
+    if baseline.get("machine") != results["machine"]:
+        print(f"baseline was taken on another machine: {baseline.get('machine')}")
+    regressed = []
+    for endpoint, result in results["endpoints"].items():
+        base = baseline["endpoints"].get(endpoint)
+        if base is None:
+            continue
+        rps_change = result["rps"] / base["rps"] - 1 if base["rps"] else 0.0
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        worse = rps_change < -tolerance or p95_change > tolerance
+        if worse:
+            regressed.append(endpoint)
+        print(
+            f"{endpoint:<8} rps {rps_change:>+7.1%} p95 {p95_change:>+7.1%}"
+            f"{'  REGRESSION' if worse else ''}"
+        )
+    # startup times are shown but not checked, they vary too much between runs
+    for name, seconds in results.get("startup", {}).items():
+        base = baseline.get("startup", {}).get(name)
+        if base:
+            print(f"startup {name} {seconds / base - 1:>+7.1%}")
+    return regressed
+
+
+async def run(base_url, args):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        response = await client.post(
+            "/singup", json={"username": "bench", "password": "password"}
+        )
+        response.raise_for_status()
+
+    requests = endpoint_requests(args.movies)
+    results = {}
+    for endpoint in args.endpoints:
+        if args.warmup:
+            await run_load(base_url, requests[endpoint], args.concurrency, args.warmup)
+        latencies, errors = await run_load(
+            base_url, requests[endpoint], args.concurrency, args.duration
+        )
+        report(endpoint, args.concurrency, latencies, errors, args.duration)
+        results[endpoint] = summarize(latencies, errors, args.duration)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark suite with a baseline")
+    parser.add_argument("--movies", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--omdb-latency", type=float, default=0.05)
+    parser.add_argument("--omdb-jitter", type=float, default=0.0)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument(
+        "--database-url", help="empty database to use instead of a sqlite file"
+    )
+    parser.add_argument(
+        "--seed-startup",
+        action="store_true",
+        help="also time the startup of the app on an empty sqlite database",
+    )
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of a run to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="change of rps or p95 counted as a regression, 0.2 is 20%%",
+    )
+    args = parser.parse_args()
+
+    settings = {
+        "movies": args.movies,
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "omdb_latency": args.omdb_latency,
+        "rounds": args.rounds,
+        "database": "sqlite" if not args.database_url else "external",
+    }
+    stub = OMDBStubServer(args.omdb_latency, args.omdb_jitter).start()
+    env = {
+        "OMDB_API_KEY": "benchmark",
+        "OMDB_URL": stub.url,
+        "BCRYPT_ROUNDS": str(args.rounds),
+    }
+    startup = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            if args.seed_startup:
+                empty_url = f"sqlite+aiosqlite:///{tmp}/empty.db"
+                seed_database(empty_url, 0)
+                first_request, seeded = measure_seed_startup(
+                    dict(env, DATABASE_URL=empty_url), args.workers
+                )
+                startup["empty_first_request_s"] = round(first_request, 3)
+                startup["empty_seeded_s"] = round(seeded, 3)
+
+            database_url = args.database_url or f"sqlite+aiosqlite:///{tmp}/bench.db"
+            seed_database(database_url, args.movies)
+            first_request, process, base_url = measure_startup(
+                dict(env, DATABASE_URL=database_url), args.workers
+            )
+            startup["first_request_s"] = round(first_request, 3)
+            try:
+                endpoints = asyncio.run(run(base_url, args))
+            finally:
+                process.terminate()
+                process.wait()
+        finally:
+            stub.stop()
+
+    for name, seconds in startup.items():
+        print(f"startup {name}: {seconds}s")
+    results = {
+        "settings": settings,
+        "machine": machine(),
+        "startup": startup,
+        "endpoints": endpoints,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, args.tolerance)
+        if regressed:
+            print(f"regressed: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
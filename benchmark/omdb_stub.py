@@ -0,0 +1,119 @@
+"""
+Local stand-in for the OMDB api used by the benchmarks
+
+Answers search (s), imdbID (i) and title (t) queries with
+deterministic fake movies after a configurable delay, titles
+starting with "Unknown" are reported as not found
+"""
+import json
+import random
+import threading
+import time
+import zlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Sci-Fi", "Thriller"]
+
+
+def movie_for(imdb_id, title=None):
+    number = int(imdb_id[2:])
+    return {
+        "Title": title or f"Stub Movie {number}",
+        "Year": str(1950 + number % 75),
+        "Genre": ", ".join(GENRES[number % 3 : number % 3 + 2]),
+        "Released": "01 Jan 2000",
+        "Language": "English",
+        "Director": f"Director {number % 97}",
+        "Writer": f"Writer {number % 89}, Writer {number % 83}",
+        "Actors": f"Actor {number % 79}, Actor {number % 73}, Actor {number % 71}",
+        "imdbID": imdb_id,
+        "Response": "True",
+    }
+
+
+def imdb_id_for(value):
+    return "tt%07d" % (zlib.crc32(value.encode()) % 10_000_000)
+
+
+class OMDBStubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with server.lock:
+            server.request_count += 1
+        if server.latency:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+        if server.failure_rate and random.random() < server.failure_rate:
+            return self._send(503, {"Response": "False", "Error": "Unavailable"})
+        if "s" in query:
+            page = int(query.get("page", 1))
+            body = {
+                "Search": [
+                    {
+                        "Title": f"{query['s'].title()} {page * 10 + i}",
+                        "imdbID": imdb_id_for(f"{query['s']}:{page}:{i}"),
+                    }
+                    for i in range(10)
+                ],
+                "totalResults": "100",
+                "Response": "True",
+            }
+        elif "i" in query:
+            body = movie_for(query["i"])
+        elif "t" in query and not query["t"].startswith("Unknown"):
+            body = movie_for(imdb_id_for(query["t"]), title=query["t"])
+        else:
+            body = {"Response": "False", "Error": "Movie not found!"}
+        self._send(200, body)
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OMDBStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, port=0):
+        super().__init__(("127.0.0.1", port), OMDBStubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = OMDBStubServer(args.latency, args.jitter, args.failure_rate, args.port)
+    print(f"OMDB stub listening on {stub.url}")
+    stub.serve_forever()
@@ -0,0 +1,99 @@
+"""
+Bounded in-process cache
+"""
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire ttl seconds after
+    they were set, a maxsize of 0 disables the cache
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # bumped by every invalidation, see set()
+        self.generation = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None, generation=None):
+        """
+        Store value under key, ttl overrides the default of the cache
+        generation is the one read before the value was made, the value
+        is dropped when entries were invalidated since, it can be stale
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self.lock:
+            self.generation += 1
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.invalidations += 1
+            return entry and entry[1]
+
+    def pop_matching(self, predicate):
+        """
+        Drop every entry for which predicate(key, value) is true
+        """
+        with self.lock:
+            self.generation += 1
+            keys = [k for k, (_, v) in self.entries.items() if predicate(k, v)]
+            for key in keys:
+                del self.entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
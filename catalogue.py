@@ -0,0 +1,181 @@
+"""
+Version of the movie catalogue for conditional GETs
+
+Every change of the movie table bumps the single row of the
+catalogue_version table in its own transaction, so all app
+processes agree on the version. /list and /single derive their
+ETag and Last-Modified from it and answer If-None-Match and
+If-Modified-Since with 304 before looking at the cache or the
+movie table. Every process reads the version at most every
+CATALOGUE_VERSION_TTL seconds, changes made by other processes
+are seen after that, changes made by this one right away
+"""
+import models
+import os
+import time
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from sqlalchemy import select, update
+
+
+async def bump(db):
+    """
+    Bump the version in the transaction of db, call with the change
+    of the movie table, returns the new (version, updated_at)
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(models.CatalogueVersion)
+        .filter_by(id=1)
+        .values(version=models.CatalogueVersion.version + 1, updated_at=now)
+    )
+    if not result.rowcount:
+        # tables created without the migrations have no row yet
+        db.add(models.CatalogueVersion(id=1, version=1, updated_at=now))
+        await db.flush()
+    return await read(db)
+
+
+async def read(db):
+    result = await db.execute(
+        select(models.CatalogueVersion.version, models.CatalogueVersion.updated_at)
+    )
+    row = result.first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+class VersionCache:
+    def __init__(self, on_change=None):
+        self.ttl = float(os.environ.get("CATALOGUE_VERSION_TTL", 1))
+        # called when another process changed the catalogue
+        self.on_change = on_change
+        self.version = None
+        self.updated_at = None
+        self.expires_at = 0.0
+        # commits of this process which bumped or are bumping the version
+        # but weren't told to end_commit() yet, they finish in any order
+        self.committing = set()
+        self.last_commit = 0
+        # versions up to self.version nobody was seen to commit yet, with
+        # the commits of this process which can still turn out to have
+        self.unexplained = {}
+
+    async def get(self, db):
+        """
+        Return (version, updated_at), read from db when it's
+        older than ttl seconds
+        """
+        if time.monotonic() >= self.expires_at:
+            self.advance(*await read(db))
+        return self.version, self.updated_at
+
+    def begin_commit(self):
+        """
+        Call before bumping the version in a change of this process,
+        returns the token to pass to end_commit()
+        """
+        self.last_commit += 1
+        self.committing.add(self.last_commit)
+        return self.last_commit
+
+    def end_commit(self, token, version=None):
+        """
+        Call when the change of begin_commit() was committed with
+        version, the (version, updated_at) of bump(), or with None
+        when it was rolled back
+        """
+        self.committing.discard(token)
+        for waiting in self.unexplained.values():
+            waiting.discard(token)
+        if version is not None:
+            self.unexplained.pop(version[0], None)
+            self.advance(*version, committed=True)
+        else:
+            self._settle()
+
+    def advance(self, version, updated_at, committed=False):
+        """
+        Remember a version read from the database or committed by this
+        process, older versions than the known one are ignored
+        """
+        self.expires_at = time.monotonic() + self.ttl
+        if self.version is None or version <= self.version:
+            if self.version is None:
+                self.version, self.updated_at = version, updated_at
+            self._settle()
+            return
+        # a version read can still be one of a commit of this process
+        first, last = self.version + 1, version - 1 if committed else version
+        self.version, self.updated_at = version, updated_at
+        if last - first + 1 + len(self.unexplained) > len(self.committing):
+            # every commit in flight has one version, the rest are others'
+            self._changed()
+            return
+        for unexplained in range(first, last + 1):
+            self.unexplained[unexplained] = set(self.committing)
+        self._settle()
+
+    def _settle(self):
+        # versions no commit of this process can have anymore are others'
+        if any(not waiting for waiting in self.unexplained.values()):
+            self._changed()
+
+    def _changed(self):
+        self.unexplained.clear()
+        # changes of other processes aren't known to the response cache
+        if self.on_change:
+            self.on_change()
+
+
+async def commit_change(db, versions=None):
+    """
+    Bump the version and commit the change of the movie table with it,
+    versions is the VersionCache of the app told about the new version
+    """
+    token = versions.begin_commit() if versions is not None else None
+    committed = None
+    try:
+        version = await bump(db)
+        await db.commit()
+        committed = version
+    finally:
+        if versions is not None:
+            versions.end_commit(token, committed)
+    return version
+
+
+def validators(version, updated_at):
+    """
+    Return the ETag, Last-Modified and Cache-Control headers of a version
+    """
+    headers = {"ETag": f'"{version}"', "Cache-Control": "no-cache"}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(
+            updated_at.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def not_modified(request_headers, validator_headers):
+    """
+    Whether the client's copy is current, If-None-Match wins over
+    If-Modified-Since like RFC 9110 says
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return validator_headers["ETag"] in etags
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = validator_headers.get("Last-Modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(last_modified) <= since
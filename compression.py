@@ -0,0 +1,180 @@
+"""
+Negotiated gzip and brotli compression of responses
+
+JSON, NDJSON, CSV and text responses of at least
+COMPRESS_MIN_SIZE bytes are compressed with the encoding the
+client prefers in Accept-Encoding, brotli when it accepts both
+equally. Responses sent in one piece are compressed at once,
+streamed ones like /export chunk by chunk. A compressed
+response gets a weak ETag since its bytes differ from the
+uncompressed one. Small responses which aren't compressed and
+304 responses get the same weak ETag and Vary header as the
+compressed ones, so caches see one representation either way
+"""
+import brotli
+import os
+import zlib
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# preferred first when the client accepts several equally
+ENCODINGS = ("br", "gzip")
+
+GZIP_LEVEL = 6
+# the levels above 5 cost much more CPU for a few percent
+BROTLI_QUALITY = 4
+
+
+def choose_encoding(accept_encoding):
+    """
+    Return the encoding of ENCODINGS with the highest q value
+    in the Accept-Encoding header, None when none is accepted
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class GzipCompressor:
+    def __init__(self):
+        # wbits 31 writes the gzip header and trailer
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self, data=b""):
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+COMPRESSORS = {"br": BrotliCompressor, "gzip": GzipCompressor}
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.minimum_size = int(os.environ.get("COMPRESS_MIN_SIZE", 500))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept_encoding = next(
+            (value for name, value in scope["headers"] if name == b"accept-encoding"),
+            b"",
+        )
+        encoding = choose_encoding(accept_encoding.decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        await CompressionResponder(self.app, encoding, self.minimum_size)(
+            scope, receive, send
+        )
+
+
+class CompressionResponder:
+    """
+    Holds back the start of the response until the first
+    body chunk tells whether it's worth compressing
+    """
+
+    def __init__(self, app, encoding, minimum_size):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressor = None
+        # None until the first body chunk decided it
+        self.compressing = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def compressible(self, headers):
+        names = {name.lower() for name, _ in headers}
+        if b"content-encoding" in names:
+            return False
+        content_type = next(
+            (value for name, value in headers if name.lower() == b"content-type"),
+            b"",
+        ).decode("latin-1")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def negotiated_headers(self, compressed, content_length=None):
+        """
+        Return the start message with a weak ETag and Vary, and
+        the headers of the compressed body when compressed is set
+        """
+        headers = []
+        for name, value in self.start["headers"]:
+            lower = name.lower()
+            if compressed and lower == b"content-length":
+                continue
+            if lower == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            headers.append((name, value))
+        if compressed:
+            headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        return {**self.start, "headers": headers}
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            if message["status"] == 304:
+                # validators of the 200 it stands for, which has no content-type
+                self.compressing = False
+                await self.send(self.negotiated_headers(False))
+            return
+        if message["type"] != "http.response.body" or self.compressing is False:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressing is None:
+            compressible = self.compressible(self.start["headers"])
+            self.compressing = compressible and (
+                more_body or len(body) >= self.minimum_size
+            )
+            if not self.compressing:
+                start = self.negotiated_headers(False) if compressible else self.start
+                await self.send(start)
+                return await self.send(message)
+            self.compressor = COMPRESSORS[self.encoding]()
+            if not more_body:
+                body = self.compressor.finish(body)
+                await self.send(self.negotiated_headers(True, len(body)))
+                return await self.send({**message, "body": body})
+            await self.send(self.negotiated_headers(True))
+
+        if not more_body:
+            body = self.compressor.finish(body)
+        elif body:
+            body = self.compressor.compress(body)
+        await self.send({**message, "body": body})
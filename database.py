@@ -1,45 +1,303 @@
+import metrics
 import os
+import profiling
 import sqlalchemy
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-# if you want to connect to the database with host and port then
-# uncomment below lines and comment out below connect to CloudSQL from CloundRun block
-
-# db_host = os.environ["DB_HOST"]
-# db_port = os.environ.get("DB_PORT", 3306)
-# db_name = os.environ.get("DB_NAME", "britetest-database")
-# db_user = os.environ.get("DB_USER", "britetest-user")
-# db_pass = os.environ["DB_PASS"]
-
-# engine = sqlalchemy.create_engine(
-#     sqlalchemy.engine.url.URL.create(
-#         drivername="mysql+pymysql",
-#         username=db_user,
-#         password=db_pass,
-#         host=db_host,
-#         port=db_port,
-#         database=db_name,
-#     ),
-# )
-
-
-# Connect to CloudSQL from cloudRun app
-# https://cloud.google.com/sql/docs/mysql/connect-run
-db_user = os.environ.get("DB_USER", "britetest-user")
-db_pass = os.environ["DB_PASS"]
-db_name = os.environ.get("DB_NAME", "britetest-database")
-unix_socket_path = os.environ["INSTANCE_UNIX_SOCKET"]
+# sync drivers used by the tooling which can't run on asyncio
+SYNC_DRIVERS = {"mysql+aiomysql": "mysql+pymysql", "sqlite+aiosqlite": "sqlite"}
+# databases upsert_statement() can write to
+SUPPORTED_DIALECTS = ("mysql", "sqlite")
+
+
+class PoolStats:
+    """
+    Counters of connection checkouts from a pool, the wait
+    includes opening a new connection when the pool has none idle
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_wait_seconds_total = 0.0
+        self.checkout_wait_seconds_max = 0.0
+        self.checkout_timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_checkout(self, wait_seconds):
+        self.checkouts += 1
+        self.checkout_wait_seconds_total += wait_seconds
+        self.checkout_wait_seconds_max = max(
+            self.checkout_wait_seconds_max, wait_seconds
+        )
+
+    def record_invalidation(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+query_duration = metrics.Histogram(
+    "db_query_duration_seconds",
+    "Time the database took to run a statement, by statement kind",
+    ["operation"],
+)
+query_errors = metrics.Counter(
+    "db_query_errors_total", "Statements which raised, by statement kind", ["operation"]
+)
+
+
+def record_query_start(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        seconds = time.perf_counter() - context.metrics_started
+        query_duration.observe(seconds, metrics.statement_operation(statement))
+        profiling.record_statement(statement, seconds)
+
+
+def record_query_error(exception_context):
+    query_errors.inc(metrics.statement_operation(exception_context.statement or ""))
+
+
+def instrument_queries(sync_engine):
+    """
+    Record the time and errors of every statement run on the engine,
+    and the statements of the request being profiled
+    """
+    event.listen(sync_engine, "before_cursor_execute", record_query_start)
+    event.listen(sync_engine, "after_cursor_execute", record_query)
+    event.listen(sync_engine, "handle_error", record_query_error)
+
+
+class InstrumentedPoolMixin:
+    """
+    Records PoolStats of every checkout, the stats live
+    on the class so they survive engine.dispose()
+    """
+
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sqlalchemy.exc.TimeoutError:
+            self.stats.checkout_timeouts += 1
+            raise
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def _create_connection(self):
+        self.stats.connects += 1
+        return super()._create_connection()
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    stats = PoolStats()
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+def _database_url():
+    """
+    Return the async url of the database, DATABASE_URL wins over
+    the CloudSQL unix socket and host/port settings
+    """
+    if os.environ.get("DATABASE_URL"):
+        # any async SQLAlchemy url, e.g. sqlite+aiosqlite:///brite.db for local runs
+        url = sqlalchemy.engine.make_url(os.environ["DATABASE_URL"])
+        if url.get_backend_name() not in SUPPORTED_DIALECTS:
+            raise ValueError(
+                "DATABASE_URL must be a MySQL or sqlite url, "
+                f"got {url.get_backend_name()}"
+            )
+        return url
+
+    db_user = os.environ.get("DB_USER", "britetest-user")
+    db_pass = os.environ["DB_PASS"]
+    db_name = os.environ.get("DB_NAME", "britetest-database")
+    connection_mode = os.environ.get("DB_CONNECTION_MODE", "unix_socket")
+
+    if connection_mode == "unix_socket":
+        # Connect to CloudSQL from cloudRun app
+        # https://cloud.google.com/sql/docs/mysql/connect-run
+        return sqlalchemy.engine.url.URL.create(
+            drivername="mysql+aiomysql",
+            username=db_user,
+            password=db_pass,
+            database=db_name,
+            query={"unix_socket": os.environ["INSTANCE_UNIX_SOCKET"]},
+        )
+    if connection_mode == "tcp":
+        return sqlalchemy.engine.url.URL.create(
+            drivername="mysql+aiomysql",
+            username=db_user,
+            password=db_pass,
+            host=os.environ["DB_HOST"],
+            port=int(os.environ.get("DB_PORT", 3306)),
+            database=db_name,
+        )
+    raise ValueError(
+        f"DB_CONNECTION_MODE must be unix_socket or tcp, got {connection_mode}"
+    )
+
+
+def _pool_options():
+    """
+    Pool settings shared by both engines
+    """
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        # CloudSQL drops idle connections, recycle them before that happens
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower()
+        in ("1", "true", "yes"),
+    }
+
+
+def upsert_statement(table, rows, dialect_name, conflict_columns, update_columns=()):
+    """
+    Return a bulk INSERT of rows which updates update_columns of the rows
+    conflicting on the unique conflict_columns, or skips them when
+    update_columns is empty
+    """
+    if dialect_name == "mysql":
+        statement = mysql.insert(table).values(rows)
+        updates = {column: statement.inserted[column] for column in update_columns}
+        # assigning a column to itself turns the conflict into a no-op
+        column = conflict_columns[0]
+        return statement.on_duplicate_key_update(updates or {column: table.c[column]})
+    if dialect_name == "sqlite":
+        statement = sqlite.insert(table).values(rows)
+        if not update_columns:
+            return statement.on_conflict_do_nothing(index_elements=conflict_columns)
+        return statement.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: statement.excluded[column] for column in update_columns},
+        )
+    raise NotImplementedError(f"upsert is not supported on {dialect_name}")
+
+
+# MySQL named lock held while migrating
+MIGRATION_LOCK = "brite_migrations"
+MIGRATION_LOCK_TIMEOUT = 300
+
+
+@contextmanager
+def migration_lock(connection):
+    """
+    Hold the MySQL named lock of the migrations, app processes which
+    start together migrate one after another and the later ones find
+    nothing left to do. Other databases aren't locked, start a single
+    process on them first
+    """
+    if connection.dialect.name != "mysql":
+        yield
+        return
+    acquired = connection.execute(
+        sqlalchemy.text("SELECT GET_LOCK(:name, :timeout)"),
+        {"name": MIGRATION_LOCK, "timeout": MIGRATION_LOCK_TIMEOUT},
+    ).scalar()
+    # the lock belongs to the session, alembic runs its own transaction
+    connection.commit()
+    if acquired != 1:
+        raise RuntimeError(f"Timed out waiting for the {MIGRATION_LOCK} lock")
+    try:
+        yield
+    finally:
+        connection.execute(
+            sqlalchemy.text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK}
+        )
+        connection.commit()
+
+
+def run_migrations(connection=None):
+    """
+    Upgrade the database schema to the latest migration,
+    uses the given connection instead of engine when passed
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(os.path.dirname(__file__), "alembic.ini"))
+    config.set_main_option(
+        "script_location", os.path.join(os.path.dirname(__file__), "migrations")
+    )
+    if connection is not None:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+        return
+    with engine.connect() as connection, migration_lock(connection):
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+
+
+def pool_status():
+    """
+    Live state and checkout counters of the pool used by the routes
+    """
+    pool = async_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        **InstrumentedAsyncAdaptedQueuePool.stats.as_dict(),
+    }
+
+
+database_url = _database_url()
+
+async_engine = create_async_engine(
+    database_url, poolclass=InstrumentedAsyncAdaptedQueuePool, **_pool_options()
+)
 
 engine = sqlalchemy.create_engine(
-    sqlalchemy.engine.url.URL.create(
-        drivername="mysql+pymysql",
-        username=db_user,
-        password=db_pass,
-        database=db_name,
-        query={"unix_socket": unix_socket_path},
+    database_url.set(
+        drivername=SYNC_DRIVERS.get(database_url.drivername, database_url.drivername)
+    ),
+    poolclass=InstrumentedQueuePool,
+    **_pool_options(),
+)
+
+for instrumented_engine in (async_engine.sync_engine, engine):
+    event.listen(
+        instrumented_engine,
+        "invalidate",
+        instrumented_engine.pool.stats.record_invalidation,
+    )
+    instrument_queries(instrumented_engine)
+
+metrics.registry.register_snapshot(
+    "db_pool",
+    "State and checkout counters of the connection pool used by the routes",
+    pool_status,
+    counters=(
+        "checkouts",
+        "checkout_wait_seconds_total",
+        "checkout_timeouts",
+        "connects",
+        "invalidations",
     ),
 )
 
 Base = declarative_base()
 
 SessionLocal = sessionmaker(bind=engine)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
@@ -0,0 +1,61 @@
+"""
+Streaming export of the movie table
+
+Rows are read with a server side cursor in batches of
+EXPORT_BATCH_SIZE and encoded batch by batch, so memory
+stays flat however big the table is and the table is
+read with one query instead of one OFFSET query per page
+"""
+import csv
+import io
+import json
+import models
+import os
+import serializers
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+# the fields the API returns for a movie, bookkeeping columns stay out
+COLUMNS = list(serializers.Movie.model_fields)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_ndjson(rows, header=False):
+    return "".join(json.dumps(dict(zip(COLUMNS, row))) + "\n" for row in rows)
+
+
+def encode_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+
+async def stream_movies(db: AsyncSession, format: str, batch_size: int = BATCH_SIZE):
+    """
+    Yield the movie table ordered by id as chunks of NDJSON or CSV
+    """
+    encode = ENCODERS[format]
+    # plain columns instead of ORM objects, nothing to track in the session
+    columns = [models.Movie.__table__.c[name] for name in COLUMNS]
+    query = select(*columns).order_by(models.Movie.id)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    header = True
+    try:
+        async for rows in result.partitions():
+            yield encode(rows, header)
+            header = False
+        if header:
+            # empty table, CSV still gets its header
+            yield encode([], header)
+    finally:
+        await result.close()
@@ -0,0 +1,239 @@
+"""
+Background ingestion of movies from OMDB
+
+Movies to fetch are stored as jobs in the ingest_jobs table and
+picked up by a pool of workers, so the request which asks for
+them returns right away and a slow OMDB only makes the queue
+longer. A job is claimed with a conditional UPDATE and a lease,
+several app processes can share the queue and the jobs of a
+process which died are picked up again once their lease ends.
+Failed fetches are retried with exponential backoff, jobs which
+run out of attempts or whose movie OMDB doesn't know are dead
+"""
+import asyncio
+import catalogue
+import database
+import logging
+import models
+import os
+
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, update
+
+log = logging.getLogger(__name__)
+log.setLevel(level=logging.DEBUG)
+
+TITLE = "title"
+IMDBID = "imdbid"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+
+def dedupe_key(kind, value):
+    return f"{kind}:{value.strip().lower()}"
+
+
+async def enqueue(db, kind, values):
+    """
+    Add a job per value, values which already have a queued or
+    running job get that job back instead, returns the jobs in order
+    """
+    keyed = {}
+    for value in values:
+        keyed.setdefault(dedupe_key(kind, value), value.strip())
+    if not keyed:
+        return []
+    now = datetime.utcnow()
+    rows = [
+        {
+            "kind": kind,
+            "value": value,
+            "dedupe_key": key,
+            "status": QUEUED,
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for key, value in keyed.items()
+    ]
+    await db.execute(
+        database.upsert_statement(
+            models.IngestJob.__table__, rows, db.bind.dialect.name, ["dedupe_key"]
+        )
+    )
+    # read in the same transaction, a job which finishes meanwhile loses its key
+    jobs = await db.execute(
+        select(models.IngestJob).filter(models.IngestJob.dedupe_key.in_(keyed))
+    )
+    jobs = {job.dedupe_key: job for job in jobs.scalars()}
+    await db.commit()
+    return [jobs[key] for key in keyed]
+
+
+def claimable(now):
+    return or_(
+        and_(models.IngestJob.status == QUEUED, models.IngestJob.available_at <= now),
+        # the worker which had it is gone
+        and_(models.IngestJob.status == RUNNING, models.IngestJob.locked_until <= now),
+    )
+
+
+class IngestWorkers:
+    def __init__(
+        self, operations, session_factory, workers=None, on_added=None, versions=None
+    ):
+        self.operations = operations
+        self.session_factory = session_factory
+        self.workers = workers or int(os.environ.get("INGEST_WORKERS", 4))
+        self.max_attempts = int(os.environ.get("INGEST_MAX_ATTEMPTS", 5))
+        # first retry waits this long, every next one twice as long
+        self.retry_delay = float(os.environ.get("INGEST_RETRY_DELAY", 2))
+        # a running job goes back to the queue when its worker takes longer
+        self.lease = float(os.environ.get("INGEST_LEASE_SECONDS", 60))
+        self.poll_interval = float(os.environ.get("INGEST_POLL_INTERVAL", 1))
+        # called with every movie a job added
+        self.on_added = on_added
+        # VersionCache of the app, told about the changes of the jobs
+        self.versions = versions
+        self.tasks = []
+        self.wakeup = None
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.tasks = [
+            asyncio.create_task(self._run(), name=f"ingest-{number}")
+            for number in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def notify(self):
+        """
+        Wake the idle workers up, call after enqueueing jobs
+        """
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # database unavailable, try again on the next poll
+                log.exception("Ingest worker failed")
+                processed = False
+            if not processed:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+
+    async def run_once(self):
+        """
+        Claim and process one job, returns False when none is due
+        """
+        async with self.session_factory() as db:
+            job = await self.claim(db)
+            if job is None:
+                return False
+            await self.process(db, job)
+            return True
+
+    async def claim(self, db):
+        now = datetime.utcnow()
+        candidates = await db.execute(
+            select(models.IngestJob.id)
+            .filter(claimable(now))
+            .order_by(models.IngestJob.available_at, models.IngestJob.id)
+            .limit(self.workers)
+        )
+        for id in candidates.scalars().all():
+            # only one worker's UPDATE matches the row, even across processes
+            result = await db.execute(
+                update(models.IngestJob)
+                .where(models.IngestJob.id == id, claimable(now))
+                .values(
+                    status=RUNNING,
+                    attempts=models.IngestJob.attempts + 1,
+                    locked_until=now + timedelta(seconds=self.lease),
+                    updated_at=now,
+                )
+            )
+            await db.commit()
+            if result.rowcount == 1:
+                return await db.get(models.IngestJob, id)
+        return None
+
+    async def process(self, db, job):
+        try:
+            if job.kind == IMDBID:
+                movie = await self.operations.get_movie_info_by_imdbid_async(job.value)
+            else:
+                movie = await self.operations.get_movie_info_async(job.value)
+        except HTTPException as e:
+            if e.status_code == 404:
+                return await self._finish(db, job, DEAD, error=e.detail)
+            return await self._failed(db, job, e.detail)
+        except Exception as e:
+            return await self._failed(db, job, str(e) or type(e).__name__)
+
+        existing = select(models.Movie.id).filter_by(imdbid=movie.imdbid)
+        movie.id = (await db.execute(existing)).scalar()
+        added = movie.id is None
+        if added:
+            table = models.Movie.__table__
+            row = {c.name: getattr(movie, c.name) for c in table.columns}
+            del row["id"]
+            # skips the movie if another job added it meanwhile
+            await db.execute(
+                database.upsert_statement(
+                    table, [row], db.bind.dialect.name, ["imdbid"]
+                )
+            )
+            movie.id = (await db.execute(existing)).scalar()
+        await self._finish(db, job, DONE, movie_id=movie.id, changed=added)
+        if added and self.on_added:
+            self.on_added(movie)
+
+    async def _failed(self, db, job, error):
+        if job.attempts >= self.max_attempts:
+            return await self._finish(db, job, DEAD, error=error)
+        delay = self.retry_delay * 2 ** (job.attempts - 1)
+        log.warning(
+            f"Ingest job {job.id} failed ({job.attempts}/{self.max_attempts}), "
+            f"retrying in {delay}s: {error}"
+        )
+        job.status = QUEUED
+        job.available_at = datetime.utcnow() + timedelta(seconds=delay)
+        job.locked_until = None
+        job.last_error = error
+        job.updated_at = datetime.utcnow()
+        await db.commit()
+
+    async def _finish(self, db, job, status, error=None, movie_id=None, changed=False):
+        if status == DEAD:
+            log.warning(f"Ingest job {job.id} of {job.value} is dead: {error}")
+        # a new job for the movie can be enqueued
+        job.dedupe_key = None
+        job.status = status
+        job.locked_until = None
+        job.last_error = error
+        job.movie_id = movie_id
+        job.updated_at = datetime.utcnow()
+        if changed:
+            # the movie is committed with the job and the version bump
+            await catalogue.commit_change(db, self.versions)
+        else:
+            await db.commit()
@@ -0,0 +1,102 @@
+"""
+Named leases shared by the app processes through the database
+
+A lease is a row of the leases table with its owner and the
+time it ends. It is taken with a conditional UPDATE (or the
+INSERT of the row) which only succeeds when the lease ended or
+is already held by the same process, so with several uvicorn
+workers or instances exactly one of them runs a task like
+seeding the movie table. hold() renews the lease while the task
+runs, the lease of a process which died ends after its seconds
+"""
+import asyncio
+import logging
+import models
+import os
+import socket
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+log = logging.getLogger(__name__)
+
+
+def owner():
+    # the pid is read on every call, workers forked after import differ
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire(db, name, seconds):
+    """
+    Take or renew the lease for seconds, returns whether this process holds it
+    """
+    now = datetime.utcnow()
+    values = {"owner": owner(), "locked_until": now + timedelta(seconds=seconds)}
+    result = await db.execute(
+        update(models.Lease)
+        .where(
+            models.Lease.name == name,
+            or_(models.Lease.locked_until < now, models.Lease.owner == values["owner"]),
+        )
+        .values(**values)
+    )
+    if result.rowcount == 1:
+        await db.commit()
+        return True
+    try:
+        await db.execute(insert(models.Lease).values(name=name, **values))
+        await db.commit()
+    except IntegrityError:
+        # the row exists and somebody else holds it
+        await db.rollback()
+        return False
+    return True
+
+
+async def release(db, name):
+    await db.execute(
+        delete(models.Lease).where(
+            models.Lease.name == name, models.Lease.owner == owner()
+        )
+    )
+    await db.commit()
+
+
+async def _renew(session_factory, name, seconds):
+    while True:
+        await asyncio.sleep(seconds / 3)
+        try:
+            async with session_factory() as db:
+                if not await acquire(db, name, seconds):
+                    log.warning(f"Lost the {name} lease to another process")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception(f"Renewing the {name} lease failed")
+
+
+@asynccontextmanager
+async def hold(session_factory, name, seconds, keep=False):
+    """
+    Take the lease for the block and renew it while the block runs,
+    yields whether it was taken. keep=True holds it for seconds after
+    the block instead of releasing it, so nobody else runs the task again
+    """
+    async with session_factory() as db:
+        held = await acquire(db, name, seconds)
+    if not held:
+        yield False
+        return
+    renewer = asyncio.create_task(_renew(session_factory, name, seconds))
+    try:
+        yield True
+    finally:
+        renewer.cancel()
+        await asyncio.gather(renewer, return_exceptions=True)
+        async with session_factory() as db:
+            if keep:
+                await acquire(db, name, seconds)
+            else:
+                await release(db, name)
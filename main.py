@@ -1,23 +1,44 @@
 """
 Main module
 """
+import asyncio
 import auth_handler
+import bisect
+import catalogue
+import compression
+import database
+import export
+import ingest
 import logging
+import metrics
 import models
 import os
+import pagination
+import profiling
+import refresh
+import seeding
 import serializers
 
+from cache import TTLCache
 from contextlib import asynccontextmanager
 from datetime import timedelta
-from database import Base, SessionLocal, engine
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import RedirectResponse
+from database import AsyncSessionLocal
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import (
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi_pagination import Page, Params
-from fastapi_pagination.ext.sqlalchemy import paginate
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from omdb_util import OMDBUtil
+from typing import Literal
+from omdb_util import AsyncOMDBUtil, OMDBUtil
+from search_index import SearchIndex, split_genres
 from operations import Operations
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 logging.basicConfig(
@@ -26,46 +47,212 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 log.setLevel(level=logging.DEBUG)
 
-if not os.environ.get("fastApiUnittest"):
-    Base.metadata.create_all(engine)
-
 omdb_util = OMDBUtil()
-operations = Operations(omdb_util)
+async_omdb_util = AsyncOMDBUtil()
+operations = Operations(omdb_util, async_omdb_util=async_omdb_util)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# serialized responses of /single and /list
+movie_cache = TTLCache(
+    maxsize=int(os.environ.get("MOVIE_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("MOVIE_CACHE_TTL", 300)),
+)
 
-async def get_db():
-    db = SessionLocal()
+# version of the movie table the ETags of /list and /single are made of
+catalogue_versions = catalogue.VersionCache()
+
+metrics.registry.register_snapshot(
+    "movie_cache",
+    "Size and counters of the /single and /list response cache",
+    movie_cache.stats,
+    counters=("hits", "misses", "evictions", "expirations", "invalidations"),
+)
+
+
+def invalidate_movie_cache(*titles):
+    """
+    Drop the cached responses which change when
+    movies with the given titles are added or removed
+    """
+    # MySQL compares and orders titles case insensitively
+    title_set = {title.casefold() for title in titles if title is not None}
+    titles = sorted(title_set)
+
+    def is_affected(key, value):
+        if key[0] == "single":
+            # without title /single returns any row
+            return key[1] is None or key[1].casefold() in title_set
+        if key[0] == "page":
+            # total and pages of every page change
+            return True
+        low, high = (title and title.casefold() for title in value[1])
+        # the first title which isn't below the span has to be in it
+        index = bisect.bisect_left(titles, low) if low is not None else 0
+        return index < len(titles) and (high is None or titles[index] <= high)
+
+    movie_cache.pop_matching(is_affected)
+
+
+def movie_added(movie):
+    """
+    Keep the caches and the search index up to date
+    with a movie the ingest workers added
+    """
+    invalidate_movie_cache(movie.title)
+    movie_index.add(movie)
+
+
+def movies_refreshed(movies):
+    """
+    Keep the caches and the search index up to date with
+    movies the catalogue refresh added or fetched again
+    """
+    # titles of refreshed rows can change, the old ones aren't known
+    movie_cache.clear()
+    for movie in movies:
+        movie_index.add(movie)
+
+
+ingest_workers = ingest.IngestWorkers(
+    operations, AsyncSessionLocal, on_added=movie_added, versions=catalogue_versions
+)
+
+catalogue_refresher = refresh.CatalogueRefresher(
+    operations,
+    AsyncSessionLocal,
+    on_refreshed=movies_refreshed,
+    versions=catalogue_versions,
+)
+
+# rows deleted per transaction by /remove/bulk
+REMOVE_CHUNK_SIZE = int(os.environ.get("REMOVE_CHUNK_SIZE", 500))
+
+# word index of the movies behind /search
+movie_index = SearchIndex()
+movie_index_lock = asyncio.Lock()
+
+
+async def build_movie_index(db: AsyncSession):
+    movie_index.begin_build()
+    columns = [
+        getattr(models.Movie, name)
+        for name in ("id", "title", "year", "genre", "director", "writer", "actors")
+    ]
     try:
+        result = await db.stream(
+            select(*columns).execution_options(yield_per=export.BATCH_SIZE)
+        )
+        rows = [row async for row in result]
+    except BaseException:
+        # the changes recorded for the build would pile up otherwise
+        movie_index.abort_build()
+        raise
+    # building takes a while on big tables, searches keep
+    # using the previous content until it's done
+    count = await asyncio.to_thread(movie_index.build, rows)
+    log.info(f"Indexed {count} movies for search")
+
+
+async def index_movies():
+    async with AsyncSessionLocal() as db, movie_index_lock:
+        await build_movie_index(db)
+
+
+# set while the index has to be read again, see catalogue_changed()
+movie_index_stale = asyncio.Event()
+movie_index_rebuild = None
+
+
+async def rebuild_movie_index():
+    # changes seen while a rebuild runs are picked up by the next one
+    while movie_index_stale.is_set():
+        movie_index_stale.clear()
+        try:
+            await index_movies()
+        except Exception:
+            log.exception("Rebuilding the search index failed")
+            return
+
+
+def catalogue_changed():
+    """
+    Another app process changed the movie table, the cached responses
+    and the search index of this one don't have the change
+    """
+    global movie_index_rebuild
+    movie_cache.clear()
+    if not movie_index.built:
+        # read on the first search or when seeding is done
+        return
+    movie_index_stale.set()
+    if movie_index_rebuild is None or movie_index_rebuild.done():
+        movie_index_rebuild = asyncio.create_task(rebuild_movie_index())
+
+
+catalogue_versions.on_change = catalogue_changed
+
+# seeds an empty movie table in the background, then indexes the movies
+seeder = seeding.Seeder(catalogue_refresher, AsyncSessionLocal, on_done=index_movies)
+
+
+def json_response(content, headers=None):
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+async def catalogue_validators(request: Request, db: AsyncSession):
+    """
+    Return the ETag and Last-Modified headers of the catalogue and
+    the 304 response to send instead when the client's copy is current
+    """
+    headers = catalogue.validators(*await catalogue_versions.get(db))
+    if catalogue.not_modified(request.headers, headers):
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # get db object from get_db generator
-    db = await get_db().__anext__()
-
-    # check if table is empty, populate db with data only if table is empty
-    if not db.query(models.Movie).first():
-        values = operations.get_100_movies_information_from_omdb()
-        db.add_all(values)
-        db.commit()
-    else:
-        log.info("Don't need to populate db with data as data aleady exists")
+    # alembic runs on the sync engine
+    await asyncio.to_thread(database.run_migrations)
+
+    # requests are served while the seeder fills an empty table
+    seeder.start()
+    ingest_workers.start()
+    catalogue_refresher.start()
     yield
+    await seeder.stop()
+    if movie_index_rebuild is not None:
+        movie_index_rebuild.cancel()
+    await catalogue_refresher.stop()
+    await ingest_workers.stop()
+    await async_omdb_util.aclose()
+    # pooled connections keep the process alive otherwise
+    await database.async_engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
+# innermost, so the metrics and profiles include the compression
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+# slow requests profiled by the middleware, served by /profiles
+profile_store = profiling.store_from_env()
+app.add_middleware(profiling.ProfilingMiddleware, store=profile_store)
 
 
 @app.post("/token")
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = auth_handler.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth_handler.authenticate_user(
+        db, form_data.username, form_data.password
+    )
     if not user:
         raise HTTPException(
             status_code=401,
@@ -85,71 +272,505 @@ async def docs_redirect():
     return RedirectResponse(url="/docs")
 
 
-@app.get("/list", response_model=Page[serializers.Movie])
-async def list_movie(db: Session = Depends(get_db), page: int = 1, perpage: int = 10):
+@app.get("/list", response_model=Page[serializers.Movie] | serializers.MovieCursorPage)
+async def list_movie(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    page: int = 1,
+    perpage: int = 10,
+    paging: Literal["page", "cursor"] = "page",
+    cursor: str | None = None,
+    fields: str | None = None,
+):
     """
     Route to lists movies with pagination
     Default page size is 10
+    paging=cursor returns next_cursor/previous_cursor to pass
+    as param cursor instead of page numbers, it doesn't count
+    the rows so deep pages are as fast as the first one
+    fields=id,title,year returns only these fields of the movies
+    Answers If-None-Match and If-Modified-Since with 304
+    when the catalogue didn't change
+    """
+    fields = pagination.parse_fields(fields)
+    # a change committed while the rows are read mustn't be cached over
+    generation = movie_cache.generation
+    headers, not_modified = await catalogue_validators(request, db)
+    if not_modified:
+        return not_modified
+    if paging == "cursor":
+        key = ("cursor", perpage, cursor, fields)
+        cached = movie_cache.get(key)
+        if cached is None:
+            result = await pagination.paginate_by_cursor(db, perpage, cursor, fields)
+            content = pagination.encode_page(result, fields)
+            cached = (content, pagination.title_span(result, cursor))
+            movie_cache.set(key, cached, generation=generation)
+        return json_response(cached[0], headers)
+
+    key = ("page", page, perpage, fields)
+    content = movie_cache.get(key)
+    if content is None:
+        params = Params(size=perpage, page=page)
+        result = await pagination.paginate_by_offset(db, params, fields)
+        content = pagination.encode_page(result, fields)
+        movie_cache.set(key, content, generation=generation)
+    return json_response(content, headers)
+
+
+@app.get("/export")
+async def export_movies(
+    db: AsyncSession = Depends(get_db), format: Literal["ndjson", "csv"] = "ndjson"
+):
+    """
+    Route to download every movie as NDJSON (one object per line) or CSV
+    Rows are streamed as they are read from the db
     """
-    params = Params(size=perpage, page=page)
-    return paginate(db, db.query(models.Movie).order_by(models.Movie.title), params)
+    return StreamingResponse(
+        export.stream_movies(db, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=movies.{format}"},
+    )
 
 
-@app.get("/single")
-async def single_movie(db: Session = Depends(get_db), title: str = None):
+@app.get("/search", response_model=serializers.SearchResults)
+async def search_movies(
+    db: AsyncSession = Depends(get_db),
+    q: str = "",
+    genre: str | None = None,
+    year: int | None = None,
+    page: int = 1,
+    perpage: int = 10,
+):
+    """
+    Route to search movies by words of their title, actors, director,
+    writer and genre, best matches first
+    The last letters of a word can be left out, every word has to match
+    genre and year narrow the results down, facets has the number
+    of results per genre and year
+    """
+    if page < 1:
+        raise HTTPException(400, detail="page must be positive")
+    if not 1 <= perpage <= pagination.MAX_PAGE_SIZE:
+        raise HTTPException(
+            400, detail=f"perpage must be between 1 and {pagination.MAX_PAGE_SIZE}"
+        )
+    if not movie_index.built:
+        async with movie_index_lock:
+            if not movie_index.built:
+                await build_movie_index(db)
+    # notices changes of other app processes, see catalogue_changed()
+    await catalogue_versions.get(db)
+    found = movie_index.search(
+        q, genre=genre, year=year, limit=perpage, offset=(page - 1) * perpage
+    )
+    ids = [id for id, _ in found["hits"]]
+    movies = {}
+    if ids:
+        query = select(models.Movie).filter(models.Movie.id.in_(ids))
+        movies = {movie.id: movie for movie in (await db.execute(query)).scalars()}
+    items = [
+        dict(
+            serializers.Movie.model_validate(movies[id], from_attributes=True),
+            score=score,
+        )
+        for id, score in found["hits"]
+        if id in movies
+    ]
+    return {
+        "items": items,
+        "total": found["total"],
+        "page": page,
+        "size": perpage,
+        "facets": found["facets"],
+    }
+
+
+@app.get("/single", response_model=serializers.Movie)
+async def single_movie(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    title: str = None,
+    fields: str | None = None,
+):
     """
     Route to get single movie
     param title to get movie by title, this param is optional
     by default it will return first row
+    fields=id,title,year returns only these fields
+    Answers If-None-Match and If-Modified-Since with 304
+    when the catalogue didn't change
     """
-    if title:
-        single_movie = (
-            db.query(models.Movie).filter(models.Movie.title == title).limit(1).all()
-        )
-        single_movie = single_movie[0] if single_movie else None
-    else:
-        single_movie = db.query(models.Movie).first()
-    if not single_movie:
-        raise HTTPException(404, detail="Movie not found")
-    return single_movie
+    fields = pagination.parse_fields(fields)
+    # a change committed while the rows are read mustn't be cached over
+    generation = movie_cache.generation
+    headers, not_modified = await catalogue_validators(request, db)
+    if not_modified:
+        return not_modified
+    key = ("single", title or None, fields)
+    content = movie_cache.get(key)
+    if content is None:
+        query = select(*pagination.columns(fields))
+        if title:
+            query = query.filter(models.Movie.title == title)
+        single_movie = (await db.execute(query.limit(1))).first()
+        if not single_movie:
+            raise HTTPException(404, detail="Movie not found")
+        content = pagination.encode_movie(single_movie, fields)
+        movie_cache.set(key, content, generation=generation)
+    return json_response(content, headers)
 
 
 @app.post("/add", response_model=serializers.Movie)
-async def add_movie(title: str, db: Session = Depends(get_db)):
+async def add_movie(title: str, db: AsyncSession = Depends(get_db)):
     """
     Route to add movie by param title
     Gets movie information from OMDB based on title param and add it to db
     """
-    if db.query(models.Movie).filter_by(title=title).first() is not None:
+    existing = await db.execute(select(models.Movie.id).filter_by(title=title).limit(1))
+    if existing.first() is not None:
         raise HTTPException(409, detail="Movie already exists in database")
-    movie_to_be_added = operations.get_movie_info(title)
+    movie_to_be_added = await operations.get_movie_info_async(title)
     db.add(movie_to_be_added)
-    db.commit()
+    try:
+        await catalogue.commit_change(db, catalogue_versions)
+    except IntegrityError:
+        # a concurrent request for the same title inserted it first
+        await db.rollback()
+        raise HTTPException(409, detail="Movie already exists in database")
+    invalidate_movie_cache(movie_to_be_added.title)
+    movie_index.add(movie_to_be_added)
     return movie_to_be_added
 
 
+@app.post("/add/bulk", response_model=serializers.BulkAddResponse)
+async def add_movies(
+    request: serializers.BulkAddRequest, db: AsyncSession = Depends(get_db)
+):
+    """
+    Route to add many movies by title in one request
+    Titles which are not in db yet are fetched from OMDB concurrently
+    and inserted with one statement, returns the status of every title
+    """
+    titles = list(dict.fromkeys(request.titles))
+    existing = await db.execute(
+        select(models.Movie.id, models.Movie.imdbid, models.Movie.title).filter(
+            models.Movie.title.in_(titles)
+        )
+    )
+    # MySQL compares titles case insensitively
+    existing = {movie.title.lower(): movie for movie in existing}
+    results = {
+        title: serializers.BulkAddResult(
+            title=title,
+            status="exists",
+            id=existing[title.lower()].id,
+            imdbid=existing[title.lower()].imdbid,
+        )
+        for title in titles
+        if title.lower() in existing
+    }
+
+    fetched = await operations.get_movies_info_async(
+        [title for title in titles if title not in results]
+    )
+    movies = {}
+    for title, movie in fetched.items():
+        if isinstance(movie, HTTPException) and movie.status_code == 404:
+            results[title] = serializers.BulkAddResult(title=title, status="not_found")
+        elif isinstance(movie, Exception):
+            log.warning(f"Failed to get {title} from OMDB: {movie}")
+            results[title] = serializers.BulkAddResult(
+                title=title, status="error", detail=str(movie)
+            )
+        else:
+            movies[title] = movie
+
+    if movies:
+        table = models.Movie.__table__
+        imdbids = {movie.imdbid for movie in movies.values()}
+        # titles can resolve to movies stored under another title
+        already_stored = set(
+            (
+                await db.execute(
+                    select(models.Movie.imdbid).filter(models.Movie.imdbid.in_(imdbids))
+                )
+            ).scalars()
+        )
+        rows = {
+            movie.imdbid: {
+                column.name: getattr(movie, column.name)
+                for column in table.columns
+                if column.name != "id"
+            }
+            for movie in movies.values()
+            if movie.imdbid not in already_stored
+        }
+        if rows:
+            await db.execute(
+                database.upsert_statement(
+                    table, list(rows.values()), db.bind.dialect.name, ["imdbid"]
+                )
+            )
+        ids = dict(
+            (
+                await db.execute(
+                    select(models.Movie.imdbid, models.Movie.id).filter(
+                        models.Movie.imdbid.in_(imdbids)
+                    )
+                )
+            ).all()
+        )
+        if rows:
+            await catalogue.commit_change(db, catalogue_versions)
+        else:
+            await db.commit()
+        for title, movie in movies.items():
+            row = rows.pop(movie.imdbid, None)
+            added = row is not None
+            results[title] = serializers.BulkAddResult(
+                title=title,
+                status="added" if added else "exists",
+                id=ids.get(movie.imdbid),
+                imdbid=movie.imdbid,
+            )
+            if added:
+                invalidate_movie_cache(movie.title)
+                movie_index.add(models.Movie(id=ids[movie.imdbid], **row))
+
+    return {"results": [results[title] for title in titles]}
+
+
+@app.post("/ingest", response_model=serializers.IngestJobs, status_code=202)
+async def ingest_movies(
+    request: serializers.IngestRequest, db: AsyncSession = Depends(get_db)
+):
+    """
+    Route to add movies by title and/or imdbID in the background
+    Returns a job per movie right away, the movies are fetched from OMDB
+    and added to db by the ingest workers, poll /ingest/{id} for the status
+    """
+    jobs = await ingest.enqueue(db, ingest.TITLE, request.titles)
+    jobs += await ingest.enqueue(db, ingest.IMDBID, request.imdbids)
+    ingest_workers.notify()
+    return {"jobs": jobs}
+
+
+@app.get("/ingest/{job_id}", response_model=serializers.IngestJob)
+async def ingest_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Route to get the status of an ingest job
+    """
+    job = await db.get(models.IngestJob, job_id)
+    if job is None:
+        raise HTTPException(404, detail=f"Ingest job with id: {job_id} not found")
+    return job
+
+
+@app.get("/ingest", response_model=serializers.IngestJobs)
+async def ingest_jobs(
+    db: AsyncSession = Depends(get_db),
+    status: Literal["queued", "running", "done", "dead"] = "dead",
+    limit: int = 100,
+):
+    """
+    Route to list the latest ingest jobs with a status, by default
+    the dead ones which ran out of attempts or weren't found in OMDB
+    """
+    query = (
+        select(models.IngestJob)
+        .filter_by(status=status)
+        .order_by(models.IngestJob.id.desc())
+        .limit(min(limit, pagination.MAX_PAGE_SIZE))
+    )
+    return {"jobs": (await db.execute(query)).scalars().all()}
+
+
 @app.delete("/remove")
 async def remove_movie(
-    id: int, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    id: int, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
 ):
     """
     Route to delete movie by param id
     """
-    if not auth_handler.get_current_user(db, token):
+    if not await auth_handler.get_current_user(db, token):
         raise HTTPException(401, detail="Authentication failed")
-    result = db.query(models.Movie).filter_by(id=id).delete()
-    db.commit()
-    if not result:
+    title = (await db.execute(select(models.Movie.title).filter_by(id=id))).scalar()
+    result = await db.execute(delete(models.Movie).filter_by(id=id))
+    if not result.rowcount:
+        await db.commit()
         raise HTTPException(404, detail=f"Movie with id: {id} not found")
+    await catalogue.commit_change(db, catalogue_versions)
+    invalidate_movie_cache(title)
+    movie_index.remove(id)
     return {"1 row": "removed"}
 
 
+@app.post("/remove/bulk", response_model=serializers.BulkRemoveResponse)
+async def remove_movies(
+    request: serializers.BulkRemoveRequest,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Route to delete many movies by ids, or every movie of a year and/or genre
+    Rows are deleted REMOVE_CHUNK_SIZE at a time, each chunk in its own
+    transaction, so no row stays locked for long
+    returns the number of removed movies and the ids which were not found
+    """
+    if not await auth_handler.get_current_user(db, token):
+        raise HTTPException(401, detail="Authentication failed")
+    removed = 0
+    not_found = []
+
+    async def remove_chunk(found):
+        nonlocal removed
+        if not found:
+            # ends the transaction of the select
+            await db.commit()
+            return
+        await db.execute(delete(models.Movie).filter(models.Movie.id.in_(found)))
+        await catalogue.commit_change(db, catalogue_versions)
+        invalidate_movie_cache(*found.values())
+        for id in found:
+            movie_index.remove(id)
+        removed += len(found)
+
+    if request.ids is not None:
+        ids = list(dict.fromkeys(request.ids))
+        for start in range(0, len(ids), REMOVE_CHUNK_SIZE):
+            chunk = ids[start : start + REMOVE_CHUNK_SIZE]
+            query = select(models.Movie.id, models.Movie.title).filter(
+                models.Movie.id.in_(chunk)
+            )
+            found = dict((await db.execute(query)).all())
+            not_found.extend(id for id in chunk if id not in found)
+            await remove_chunk(found)
+    else:
+        genre = request.genre.strip().lower() if request.genre else None
+        last_id = 0
+        while True:
+            # walks the primary key so every chunk starts where the last one ended
+            query = (
+                select(models.Movie.id, models.Movie.title, models.Movie.genre)
+                .filter(models.Movie.id > last_id)
+                .order_by(models.Movie.id)
+                .limit(REMOVE_CHUNK_SIZE)
+            )
+            if request.year is not None:
+                query = query.filter(models.Movie.year == request.year)
+            if genre:
+                # LIKE narrows the rows down, whole genres are compared below,
+                # it's case sensitive with binary collations so both sides are lowered
+                query = query.filter(
+                    models.Movie.genre.icontains(genre, autoescape=True)
+                )
+            rows = (await db.execute(query)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            found = {
+                row.id: row.title
+                for row in rows
+                if not genre or genre in map(str.lower, split_genres(row.genre))
+            }
+            await remove_chunk(found)
+
+    return {"removed": removed, "not_found": not_found}
+
+
+@app.get("/health/live")
+async def liveness():
+    """
+    Route for the liveness probe, answers as long as the app process runs,
+    seed has the progress of seeding the movie table
+    """
+    return {"status": "ok", "seed": seeder.status()}
+
+
+@app.get("/health/ready")
+async def readiness(db: AsyncSession = Depends(get_db)):
+    """
+    Route for the readiness probe, 503 while the database can't be
+    reached. Requests are served while the movie table is seeded,
+    seed has the progress
+    """
+    try:
+        await db.execute(select(1))
+    except Exception:
+        log.exception("Readiness check failed")
+        return JSONResponse(
+            {"status": "unavailable", "seed": seeder.status()}, status_code=503
+        )
+    return {"status": "ready", "seed": seeder.status()}
+
+
+@app.get("/stats/pool")
+async def pool_stats():
+    """
+    Route to get the state of the database connection pool
+    """
+    return database.pool_status()
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """
+    Route to get the hit/miss/eviction counters of the movie cache
+    """
+    return movie_cache.stats()
+
+
+@app.get("/profiles")
+async def list_profiles(
+    limit: int = 20,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Route to list the newest profiles of slow requests, without their call
+    profile and statements, see the profiling module for how to turn it on
+    """
+    if not await auth_handler.get_current_user(db, token):
+        raise HTTPException(401, detail="Authentication failed")
+    summaries = await asyncio.to_thread(
+        profile_store.summaries, min(limit, pagination.MAX_PAGE_SIZE)
+    )
+    return {"profiles": summaries}
+
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Route to get a profile with the call profile and the SQL statements
+    """
+    if not await auth_handler.get_current_user(db, token):
+        raise HTTPException(401, detail="Authentication failed")
+    profile = await asyncio.to_thread(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(404, detail=f"Profile {profile_id} not found")
+    return profile
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Route to scrape the request, database, OMDB, pool and
+    cache metrics of this app process in the Prometheus format
+    """
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post("/singup")
-async def signUp(new_user: serializers.Users, db: Session = Depends(get_db)):
+async def signUp(new_user: serializers.Users, db: AsyncSession = Depends(get_db)):
     new_user = models.Users(
         username=new_user.username,
-        password=auth_handler.get_password_hash(new_user.password),
+        password=await auth_handler.get_password_hash_async(new_user.password),
     )
     db.add(new_user)
-    db.commit()
+    await db.commit()
     return {"signup": "Successful"}
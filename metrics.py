@@ -0,0 +1,219 @@
+"""
+Counters and histograms served in the Prometheus text format
+
+Metrics are kept in memory of the app process and rendered by
+the /metrics route. Recording one takes a lock and a bisect, so
+instrumenting every request, query and OMDB call stays cheap.
+Every app process has its own metrics, like the caches
+"""
+import bisect
+import re
+import threading
+import time
+
+# seconds, from a cached response to a slow OMDB call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def register(self, metric):
+        # a module imported again replaces its metrics
+        self.metrics[metric.name] = metric
+        return metric
+
+    def register_snapshot(self, prefix, help, snapshot, counters=()):
+        """
+        Render every number of the dict snapshot() returns as
+        <prefix>_<key>, the keys in counters as <prefix>_<key>_total counters
+        """
+
+        def collect():
+            for key, value in snapshot().items():
+                if key in counters:
+                    name = key if key.endswith("_total") else f"{key}_total"
+                    yield f"{prefix}_{name}", "counter", help, value
+                else:
+                    yield f"{prefix}_{key}", "gauge", help, value
+
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, type, help, value in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type}")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=(), registry=registry):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            lines.append(
+                f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=registry
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket and one above the last, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labels):
+        entry = self.values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            values = [
+                (labels, list(counts), sum_)
+                for labels, (counts, sum_) in self.values.items()
+            ]
+        bounds = self.buckets + (float("inf"),)
+        for labels, counts, sum_ in values:
+            total = 0
+            for bound, count in zip(bounds, counts):
+                total += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {total}"
+                )
+            label_text = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(sum_)}")
+            lines.append(f"{self.name}_count{label_text} {total}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer a request, by route template and status",
+    ["method", "route", "status"],
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware which records the latency of every request, labelled
+    by the route template (/ingest/{job_id}) so ids don't add labels
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # endpoint -> route template, filled on first use
+        self.route_paths = None
+
+    def route_path(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self.route_paths is None:
+            self.route_paths = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint")
+            }
+        return self.route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                self.route_path(scope),
+                str(status),
+            )
+
+
+STATEMENT_PATTERN = re.compile(r"\s*(\w+)")
+
+# anything else is counted as other so the labels stay few
+OPERATIONS = {"select", "insert", "update", "delete", "replace"}
+
+
+def statement_operation(statement):
+    match = STATEMENT_PATTERN.match(statement)
+    operation = match.group(1).lower() if match else ""
+    return operation if operation in OPERATIONS else "other"
@@ -0,0 +1,35 @@
+"""
+Alembic environment, migrates the database configured in database.py
+or the connection passed by database.run_migrations
+"""
+from alembic import context
+from database import Base, engine
+
+import models  # noqa: F401 registers the tables on Base.metadata
+
+config = context.config
+
+
+def run_migrations_offline():
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=Base.metadata,
+        literal_binds=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online(connection):
+    context.configure(connection=connection, target_metadata=Base.metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif config.attributes.get("connection") is not None:
+    run_migrations_online(config.attributes["connection"])
+else:
+    with engine.connect() as connection:
+        run_migrations_online(connection)
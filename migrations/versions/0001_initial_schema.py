@@ -0,0 +1,56 @@
+"""
+initial schema
+
+Tables which already exist were created by Base.metadata.create_all
+before migrations were introduced and are left as they are
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+movie_table = os.environ.get("TABLE_NAME", "omdb_movie_info")
+
+
+def upgrade():
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+    if movie_table not in existing_tables:
+        op.create_table(
+            movie_table,
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column("imdbid", sa.VARCHAR(255), unique=True, nullable=False),
+            sa.Column("title", sa.VARCHAR(255), nullable=False),
+            sa.Column("year", sa.Integer, nullable=True),
+            sa.Column("genre", sa.VARCHAR(255), nullable=True),
+            sa.Column("released", sa.VARCHAR(255), nullable=True),
+            sa.Column("language", sa.VARCHAR(255), nullable=True),
+            sa.Column("director", sa.TEXT, nullable=True),
+            sa.Column("writer", sa.TEXT, nullable=True),
+            sa.Column("actors", sa.TEXT, nullable=True),
+        )
+    if "britetest_users" not in existing_tables:
+        op.create_table(
+            "britetest_users",
+            sa.Column(
+                "username",
+                sa.VARCHAR(255),
+                primary_key=True,
+                unique=True,
+                nullable=False,
+            ),
+            sa.Column("password", sa.VARCHAR(255), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table("britetest_users")
+    op.drop_table(movie_table)
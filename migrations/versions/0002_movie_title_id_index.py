@@ -0,0 +1,41 @@
+"""
+index movies by (title, id)
+
+Covers ordering of /list and the title lookups of /single and
+/add. MySQL builds it in place without locking the table so
+it can run while the app serves traffic
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+movie_table = os.environ.get("TABLE_NAME", "omdb_movie_info")
+index_name = f"ix_{movie_table}_title_id"
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing_indexes = sa.inspect(bind).get_indexes(movie_table)
+    if index_name in {index["name"] for index in existing_indexes}:
+        return
+    if bind.dialect.name == "mysql":
+        op.execute(
+            f"ALTER TABLE `{movie_table}` ADD INDEX `{index_name}` (title, id), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.create_index(index_name, movie_table, ["title", "id"])
+
+
+def downgrade():
+    op.drop_index(index_name, table_name=movie_table)
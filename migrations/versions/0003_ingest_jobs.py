@@ -0,0 +1,41 @@
+"""
+queue of OMDB ingest jobs
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "ingest_jobs" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "ingest_jobs",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("kind", sa.VARCHAR(16), nullable=False),
+        sa.Column("value", sa.VARCHAR(255), nullable=False),
+        sa.Column("dedupe_key", sa.VARCHAR(300), unique=True, nullable=True),
+        sa.Column("status", sa.VARCHAR(16), nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("available_at", sa.DateTime, nullable=False),
+        sa.Column("locked_until", sa.DateTime, nullable=True),
+        sa.Column("last_error", sa.TEXT, nullable=True),
+        sa.Column("movie_id", sa.Integer, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+    op.create_index(
+        "ix_ingest_jobs_status_available_at", "ingest_jobs", ["status", "available_at"]
+    )
+
+
+def downgrade():
+    op.drop_table("ingest_jobs")
@@ -0,0 +1,40 @@
+"""
+record when movies were last fetched from OMDB
+
+Existing rows get NULL and are fetched again by the first
+catalogue refresh. MySQL adds the column in place without
+locking the table so it can run while the app serves traffic
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+movie_table = os.environ.get("TABLE_NAME", "omdb_movie_info")
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing_columns = sa.inspect(bind).get_columns(movie_table)
+    if "fetched_at" in {column["name"] for column in existing_columns}:
+        return
+    if bind.dialect.name == "mysql":
+        op.execute(
+            f"ALTER TABLE `{movie_table}` ADD COLUMN fetched_at DATETIME NULL, "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.add_column(movie_table, sa.Column("fetched_at", sa.DateTime, nullable=True))
+
+
+def downgrade():
+    op.drop_column(movie_table, "fetched_at")
@@ -0,0 +1,36 @@
+"""
+version of the movie catalogue
+
+Single row bumped by every change of the movie table, the
+ETags and Last-Modified headers of /list and /single are
+made of it
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "catalogue_version" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    table = op.create_table(
+        "catalogue_version",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("version", sa.Integer, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+    op.bulk_insert(table, [{"id": 1, "version": 1, "updated_at": datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table("catalogue_version")
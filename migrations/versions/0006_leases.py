@@ -0,0 +1,32 @@
+"""
+leases
+
+Named leases which let one app process at a time seed the
+movie table or run the catalogue refresh
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "leases" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "leases",
+        sa.Column("name", sa.VARCHAR(64), primary_key=True),
+        sa.Column("owner", sa.VARCHAR(255), nullable=False),
+        sa.Column("locked_until", sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("leases")
@@ -0,0 +1,39 @@
+"""
+record when the movie table was seeded
+
+The seed marks its completion in the catalogue_version row,
+so a seed which died halfway is completed by another process.
+Tables which have movies already were seeded before
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+movie_table = os.environ.get("TABLE_NAME", "omdb_movie_info")
+
+
+def upgrade():
+    existing_columns = sa.inspect(op.get_bind()).get_columns("catalogue_version")
+    if "seeded_at" in {column["name"] for column in existing_columns}:
+        return
+    op.add_column(
+        "catalogue_version", sa.Column("seeded_at", sa.DateTime, nullable=True)
+    )
+    op.execute(
+        "UPDATE catalogue_version SET seeded_at = updated_at "
+        f"WHERE EXISTS (SELECT 1 FROM {movie_table})"
+    )
+
+
+def downgrade():
+    op.drop_column("catalogue_version", "seeded_at")
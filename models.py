@@ -1,6 +1,7 @@
 import os
 from database import Base
-from sqlalchemy import Integer, VARCHAR, TEXT
+from datetime import datetime
+from sqlalchemy import DateTime, Index, Integer, VARCHAR, TEXT
 from sqlalchemy.orm import Mapped, mapped_column
 
 
@@ -10,6 +11,9 @@ class Movie(Base):
     """
 
     __tablename__ = os.environ.get("TABLE_NAME", "omdb_movie_info")
+    # /list orders by title (and id in cursor mode), /single and
+    # /add look movies up by title, tables are changed by migrations
+    __table_args__ = (Index(f"ix_{__tablename__}_title_id", "title", "id"),)
 
     # Did not take all the fields which OMDB provides, took a few
     # and created the model
@@ -23,6 +27,9 @@ class Movie(Base):
     director: Mapped[TEXT] = mapped_column(TEXT, nullable=True)
     writer: Mapped[TEXT] = mapped_column(TEXT, nullable=True)
     actors: Mapped[TEXT] = mapped_column(TEXT, nullable=True)
+    # when the row was last fetched from OMDB, NULL for rows older than
+    # the column, the catalogue refresh fetches rows again once stale
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
 
 class Users(Base):
@@ -32,3 +39,60 @@ class Users(Base):
         VARCHAR(255), primary_key=True, unique=True, nullable=False
     )
     password: Mapped[VARCHAR] = mapped_column(VARCHAR(255), nullable=False)
+
+
+class IngestJob(Base):
+    """
+    OMDB fetch of a movie by title or imdbID, processed by the ingest workers
+    """
+
+    __tablename__ = "ingest_jobs"
+    # workers look for queued jobs which are due
+    __table_args__ = (
+        Index("ix_ingest_jobs_status_available_at", "status", "available_at"),
+    )
+
+    id: Mapped[Integer] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[VARCHAR] = mapped_column(VARCHAR(16))
+    value: Mapped[VARCHAR] = mapped_column(VARCHAR(255))
+    # one queued or running job per movie, cleared when the job is over
+    dedupe_key: Mapped[VARCHAR] = mapped_column(
+        VARCHAR(300), unique=True, nullable=True
+    )
+    status: Mapped[VARCHAR] = mapped_column(VARCHAR(16))
+    attempts: Mapped[Integer] = mapped_column(Integer, default=0)
+    available_at: Mapped[datetime] = mapped_column(DateTime)
+    locked_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[TEXT] = mapped_column(TEXT, nullable=True)
+    movie_id: Mapped[Integer] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class CatalogueVersion(Base):
+    """
+    Single row bumped by every change of the movie table, ETags of
+    /list and /single are made of it
+    """
+
+    __tablename__ = "catalogue_version"
+
+    id: Mapped[Integer] = mapped_column(Integer, primary_key=True)
+    version: Mapped[Integer] = mapped_column(Integer)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+    # when the seed of the empty movie table was completed, see seeding.py
+    seeded_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class Lease(Base):
+    """
+    Named lease which lets one app process at a time run a task
+    like seeding the movie table, see leases.py
+    """
+
+    __tablename__ = "leases"
+
+    name: Mapped[VARCHAR] = mapped_column(VARCHAR(64), primary_key=True)
+    # host and pid of the process holding it
+    owner: Mapped[VARCHAR] = mapped_column(VARCHAR(255))
+    locked_until: Mapped[datetime] = mapped_column(DateTime)
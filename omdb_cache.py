@@ -0,0 +1,144 @@
+"""
+OMDB responses cached in a local sqlite file
+
+Entries are keyed by the normalized query params without the
+apikey and survive restarts, "Response: False" answers are
+cached too (for a shorter time) so titles which OMDB doesn't
+know don't cost a request every time they are asked for
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class OMDBResponseCache:
+    def __init__(self, path: str, ttl: float, negative_ttl: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS omdb_responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def key(params):
+        """
+        Same key for queries which only differ by apikey,
+        case or surrounding whitespace
+        """
+        return json.dumps(
+            {
+                name.lower(): str(value).strip().lower()
+                for name, value in params.items()
+                if name.lower() != "apikey"
+            },
+            sort_keys=True,
+        )
+
+    def get(self, params):
+        """
+        Return the cached response of the query or None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, expires_at FROM omdb_responses WHERE key = ?",
+                (self.key(params),),
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, params, response, ttl: float | None = None):
+        if ttl is None:
+            ttl = self.negative_ttl if response.get("Response") == "False" else self.ttl
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO omdb_responses VALUES (?, ?, ?)",
+                (self.key(params), json.dumps(response), time.time() + ttl),
+            )
+
+    def purge_expired(self):
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM omdb_responses WHERE expires_at <= ?", (time.time(),)
+            )
+
+    def warm_from_file(self, path):
+        """
+        Load responses from a file with one {"params": ..., "response": ...}
+        JSON object per line, as written by dump_to_file
+        """
+        count = 0
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.set(entry["params"], entry["response"])
+                    count += 1
+        return count
+
+    def dump_to_file(self, path):
+        """
+        Write the responses which haven't expired to a file warm_from_file reads
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key, response FROM omdb_responses WHERE expires_at > ?",
+                (time.time(),),
+            ).fetchall()
+        with open(path, "w") as f:
+            for key, response in rows:
+                entry = {"params": json.loads(key), "response": json.loads(response)}
+                f.write(json.dumps(entry) + "\n")
+        return len(rows)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Return the cache shared by the OMDB clients,
+    None when OMDB_CACHE_PATH is not set
+    """
+    global _response_cache
+    path = os.environ.get("OMDB_CACHE_PATH")
+    if not path:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = OMDBResponseCache(
+                path,
+                ttl=float(os.environ.get("OMDB_CACHE_TTL", 7 * 24 * 3600)),
+                negative_ttl=float(
+                    os.environ.get("OMDB_CACHE_NEGATIVE_TTL", 24 * 3600)
+                ),
+            )
+            _response_cache.purge_expired()
+            if os.environ.get("OMDB_CACHE_WARM_FILE"):
+                _response_cache.warm_from_file(os.environ["OMDB_CACHE_WARM_FILE"])
+        return _response_cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OMDB response cache")
+    parser.add_argument("command", choices=["dump", "warm"])
+    parser.add_argument("file")
+    args = parser.parse_args()
+    cache = get_response_cache()
+    if cache is None:
+        parser.error("OMDB_CACHE_PATH is not set")
+    if args.command == "dump":
+        print(f"wrote {cache.dump_to_file(args.file)} responses to {args.file}")
+    else:
+        print(f"loaded {cache.warm_from_file(args.file)} responses from {args.file}")
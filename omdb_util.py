@@ -1,13 +1,288 @@
+import asyncio
+import collections
+import concurrent.futures
+import httpx
+import metrics
 import os
 import requests
+import threading
+import time
 from requests.adapters import HTTPAdapter, Retry
 from fastapi import HTTPException
+from omdb_cache import OMDBResponseCache, get_response_cache
+from urllib.parse import urlparse
+
+
+# cached responses aren't counted, the time includes retries and their backoff
+request_duration = metrics.Histogram(
+    "omdb_request_duration_seconds",
+    "Time of an OMDB query which wasn't cached",
+    ["client"],
+)
+retries_total = metrics.Counter(
+    "omdb_retries_total", "Requests sent to OMDB again after a failure", ["client"]
+)
+errors_total = metrics.Counter(
+    "omdb_errors_total",
+    "OMDB queries which failed: request (no answer), status or not_found",
+    ["client", "reason"],
+)
+coalesced_total = metrics.Counter(
+    "omdb_coalesced_total",
+    "OMDB queries which shared the fetch of an identical query in flight",
+    ["client"],
+)
+circuit_rejected_total = metrics.Counter(
+    "omdb_circuit_rejected_total",
+    "OMDB queries failed fast because the circuit breaker was open",
+)
+circuit_opened_total = metrics.Counter(
+    "omdb_circuit_opened_total", "Times the OMDB circuit breaker opened"
+)
+
+
+class RateLimiter:
+    """
+    Token bucket which limits the number of requests
+    per second sent to a single host, rate of 0 disables it
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return the number of seconds
+        the caller has to wait before sending its request
+        """
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url):
+    """
+    Return the rate limiter shared by all clients
+    talking to the host of the given url
+    """
+    host = urlparse(url).netloc
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = RateLimiter(
+                float(os.environ.get("OMDB_RATE_LIMIT", 0))
+            )
+        return _rate_limiters[host]
+
+
+class CircuitBreaker:
+    """
+    Fails OMDB queries fast while OMDB is down. Opens when at least
+    failure_rate of the queries of the last window seconds failed,
+    counted once there were min_requests of them, then rejects
+    queries for open_seconds. After that one probe query is let
+    through (half open), it closes the breaker when it succeeds
+    and opens it again when it fails. A failure_rate of 0 turns
+    the breaker off
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_rate, min_requests, window, open_seconds):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        # (time, failed) of the queries of the last window seconds
+        self.outcomes = collections.deque()
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        """
+        Raise a 503 HTTPException when the query isn't let through,
+        every query let through has to be followed by record()
+        """
+        if self.failure_rate <= 0:
+            return
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+        circuit_rejected_total.inc()
+        raise HTTPException(
+            503,
+            detail="OMDB is unavailable, try again later",
+            headers={"Retry-After": str(max(1, round(remaining)))},
+        )
+
+    def record(self, failed):
+        if self.failure_rate <= 0:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.probing = False
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = self.CLOSED
+                    self.outcomes.clear()
+                    self.failures = 0
+                return
+            if self.state == self.OPEN:
+                # a query let through before the breaker opened
+                return
+            self.outcomes.append((now, failed))
+            self.failures += failed
+            while self.outcomes[0][0] < now - self.window:
+                self.failures -= self.outcomes.popleft()[1]
+            if len(
+                self.outcomes
+            ) >= self.min_requests and self.failures >= self.failure_rate * len(
+                self.outcomes
+            ):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        circuit_opened_total.inc()
+
+
+_circuit_breakers = {}
+
+
+def get_circuit_breaker(url):
+    """
+    Return the circuit breaker shared by all clients
+    talking to the host of the given url
+    """
+    host = urlparse(url).netloc
+    with _rate_limiters_lock:
+        if host not in _circuit_breakers:
+            _circuit_breakers[host] = CircuitBreaker(
+                float(os.environ.get("OMDB_BREAKER_FAILURE_RATE", 0.5)),
+                int(os.environ.get("OMDB_BREAKER_MIN_REQUESTS", 10)),
+                float(os.environ.get("OMDB_BREAKER_WINDOW", 30)),
+                float(os.environ.get("OMDB_BREAKER_OPEN_SECONDS", 30)),
+            )
+        return _circuit_breakers[host]
+
+
+class Coalescer:
+    """
+    Runs one fetch per key at a time, threads asking for a key
+    which is being fetched wait for it and share its result
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def run(self, key, fetch):
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = concurrent.futures.Future()
+        if not leader:
+            coalesced_total.inc("sync")
+            return future.result()
+        try:
+            result = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+
+class AsyncCoalescer:
+    """
+    asyncio counterpart of Coalescer
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+
+    async def run(self, key, fetch):
+        task = self.in_flight.get(key)
+        if task is None:
+            task = self.in_flight[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            coalesced_total.inc("async")
+        # a caller which gives up doesn't cancel the fetch of the others
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if not task.cancelled():
+            # marks the error as seen when every caller gave up
+            task.exception()
+
+
+def upstream_failed(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+def check_omdb_response(response_json, client=None):
+    """
+    Return the OMDB response or raise when OMDB didn't find the movie
+    """
+    if response_json.get("Response") == "False":
+        if client:
+            errors_total.inc(client, "not_found")
+        raise HTTPException(404, detail="Movie Not Found in OMDB.")
+    return response_json
 
 
 class OMDBUtil:
     def __init__(self):
         self.omdb_url = os.environ.get("OMDB_URL", "https://www.omdbapi.com/")
         self.api_key = os.environ["OMDB_API_KEY"]
+        self.pool_size = int(os.environ.get("OMDB_FETCH_CONCURRENCY", 10))
+        self.rate_limiter = get_rate_limiter(self.omdb_url)
+        self.circuit_breaker = get_circuit_breaker(self.omdb_url)
+        self.coalescer = Coalescer()
+        self.response_cache = get_response_cache()
         self.request_session = self._create_request_session()
 
     def _create_request_session(self):
@@ -19,19 +294,143 @@ class OMDBUtil:
         retries = Retry(
             total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504]
         )
-        request_session.mount("https://", HTTPAdapter(max_retries=retries))
+        adapter = HTTPAdapter(max_retries=retries, pool_maxsize=self.pool_size)
+        request_session.mount("https://", adapter)
+        request_session.mount("http://", adapter)
         return request_session
 
     def query_omdb(self, params):
         """
-        Query OMDB using OMDB api
+        Query OMDB using OMDB api, threads sending the same
+        query at the same time share one request
         """
+        cached = self.response_cache and self.response_cache.get(params)
+        if cached:
+            return check_omdb_response(cached)
+        return self.coalescer.run(
+            OMDBResponseCache.key(params), lambda: self._fetch(params)
+        )
+
+    def _fetch(self, params):
+        self.circuit_breaker.before_request()
         headers = {"Accept": "application/json"}
         params.update({"apikey": self.api_key})
-        response = self.request_session.get(
-            self.omdb_url, headers=headers, params=params
+        self.rate_limiter.acquire()
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.request_session.get(
+                self.omdb_url, headers=headers, params=params
+            )
+            failed = not response.ok and upstream_failed(response.status_code)
+        except requests.RequestException:
+            errors_total.inc("sync", "request")
+            raise
+        finally:
+            request_duration.observe(time.perf_counter() - started, "sync")
+            self.circuit_breaker.record(failed)
+        # retries happen inside urllib3, the Retry it ends with has them
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            retries_total.inc("sync", amount=len(retries.history))
+        if not response.ok:
+            errors_total.inc("sync", "status")
+        response.raise_for_status()
+        if self.response_cache:
+            self.response_cache.set(params, response.json())
+        return check_omdb_response(response.json(), "sync")
+
+
+class AsyncOMDBUtil:
+    """
+    asyncio counterpart of OMDBUtil, queries OMDB over a pool
+    of keep-alive connections without blocking the event loop
+    """
+
+    # same policy as the Retry adapter of OMDBUtil
+    retry_total = 5
+    retry_backoff_factor = 0.1
+    retry_status_forcelist = [500, 502, 503, 504]
+
+    def __init__(self):
+        self.omdb_url = os.environ.get("OMDB_URL", "https://www.omdbapi.com/")
+        self.api_key = os.environ["OMDB_API_KEY"]
+        self.pool_size = int(os.environ.get("OMDB_FETCH_CONCURRENCY", 10))
+        self.timeout = float(os.environ.get("OMDB_TIMEOUT", 10))
+        self.rate_limiter = get_rate_limiter(self.omdb_url)
+        self.circuit_breaker = get_circuit_breaker(self.omdb_url)
+        self.coalescer = AsyncCoalescer()
+        self.response_cache = get_response_cache()
+        self.client = self._create_client()
+
+    def _create_client(self):
+        """
+        Return the httpx client which keeps
+        connections to OMDB alive between queries
+        """
+        return httpx.AsyncClient(
+            headers={"Accept": "application/json"},
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+        )
+
+    def _backoff(self, retry):
+        """
+        Seconds to sleep before the given retry,
+        same formula as urllib3 Retry
+        """
+        if retry <= 1:
+            return 0
+        return min(120, self.retry_backoff_factor * 2 ** (retry - 1))
+
+    async def query_omdb(self, params):
+        """
+        Query OMDB using OMDB api, tasks sending the same
+        query at the same time share one request
+        """
+        # the sqlite cache blocks, it's read and written off the event loop
+        cached = self.response_cache and await asyncio.to_thread(
+            self.response_cache.get, params
         )
+        if cached:
+            return check_omdb_response(cached)
+        return await self.coalescer.run(
+            OMDBResponseCache.key(params), lambda: self._fetch(params)
+        )
+
+    async def _fetch(self, params):
+        self.circuit_breaker.before_request()
+        params.update({"apikey": self.api_key})
+        started = time.perf_counter()
+        failed = True
+        try:
+            for retry in range(self.retry_total + 1):
+                if retry:
+                    retries_total.inc("async")
+                await asyncio.sleep(self._backoff(retry))
+                await asyncio.sleep(self.rate_limiter.reserve())
+                try:
+                    response = await self.client.get(self.omdb_url, params=params)
+                except httpx.TransportError:
+                    if retry == self.retry_total:
+                        errors_total.inc("async", "request")
+                        raise
+                    continue
+                if response.status_code not in self.retry_status_forcelist:
+                    break
+            failed = upstream_failed(response.status_code)
+        finally:
+            request_duration.observe(time.perf_counter() - started, "async")
+            self.circuit_breaker.record(failed)
+        if response.is_error:
+            errors_total.inc("async", "status")
         response.raise_for_status()
-        if response.json().get("Response") == "False":
-            raise HTTPException(404, detail="Movie Not Found in OMDB.")
-        return response.json()
+        if self.response_cache:
+            await asyncio.to_thread(self.response_cache.set, params, response.json())
+        return check_omdb_response(response.json(), "async")
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -1,5 +1,12 @@
+import asyncio
+import httpx
 import logging
-from omdb_util import OMDBUtil
+import os
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fastapi import HTTPException
+from omdb_util import AsyncOMDBUtil, OMDBUtil
 from models import Movie
 
 logging.basicConfig(
@@ -14,52 +21,72 @@ class OperationsException(Exception):
 
 
 class Operations:
-    def __init__(self, omdb_util: OMDBUtil):
+    def __init__(
+        self,
+        omdb_util: OMDBUtil,
+        concurrency: int | None = None,
+        async_omdb_util: AsyncOMDBUtil | None = None,
+    ):
         self.omdb_util = omdb_util
+        self.async_omdb_util = async_omdb_util
+        # max number of OMDB requests in flight at the same time,
+        # 1 fetches everything one after another
+        self.concurrency = concurrency or int(
+            os.environ.get("OMDB_FETCH_CONCURRENCY", 10)
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="omdb"
+        )
+        # OMDB searches the catalogue is seeded and refreshed from
+        self.search_terms = [
+            term.strip()
+            for term in os.environ.get("OMDB_SEED_SEARCH_TERMS", "marvel").split(",")
+            if term.strip()
+        ]
+        self.search_pages = int(os.environ.get("OMDB_SEED_PAGES", 10))
 
     def get_100_movies_information_from_omdb(self):
         """
-        Get 100 movies information and convert them
+        Get movies information of every page of the configured
+        searches (100 movies by default) and convert them
         to list of Movie Model objects
         """
+        search_responses = [
+            response_json
+            for response_json in self.executor.map(
+                self._query_omdb_or_none, self._search_params()
+            )
+            if response_json is not None
+        ]
+        if not search_responses:
+            return []
+
+        # details of every page are fetched at the same time, the number
+        # of OMDB requests in flight is still bounded by self.executor
         movie_data = []
-        for page in range(1, 11):
-            params = {
-                "s": "marvel",
-                "type": "movie",
-                "page": page,
-            }
-            response_json = self.omdb_util.query_omdb(params)
-            log.info(f"Adding page: {page}")
-            movie_data.extend(
-                self.get_movie_model_objects_from_omdb_response(response_json)
+        with ThreadPoolExecutor(max_workers=len(search_responses)) as page_executor:
+            pages = page_executor.map(
+                self.get_movie_model_objects_from_omdb_response, search_responses
             )
+            for page, values in enumerate(pages, start=1):
+                log.info(f"Adding page: {page}")
+                movie_data.extend(values)
         return movie_data
 
     def get_movie_model_objects_from_omdb_response(self, search_response_from_omdb):
         """
         Format list of model objects from omdb search
-        response
-        """
-        values = []
-        for movie_info in search_response_from_omdb["Search"]:
-            imdb_id = movie_info["imdbID"]
-            params = {"i": imdb_id}
-            response = self.omdb_util.query_omdb(params)
-            values.append(
-                Movie(
-                    imdbid=response["imdbID"],
-                    title=response["Title"],
-                    year=response["Year"],
-                    genre=response["Genre"],
-                    released=response["Released"],
-                    language=response["Language"],
-                    director=response["Director"],
-                    writer=response["Writer"],
-                    actors=response["Actors"],
-                )
-            )
-        return values
+        response, movies which can't be fetched are skipped
+        """
+        params = [
+            {"i": movie_info["imdbID"]}
+            for movie_info in search_response_from_omdb["Search"]
+        ]
+        return [
+            self._movie_from_omdb_response(response)
+            for response in self.executor.map(self._query_omdb_or_none, params)
+            if response is not None
+        ]
 
     def get_movie_info(self, title):
         """
@@ -69,6 +96,124 @@ class Operations:
         """
         params = {"t": title}
         response = self.omdb_util.query_omdb(params)
+        return self._movie_from_omdb_response(response)
+
+    async def get_100_movies_information_from_omdb_async(self):
+        """
+        Same as get_100_movies_information_from_omdb
+        but queries OMDB with the async client
+        """
+        imdbids = await self.search_imdbids_async()
+        responses = await self._gather_limited(
+            lambda imdbid: self._query_omdb_or_none_async({"i": imdbid}), imdbids
+        )
+        return [
+            self._movie_from_omdb_response(response)
+            for response in responses
+            if response is not None
+        ]
+
+    async def search_imdbids_async(self):
+        """
+        Return the imdbIDs of the movies found
+        by the configured searches, without repeats
+        """
+        responses = await self._gather_limited(
+            self._query_omdb_or_none_async, self._search_params()
+        )
+        return list(
+            dict.fromkeys(
+                movie_info["imdbID"]
+                for response_json in responses
+                if response_json is not None
+                for movie_info in response_json["Search"]
+            )
+        )
+
+    async def get_movie_info_async(self, title):
+        """
+        Same as get_movie_info but queries
+        OMDB with the async client
+        """
+        params = {"t": title}
+        response = await self.async_omdb_util.query_omdb(params)
+        return self._movie_from_omdb_response(response)
+
+    async def get_movie_info_by_imdbid_async(self, imdbid):
+        """
+        Same as get_movie_info_async but looks
+        the movie up by its imdbID
+        """
+        response = await self.async_omdb_util.query_omdb({"i": imdbid})
+        return self._movie_from_omdb_response(response)
+
+    async def get_movies_info_async(self, titles):
+        """
+        Get movie info of all titles from OMDB concurrently, returns
+        a dict of title to movie model object or the exception raised
+        """
+        results = await self._gather_limited(
+            self.get_movie_info_async, titles, return_exceptions=True
+        )
+        return dict(zip(titles, results))
+
+    async def get_movies_info_by_imdbid_async(self, imdbids):
+        """
+        Same as get_movies_info_async for a list of imdbIDs
+        """
+        results = await self._gather_limited(
+            self.get_movie_info_by_imdbid_async, imdbids, return_exceptions=True
+        )
+        return dict(zip(imdbids, results))
+
+    async def _gather_limited(self, fetch, keys, return_exceptions=False):
+        """
+        Call fetch for every key with at most self.concurrency
+        calls in flight, returns the results in order
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(key):
+            async with semaphore:
+                return await fetch(key)
+
+        return await asyncio.gather(
+            *(limited(key) for key in keys), return_exceptions=return_exceptions
+        )
+
+    def _search_params(self):
+        return [
+            {
+                "s": term,
+                "type": "movie",
+                "page": page,
+            }
+            for term in self.search_terms
+            for page in range(1, self.search_pages + 1)
+        ]
+
+    def _query_omdb_or_none(self, params):
+        """
+        Query OMDB and return None instead of raising
+        so one failed lookup doesn't cancel the others
+        """
+        query = dict(params)
+        try:
+            return self.omdb_util.query_omdb(params)
+        except (HTTPException, requests.RequestException) as e:
+            log.warning(f"Skipping OMDB query {query}: {e}")
+            return None
+
+    async def _query_omdb_or_none_async(self, params):
+        query = dict(params)
+        try:
+            return await self.async_omdb_util.query_omdb(params)
+        except (HTTPException, httpx.HTTPError) as e:
+            log.warning(f"Skipping OMDB query {query}: {e}")
+            return None
+
+    @staticmethod
+    def _movie_from_omdb_response(response):
         return Movie(
             imdbid=response["imdbID"],
             title=response["Title"],
@@ -79,4 +224,5 @@ class Operations:
             director=response["Director"],
             writer=response["Writer"],
             actors=response["Actors"],
+            fetched_at=datetime.utcnow(),
         )
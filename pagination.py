@@ -0,0 +1,186 @@
+"""
+Keyset (cursor) and OFFSET pagination of the movie table
+
+Pages are ordered by (title, id) and a cursor holds the
+position of the first or last row of a page, so fetching
+the next page is an index range scan instead of an OFFSET
+scan and no COUNT(*) is needed.
+
+Both read the columns of serializers.Movie, or the ones the
+fields param asks for, as plain rows instead of ORM objects
+and encode_page turns a page into JSON bytes with orjson,
+without a pydantic model per row. With every field the JSON
+is the same fastapi_pagination's Page and
+serializers.MovieCursorPage produce
+"""
+import base64
+import binascii
+import json
+import math
+import models
+import orjson
+import serializers
+
+from fastapi import HTTPException
+from fastapi_pagination import Params
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# same limit as fastapi_pagination Params
+MAX_PAGE_SIZE = 100
+
+# the fields the API returns for a movie, in the order of serializers.Movie
+FIELDS = tuple(serializers.Movie.model_fields)
+
+
+def parse_fields(fields: str | None):
+    """
+    Return the names in the comma separated fields param in the
+    order of serializers.Movie, every field when it's not given
+    """
+    if not fields:
+        return FIELDS
+    names = {name.strip() for name in fields.split(",")} - {""}
+    unknown = names - set(FIELDS)
+    if unknown or not names:
+        raise HTTPException(
+            400,
+            detail=f"fields must be a comma separated list of {', '.join(FIELDS)}",
+        )
+    return tuple(name for name in FIELDS if name in names)
+
+
+def columns(fields=FIELDS):
+    return [models.Movie.__table__.c[name] for name in fields]
+
+
+NEXT = "next"
+PREVIOUS = "prev"
+
+
+def encode_cursor(movie, direction):
+    payload = json.dumps([movie.title, movie.id, direction]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Return (title, id, direction) stored in the cursor
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        title, id, direction = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(400, detail="Invalid cursor")
+    if not isinstance(id, int) or direction not in (NEXT, PREVIOUS):
+        raise HTTPException(400, detail="Invalid cursor")
+    return title, id, direction
+
+
+async def paginate_by_cursor(
+    db: AsyncSession, size: int, cursor: str | None = None, fields=FIELDS
+):
+    """
+    Return the page of movies after (or before) the cursor position,
+    the first page when there is no cursor. Rows have the columns of
+    fields and after them title and id when fields lacks them
+    """
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            400, detail=f"perpage must be between 1 and {MAX_PAGE_SIZE}"
+        )
+    title, id, direction = decode_cursor(cursor) if cursor else (None, None, NEXT)
+    # the bare range on title lets the database walk the (title, id)
+    # index, the OR only drops the rows of the cursor title already seen
+    # the cursors are made of title and id
+    cursor_columns = [name for name in ("title", "id") if name not in fields]
+    query = select(*columns(fields + tuple(cursor_columns)))
+    if direction == NEXT:
+        if cursor:
+            query = query.filter(
+                models.Movie.title >= title,
+                or_(models.Movie.title > title, models.Movie.id > id),
+            )
+        query = query.order_by(models.Movie.title, models.Movie.id)
+    else:
+        query = query.filter(
+            models.Movie.title <= title,
+            or_(models.Movie.title < title, models.Movie.id < id),
+        ).order_by(models.Movie.title.desc(), models.Movie.id.desc())
+
+    # one extra row tells if there is another page in this direction
+    items = (await db.execute(query.limit(size + 1))).all()
+    has_more = len(items) > size
+    items = items[:size]
+    if direction == PREVIOUS:
+        items.reverse()
+
+    if direction == NEXT:
+        has_next, has_previous = has_more, cursor is not None
+    else:
+        has_next, has_previous = True, has_more
+    next_cursor = encode_cursor(items[-1], NEXT) if items and has_next else None
+    previous_cursor = (
+        encode_cursor(items[0], PREVIOUS) if items and has_previous else None
+    )
+    return {
+        "items": items,
+        "size": size,
+        "next_cursor": next_cursor,
+        "previous_cursor": previous_cursor,
+    }
+
+
+async def paginate_by_offset(db: AsyncSession, params: Params, fields=FIELDS):
+    """
+    Return the page of movies ordered by title params asks for,
+    with the total like fastapi_pagination's Page
+    """
+    total = (
+        await db.execute(select(func.count()).select_from(models.Movie))
+    ).scalar_one()
+    items = (
+        await db.execute(
+            select(*columns(fields))
+            .order_by(models.Movie.title)
+            .offset(params.size * (params.page - 1))
+            .limit(params.size)
+        )
+    ).all()
+    return {
+        "items": items,
+        "total": total,
+        "page": params.page,
+        "size": params.size,
+        "pages": math.ceil(total / params.size),
+    }
+
+
+def encode_page(page, fields=FIELDS):
+    """
+    Return the JSON bytes of a page of either kind,
+    its movies have the given fields
+    """
+    # zip leaves out the columns only the cursors need
+    return orjson.dumps(
+        {**page, "items": [dict(zip(fields, row)) for row in page["items"]]}
+    )
+
+
+def encode_movie(row, fields=FIELDS):
+    return orjson.dumps(dict(zip(fields, row)))
+
+
+def title_span(page, cursor: str | None = None):
+    """
+    Return the (low, high) titles a movie which is added or removed
+    has to fall between to change the page, None means unbounded
+    """
+    title, _, direction = decode_cursor(cursor) if cursor else (None, None, NEXT)
+    items = page["items"]
+    low = high = None
+    if page["previous_cursor"]:
+        low = title if direction == NEXT else items[0].title
+    if page["next_cursor"]:
+        high = title if direction == PREVIOUS else items[-1].title
+    return low, high
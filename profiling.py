@@ -0,0 +1,214 @@
+"""
+Opt-in profiling of slow requests
+
+A share of PROFILE_SAMPLE_RATE of the requests, and with
+PROFILE_HEADER set every request carrying that header, runs
+under cProfile while the SQL statements it issues are timed.
+Profiles of requests which took at least PROFILE_THRESHOLD_MS
+are written as JSON files to PROFILE_DIR, which keeps the
+newest PROFILE_STORE_SIZE of them, and served by /profiles.
+
+cProfile sees the whole thread, so a profile also has the
+calls of requests served at the same time on the event loop.
+One request is profiled at a time and nothing is recorded
+while profiling is off
+"""
+import asyncio
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import uuid
+
+from datetime import datetime
+
+# lines of the cProfile report kept per profile
+REPORT_LINES = 60
+# statements kept per profile, the rest are only counted
+MAX_STATEMENTS = 200
+
+PROFILE_ID_PATTERN = re.compile(r"^[\w-]+$")
+
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+def record_statement(statement, seconds):
+    """
+    Add a statement to the profile of the request running it, if any
+    """
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record_statement(statement, seconds)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.statements = []
+        self.statement_count = 0
+        self.statement_seconds = 0.0
+
+    def record_statement(self, statement, seconds):
+        self.statement_count += 1
+        self.statement_seconds += seconds
+        if len(self.statements) < MAX_STATEMENTS:
+            self.statements.append(
+                {"statement": statement, "duration_ms": round(seconds * 1000, 3)}
+            )
+
+
+class ProfileStore:
+    """
+    Directory of profile JSON files which keeps the newest maxsize of them
+    """
+
+    def __init__(self, directory, maxsize):
+        self.directory = directory
+        self.maxsize = maxsize
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        # ids start with the time, newest first
+        return sorted(
+            (
+                name[:-5]
+                for name in os.listdir(self.directory)
+                if name.endswith(".json")
+            ),
+            reverse=True,
+        )
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(profile["id"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(profile, f)
+        os.replace(path + ".tmp", path)
+        for profile_id in self.ids()[self.maxsize :]:
+            try:
+                os.remove(self._path(profile_id))
+            except FileNotFoundError:
+                pass
+
+    def get(self, profile_id):
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def summaries(self, limit):
+        summaries = []
+        for profile_id in self.ids()[:limit]:
+            profile = self.get(profile_id)
+            if profile is not None:
+                del profile["report"], profile["statements"]
+                summaries.append(profile)
+        return summaries
+
+
+def store_from_env():
+    return ProfileStore(
+        os.environ.get(
+            "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "brite_profiles")
+        ),
+        int(os.environ.get("PROFILE_STORE_SIZE", 100)),
+    )
+
+
+def profile_report(profiler):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LINES)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, store=None):
+        self.app = app
+        self.sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+        self.threshold = float(os.environ.get("PROFILE_THRESHOLD_MS", 500)) / 1000
+        # lower case ASGI header name, e.g. x-profile, not set turns it off
+        header = os.environ.get("PROFILE_HEADER", "")
+        self.header = header.lower().encode() or None
+        self.store = store or store_from_env()
+        self.active = False
+
+    def wants_profile(self, scope):
+        """
+        Return None to skip the request, else whether it is
+        forced by the header and saved whatever it takes
+        """
+        if self.active:
+            return None
+        if self.header is not None and any(
+            name == self.header for name, _ in scope["headers"]
+        ):
+            return True
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return False
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        forced = self.wants_profile(scope)
+        if forced is None:
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.active = True
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        profiler = cProfile.Profile()
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            current_profile.reset(token)
+            self.active = False
+            if forced or duration >= self.threshold:
+                await self._save(scope, status, started_at, duration, profiler, profile)
+
+    async def _save(self, scope, status, started_at, duration, profiler, profile):
+        record = {
+            "id": f"{started_at:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}",
+            "started_at": started_at.isoformat(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope["query_string"].decode("latin-1"),
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "statement_count": profile.statement_count,
+            "statement_ms": round(profile.statement_seconds * 1000, 3),
+            "statements": profile.statements,
+        }
+
+        def save():
+            record["report"] = profile_report(profiler)
+            self.store.save(record)
+
+        # formatting the report takes a few milliseconds
+        await asyncio.to_thread(save)
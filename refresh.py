@@ -0,0 +1,192 @@
+"""
+Incremental refresh of the movie catalogue from OMDB
+
+Instead of seeding the table once and never touching it again,
+every REFRESH_INTERVAL seconds the configured OMDB searches are
+run and only the movies which aren't stored yet are fetched, then
+rows fetched longer than REFRESH_MAX_AGE seconds ago are fetched
+again in batches of REFRESH_BATCH_SIZE. Fetches run with the
+concurrency limit of Operations and rows are upserted by imdbid,
+so a refresh never duplicates a movie and can be interrupted
+at any point. The refresh holds a lease for REFRESH_INTERVAL
+seconds, so with several app processes one of them refreshes
+per interval
+"""
+import asyncio
+import catalogue
+import database
+import leases
+import logging
+import models
+import os
+
+from datetime import datetime, timedelta
+from sqlalchemy import or_, select
+
+log = logging.getLogger(__name__)
+log.setLevel(level=logging.DEBUG)
+
+# taken by the process which runs the refresh of an interval
+LEASE = "catalogue_refresh"
+
+
+async def upsert_movies(db, movies, versions=None):
+    """
+    Insert the movies, or overwrite the stored rows with the same
+    imdbid, and commit, returns the movies upserted with their ids
+    """
+    table = models.Movie.__table__
+    rows = {}
+    for movie in movies:
+        row = {c.name: getattr(movie, c.name) for c in table.columns}
+        del row["id"]
+        rows[movie.imdbid] = row
+    if not rows:
+        return []
+    update_columns = [c.name for c in table.columns if c.name not in ("id", "imdbid")]
+    await db.execute(
+        database.upsert_statement(
+            table, list(rows.values()), db.bind.dialect.name, ["imdbid"], update_columns
+        )
+    )
+    ids = await db.execute(
+        select(models.Movie.imdbid, models.Movie.id).filter(
+            models.Movie.imdbid.in_(rows)
+        )
+    )
+    ids = dict(ids.all())
+    await catalogue.commit_change(db, versions)
+    upserted = []
+    for movie in movies:
+        if movie.imdbid in rows:
+            # the last movie wins when one imdbid was given twice
+            movie = models.Movie(id=ids[movie.imdbid], **rows.pop(movie.imdbid))
+            upserted.append(movie)
+    return upserted
+
+
+class CatalogueRefresher:
+    def __init__(self, operations, session_factory, on_refreshed=None, versions=None):
+        self.operations = operations
+        self.session_factory = session_factory
+        # 0 turns the background refresh off
+        self.interval = float(os.environ.get("REFRESH_INTERVAL", 0))
+        self.max_age = float(os.environ.get("REFRESH_MAX_AGE", 7 * 24 * 3600))
+        self.batch_size = int(os.environ.get("REFRESH_BATCH_SIZE", 100))
+        # called with the movies of every batch which was upserted
+        self.on_refreshed = on_refreshed
+        # VersionCache of the app, told about the upserts
+        self.versions = versions
+        self.task = None
+
+    def start(self):
+        if self.interval > 0:
+            self.task = asyncio.create_task(self._run(), name="catalogue-refresh")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with leases.hold(
+                    self.session_factory, LEASE, self.interval, keep=True
+                ) as held:
+                    counts = await self.run_once() if held else None
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # OMDB or the database unavailable, try again next time
+                log.exception("Catalogue refresh failed")
+            else:
+                if counts is not None:
+                    log.info(f"Catalogue refreshed: {counts}")
+
+    async def run_once(self):
+        """
+        Add the movies the searches find which aren't stored yet and
+        fetch the stale rows again, returns the number of movies added,
+        refreshed and which couldn't be fetched
+        """
+        added, failed = await self.add_new()
+        refreshed, refresh_failed = await self.refresh_stale()
+        return {
+            "added": added,
+            "refreshed": refreshed,
+            "failed": failed + refresh_failed,
+        }
+
+    async def add_new(self, progress=None):
+        """
+        Fetch the movies the searches find which aren't stored yet,
+        batch by batch, keeping the counts in the progress dict if given
+        """
+        imdbids = await self.operations.search_imdbids_async()
+        if progress is not None:
+            progress["found"] = len(imdbids)
+        added = failed = 0
+        async with self.session_factory() as db:
+            for start in range(0, len(imdbids), self.batch_size):
+                batch = imdbids[start : start + self.batch_size]
+                stored = await db.execute(
+                    select(models.Movie.imdbid).filter(models.Movie.imdbid.in_(batch))
+                )
+                stored = set(stored.scalars())
+                await db.commit()
+                missing = [imdbid for imdbid in batch if imdbid not in stored]
+                fetched, errors = await self._fetch(db, missing)
+                added += fetched
+                failed += errors
+                if progress is not None:
+                    progress.update(added=added, failed=failed)
+        return added, failed
+
+    async def refresh_stale(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.max_age)
+        refreshed = failed = 0
+        last_id = 0
+        async with self.session_factory() as db:
+            while True:
+                # keyset on id, rows which fail to refresh stay stale
+                # but aren't picked up again before the next run
+                stale = await db.execute(
+                    select(models.Movie.id, models.Movie.imdbid)
+                    .filter(
+                        models.Movie.id > last_id,
+                        or_(
+                            models.Movie.fetched_at.is_(None),
+                            models.Movie.fetched_at < cutoff,
+                        ),
+                    )
+                    .order_by(models.Movie.id)
+                    .limit(self.batch_size)
+                )
+                stale = stale.all()
+                # no connection is held while OMDB is queried
+                await db.commit()
+                if not stale:
+                    break
+                last_id = stale[-1].id
+                fetched, errors = await self._fetch(db, [row.imdbid for row in stale])
+                refreshed += fetched
+                failed += errors
+        return refreshed, failed
+
+    async def _fetch(self, db, imdbids):
+        if not imdbids:
+            return 0, 0
+        results = await self.operations.get_movies_info_by_imdbid_async(imdbids)
+        movies = []
+        for imdbid, result in results.items():
+            if isinstance(result, Exception):
+                log.warning(f"Couldn't fetch {imdbid}: {result!r}")
+            else:
+                movies.append(result)
+        movies = await upsert_movies(db, movies, self.versions)
+        if movies and self.on_refreshed:
+            self.on_refreshed(movies)
+        return len(movies), len(imdbids) - len(movies)
@@ -0,0 +1,268 @@
+"""
+In-process inverted index of the movie table
+
+Every word of title, actors, director, writer and genre maps
+to the ids of the movies it shows up in together with a weight
+of the field it was found in, so a search only looks at the
+movies which contain the words instead of scanning the table.
+Every app process has its own index, it is built from the
+database on first use and kept in sync by the routes which
+add or remove movies
+"""
+import bisect
+import heapq
+import itertools
+import math
+import operator
+import re
+import threading
+
+from collections import Counter, defaultdict
+
+# a word found in the title ranks a movie higher than one found in the cast
+FIELD_WEIGHTS = {"title": 3.0, "actors": 2.0, "director": 2.0, "writer": 1.0}
+GENRE_WEIGHT = 1.0
+# words which only start with a search term count this much of an exact match
+PREFIX_WEIGHT = 0.5
+# shortest search term which is also matched as a prefix
+MIN_PREFIX_LENGTH = 2
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def split_genres(genre):
+    return [g.strip() for g in genre.split(",") if g.strip()] if genre else []
+
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # word -> {movie id: weight}
+        self.postings = defaultdict(dict)
+        # sorted words, prefixes are looked up with bisect
+        self.words = []
+        # movie id -> (year, lower case genres, words)
+        self.movies = {}
+        # ids of the movies per lower case genre and per year
+        self.genre_ids = defaultdict(set)
+        self.year_ids = defaultdict(set)
+        # lower case genre -> genre as it was first seen
+        self.genre_names = {}
+        self.built = False
+        # changes made while build() runs, applied to the new content
+        self.pending = None
+
+    def _weights(self, movie):
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for word in tokenize(getattr(movie, field)):
+                weights[word] += weight
+        for word in tokenize(movie.genre):
+            weights[word] += GENRE_WEIGHT
+        return weights
+
+    def _add(self, movie, new_words):
+        self._remove(movie.id)
+        weights = self._weights(movie)
+        for word, weight in weights.items():
+            postings = self.postings[word]
+            if not postings:
+                new_words.append(word)
+            postings[movie.id] = weight
+        genres = []
+        for genre in split_genres(movie.genre):
+            self.genre_names.setdefault(genre.lower(), genre)
+            self.genre_ids[genre.lower()].add(movie.id)
+            genres.append(genre.lower())
+        self.year_ids[movie.year].add(movie.id)
+        self.movies[movie.id] = (movie.year, tuple(genres), tuple(weights))
+
+    @staticmethod
+    def _discard(ids_by_key, key, id):
+        ids = ids_by_key[key]
+        ids.discard(id)
+        if not ids:
+            del ids_by_key[key]
+
+    def _remove(self, id):
+        entry = self.movies.pop(id, None)
+        if entry is None:
+            return False
+        year, genres, words = entry
+        for word in words:
+            postings = self.postings[word]
+            postings.pop(id, None)
+            if not postings:
+                del self.postings[word]
+                index = bisect.bisect_left(self.words, word)
+                if index < len(self.words) and self.words[index] == word:
+                    del self.words[index]
+        for genre in genres:
+            self._discard(self.genre_ids, genre, id)
+            if genre not in self.genre_ids:
+                del self.genre_names[genre]
+        self._discard(self.year_ids, year, id)
+        return True
+
+    def begin_build(self):
+        """
+        Start recording changes, call before reading the movies passed
+        to build() so changes made while they are read aren't lost
+        """
+        with self.lock:
+            if self.pending is None:
+                self.pending = []
+
+    def abort_build(self):
+        """
+        Stop recording changes when reading the movies for build() failed
+        """
+        with self.lock:
+            self.pending = None
+
+    def build(self, movies):
+        """
+        Replace the content of the index with the given movies, the
+        current content is searched until the new one is ready
+        """
+        self.begin_build()
+        fresh = SearchIndex()
+        for movie in movies:
+            fresh._add(movie, [])
+        with self.lock:
+            self.postings = fresh.postings
+            self.words = sorted(fresh.postings)
+            self.movies = fresh.movies
+            self.genre_ids = fresh.genre_ids
+            self.year_ids = fresh.year_ids
+            self.genre_names = fresh.genre_names
+            for change, value in self.pending:
+                change(value)
+            self.pending = None
+            self.built = True
+        return len(self.movies)
+
+    def _record(self, change, value):
+        if self.pending is not None:
+            self.pending.append((change, value))
+
+    def add(self, movie):
+        """
+        Index a movie, or re-index it when its id is already indexed
+        """
+        with self.lock:
+            self._insert(movie)
+            self._record(self._insert, movie)
+
+    def _insert(self, movie):
+        new_words = []
+        self._add(movie, new_words)
+        for word in new_words:
+            bisect.insort(self.words, word)
+
+    def remove(self, id):
+        with self.lock:
+            self._record(self._remove, id)
+            return self._remove(id)
+
+    def _expand(self, term):
+        """
+        Return (postings, idf) of the term and, for long enough terms,
+        of the words starting with it, rare words score higher
+        """
+        if len(term) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self.words, term)
+            end = bisect.bisect_left(self.words, term + "\uffff")
+            words = self.words[start:end]
+        else:
+            words = [term] if term in self.postings else []
+        total = len(self.movies)
+        expanded = []
+        for word in words:
+            postings = self.postings[word]
+            idf = math.log(1 + total / len(postings))
+            expanded.append((postings, idf if word == term else idf * PREFIX_WEIGHT))
+        return expanded
+
+    @staticmethod
+    def _score(expanded, scores):
+        """
+        Add the score of the term to the scores of the movies which
+        contain it and drop the others, None scores stand for every movie
+        """
+        size = sum(len(postings) for postings, _ in expanded)
+        if scores is None and len(expanded) == 1:
+            postings, idf = expanded[0]
+            return {id: weight * idf for id, weight in postings.items()}
+        if scores is None or size <= len(scores) * len(expanded):
+            # walk the postings of the term
+            term_scores = defaultdict(float)
+            for postings, idf in expanded:
+                for id, weight in postings.items():
+                    term_scores[id] += weight * idf
+            if scores is None:
+                return term_scores
+            return {
+                id: score + scores[id]
+                for id, score in term_scores.items()
+                if id in scores
+            }
+        # look the movies which are left up in the postings of the term
+        result = {}
+        for id, score in scores.items():
+            term_score = 0.0
+            for postings, idf in expanded:
+                weight = postings.get(id)
+                if weight:
+                    term_score += weight * idf
+            if term_score:
+                result[id] = score + term_score
+        return result
+
+    def search(self, query="", genre=None, year=None, limit=10, offset=0):
+        """
+        Return the total number of matches, the (id, score) of the
+        requested page of them best first and the genre and year
+        counts of all matches, every word of the query has to match
+        """
+        with self.lock:
+            candidates = None
+            if genre:
+                candidates = self.genre_ids.get(genre.lower(), set())
+            if year is not None:
+                ids = self.year_ids.get(year, set())
+                candidates = ids if candidates is None else candidates & ids
+            scores = None if candidates is None else dict.fromkeys(candidates, 0.0)
+
+            terms = [self._expand(term) for term in dict.fromkeys(tokenize(query))]
+            # rare terms first, so the common ones only check what is left
+            terms.sort(key=lambda expanded: sum(len(p) for p, _ in expanded))
+            for expanded in terms:
+                scores = self._score(expanded, scores)
+                if not scores:
+                    break
+            if scores is None:
+                # no words and no facets, every movie matches
+                scores = dict.fromkeys(self.movies, 0.0)
+
+            # counted with map and Counter, which loop in C, as
+            # common words and facets alone match most of the movies
+            movies = list(map(self.movies.__getitem__, scores))
+            years = Counter(map(operator.itemgetter(0), movies))
+            years.pop(None, None)
+            genres = Counter(
+                itertools.chain.from_iterable(map(operator.itemgetter(1), movies))
+            )
+            genres = {self.genre_names[g]: n for g, n in genres.most_common()}
+
+        # equal scores keep the order the movies were indexed in
+        ids = heapq.nlargest(offset + limit, scores, key=scores.__getitem__)
+        return {
+            "total": len(scores),
+            "hits": [(id, scores[id]) for id in ids[offset:]],
+            "facets": {"genre": genres, "year": dict(years)},
+        }
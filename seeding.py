@@ -0,0 +1,147 @@
+"""
+Background seeding of the empty movie table
+
+The app serves requests as soon as the migrations ran, while
+the Seeder fills an empty table from the OMDB searches in the
+background. Movies are fetched and upserted by the catalogue
+refresh in batches of REFRESH_BATCH_SIZE, so /list and /search
+show them as they arrive. With several app processes the one
+holding the seed lease seeds, the others check every
+RETRY_INTERVAL seconds until it is done, or take over when
+it died. The seed is done once it is marked in the seeded_at
+column of the catalogue_version row, a table with movies but
+without the mark is the leftover of a seed which died and gets
+the missing movies. /health/live and /health/ready report the
+progress
+"""
+import asyncio
+import leases
+import logging
+import models
+import os
+
+from datetime import datetime
+from sqlalchemy import select, update
+
+log = logging.getLogger(__name__)
+log.setLevel(level=logging.DEBUG)
+
+LEASE = "seed"
+# seconds between checks of the table while another process seeds
+# it or after seeding failed
+RETRY_INTERVAL = 5
+
+PENDING = "pending"
+WAITING = "waiting"
+RUNNING = "running"
+DONE = "done"
+
+
+class Seeder:
+    def __init__(self, refresher, session_factory, on_done=None):
+        self.refresher = refresher
+        self.session_factory = session_factory
+        # the lease of a process which died ends after this
+        self.lease = float(os.environ.get("SEED_LEASE_SECONDS", 60))
+        # awaited once the table has its movies, seeded by whichever process
+        self.on_done = on_done
+        self.state = PENDING
+        self.progress = {"found": 0, "added": 0, "failed": 0}
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run(), name="seed")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def status(self):
+        return {
+            "state": self.state,
+            **self.progress,
+            "started_at": self.started_at and self.started_at.isoformat(),
+            "finished_at": self.finished_at and self.finished_at.isoformat(),
+            "error": self.error,
+        }
+
+    async def _run(self):
+        self.started_at = datetime.utcnow()
+        while True:
+            try:
+                if await self.run_once():
+                    break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # OMDB or the database unavailable, try again
+                log.exception("Seeding the movie table failed")
+                self.error = str(e) or type(e).__name__
+            await asyncio.sleep(RETRY_INTERVAL)
+        if self.on_done is not None:
+            await self.on_done()
+        self.state = DONE
+        self.finished_at = datetime.utcnow()
+
+    async def is_seeded(self):
+        """
+        Whether a seed was completed and the table has movies,
+        a table emptied after its seed is seeded again
+        """
+        async with self.session_factory() as db:
+            seeded_at = await db.execute(
+                select(models.CatalogueVersion.seeded_at).filter_by(id=1)
+            )
+            if seeded_at.scalar() is None:
+                return False
+            return (await db.execute(select(models.Movie.id).limit(1))).first()
+
+    async def mark_seeded(self):
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(models.CatalogueVersion).filter_by(id=1).values(seeded_at=now)
+            )
+            if not result.rowcount:
+                # tables created without the migrations have no row yet
+                db.add(
+                    models.CatalogueVersion(
+                        id=1, version=0, updated_at=now, seeded_at=now
+                    )
+                )
+            await db.commit()
+
+    async def run_once(self):
+        """
+        Seed the table unless it was seeded, returns False while
+        another app process holds the seed lease
+        """
+        if await self.is_seeded():
+            log.info("Don't need to populate db with data as data aleady exists")
+            return True
+        async with leases.hold(self.session_factory, LEASE, self.lease) as held:
+            if not held:
+                if self.state != WAITING:
+                    log.info("Another app process is seeding the movie table")
+                self.state = WAITING
+                return False
+            # another process may have seeded it before this one took the lease
+            if await self.is_seeded():
+                return True
+            self.state = RUNNING
+            self.progress = {"found": 0, "added": 0, "failed": 0}
+            await self.refresher.add_new(self.progress)
+            # failed searches and fetches are logged and skipped, without
+            # any movie OMDB was most likely unavailable, try again
+            if not self.progress["found"] or (
+                not self.progress["added"] and self.progress["failed"]
+            ):
+                raise RuntimeError(f"OMDB returned no movies: {self.progress}")
+            await self.mark_seeded()
+            log.info(f"Seeded the movie table: {self.progress}")
+        return True
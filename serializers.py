@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal
 
 
 class Movie(BaseModel):
@@ -17,6 +19,91 @@ class Movie(BaseModel):
         orm_mode = True
 
 
+class MovieCursorPage(BaseModel):
+    items: list[Movie]
+    size: int
+    next_cursor: str | None
+    previous_cursor: str | None
+
+
+class SearchHit(Movie):
+    score: float
+
+
+class SearchFacets(BaseModel):
+    genre: dict[str, int]
+    year: dict[int, int]
+
+
+class SearchResults(BaseModel):
+    items: list[SearchHit]
+    total: int
+    page: int
+    size: int
+    facets: SearchFacets
+
+
+class BulkAddRequest(BaseModel):
+    titles: list[str] = Field(min_length=1, max_length=100)
+
+
+class BulkAddResult(BaseModel):
+    title: str
+    status: Literal["added", "exists", "not_found", "error"]
+    id: int | None = None
+    imdbid: str | None = None
+    detail: str | None = None
+
+
+class BulkAddResponse(BaseModel):
+    results: list[BulkAddResult]
+
+
+class BulkRemoveRequest(BaseModel):
+    ids: list[int] | None = Field(None, min_length=1, max_length=10000)
+    year: int | None = None
+    genre: str | None = None
+
+    @model_validator(mode="after")
+    def ids_or_filter(self):
+        has_filter = self.year is not None or bool(self.genre)
+        if (self.ids is None) == (not has_filter):
+            raise ValueError("pass either ids or a year and/or genre filter")
+        return self
+
+
+class BulkRemoveResponse(BaseModel):
+    removed: int
+    not_found: list[int]
+
+
+class IngestRequest(BaseModel):
+    titles: list[str] = Field([], max_length=100)
+    imdbids: list[str] = Field([], max_length=100)
+
+    @model_validator(mode="after")
+    def not_empty(self):
+        if not self.titles and not self.imdbids:
+            raise ValueError("pass titles and/or imdbids")
+        return self
+
+
+class IngestJob(BaseModel):
+    id: int
+    kind: Literal["title", "imdbid"]
+    value: str
+    status: Literal["queued", "running", "done", "dead"]
+    attempts: int
+    last_error: str | None
+    movie_id: int | None
+    created_at: datetime
+    updated_at: datetime
+
+
+class IngestJobs(BaseModel):
+    jobs: list[IngestJob]
+
+
 class Users(BaseModel):
     username: str
     password: str
@@ -0,0 +1,87 @@
+"""
+Shared by the tests which need a database or OMDB
+"""
+import httpx
+import tempfile
+import unittest
+
+from database import Base
+from datetime import datetime
+from fastapi import HTTPException
+from models import Movie
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+def sqlite_engine(directory):
+    """
+    Return an async engine of a sqlite file in directory
+    """
+    return create_async_engine(f"sqlite+aiosqlite:///{directory}/t.db")
+
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Every test gets the tables in a new sqlite file, self.sessions
+    makes sessions of it and self.session is one of them
+    """
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = sqlite_engine(self.tmp.name)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.session = self.sessions()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+        self.tmp.cleanup()
+
+
+class FakeOperations:
+    """
+    Answers like Operations, the searches find search_results, the
+    first failures lookups by title fail and every fetch by imdbid
+    returns the movie with a title of its generation
+    """
+
+    def __init__(self, search_results=(), failures=0):
+        self.search_results = list(search_results)
+        self.failures = failures
+        self.generation = 1
+        # titles and imdbids looked up one at a time
+        self.calls = []
+        # imdbids fetched in batches
+        self.fetched = []
+
+    async def get_movie_info_async(self, title):
+        self.calls.append(title)
+        if title == "Unknown":
+            raise HTTPException(404, detail="Movie Not Found in OMDB.")
+        if self.failures:
+            self.failures -= 1
+            raise httpx.ConnectError("OMDB is down")
+        return Movie(imdbid=f"tt-{title.lower()}", title=title, genre="Drama")
+
+    async def get_movie_info_by_imdbid_async(self, imdbid):
+        self.calls.append(imdbid)
+        return Movie(imdbid=imdbid, title=f"Movie {imdbid}", genre="Drama")
+
+    async def search_imdbids_async(self):
+        return self.search_results
+
+    async def get_movies_info_by_imdbid_async(self, imdbids):
+        self.fetched.extend(imdbids)
+        return {
+            imdbid: (
+                HTTPException(404, detail="Movie Not Found in OMDB.")
+                if imdbid == "unknown"
+                else Movie(
+                    imdbid=imdbid,
+                    title=f"{imdbid} v{self.generation}",
+                    fetched_at=datetime.utcnow(),
+                )
+            )
+            for imdbid in imdbids
+        }
@@ -0,0 +1,82 @@
+"""
+Implements tests for auth_handler.py module
+"""
+import auth_handler
+import threading
+import unittest
+
+from datetime import timedelta
+from fastapi import HTTPException
+from models import Users
+from sqlalchemy import delete
+from unittest import mock
+from test.helpers import DatabaseTestCase
+
+
+class TestGetCurrentUser(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(Users(username="user1", password="hash"))
+        await self.session.commit()
+        auth_handler.token_cache.clear()
+
+    def token(self, expires_delta=timedelta(minutes=30)):
+        return auth_handler.create_access_token({"sub": "user1"}, expires_delta)
+
+    async def test_verified_token_is_cached(self):
+        token = self.token()
+        with mock.patch.object(
+            auth_handler, "get_user", wraps=auth_handler.get_user
+        ) as get_user:
+            first = await auth_handler.get_current_user(self.session, token)
+            second = await auth_handler.get_current_user(self.session, token)
+        assert first.username == second.username == "user1"
+        assert get_user.call_count == 1
+
+    async def test_cache_respects_exp(self):
+        token = self.token(timedelta(seconds=5))
+        await auth_handler.get_current_user(self.session, token)
+        expires_at, _ = auth_handler.token_cache.entries[token]
+        assert expires_at - auth_handler.time.monotonic() <= 5
+
+    async def test_revoke_user_tokens(self):
+        token = self.token()
+        await auth_handler.get_current_user(self.session, token)
+        await self.session.execute(delete(Users).filter_by(username="user1"))
+        await self.session.commit()
+        # still served from the cache until revoked
+        assert await auth_handler.get_current_user(self.session, token)
+        assert auth_handler.revoke_user_tokens("user1") == 1
+        with self.assertRaises(HTTPException) as error:
+            await auth_handler.get_current_user(self.session, token)
+        assert error.exception.status_code == 401
+
+    async def test_invalid_token_is_not_cached(self):
+        with self.assertRaises(HTTPException):
+            await auth_handler.get_current_user(self.session, "invalid")
+        assert auth_handler.token_cache.stats()["size"] == 0
+
+    async def test_authenticate_user_releases_connection(self):
+        hashed = await auth_handler.get_password_hash_async("password")
+        self.session.add(Users(username="user2", password=hashed))
+        await self.session.commit()
+        with mock.patch.object(auth_handler, "verify_password") as verify:
+            # bcrypt runs without holding a connection
+            verify.side_effect = lambda *args: not self.session.in_transaction()
+            user = await auth_handler.authenticate_user(
+                self.session, "user2", "password"
+            )
+        assert user.username == "user2"
+
+
+class TestPasswordHashing(unittest.IsolatedAsyncioTestCase):
+    async def test_hash_and_verify(self):
+        hashed = await auth_handler.get_password_hash_async("password")
+        assert await auth_handler.verify_password_async("password", hashed)
+        assert not await auth_handler.verify_password_async("wrong", hashed)
+
+    async def test_runs_in_password_executor(self):
+        with mock.patch.object(auth_handler.pwd_context, "verify") as verify:
+            verify.side_effect = lambda *args: threading.current_thread().name
+            thread = await auth_handler.verify_password_async("password", "hash")
+        assert thread.startswith("bcrypt")
@@ -0,0 +1,61 @@
+"""
+Implements tests for cache.py module
+"""
+import unittest
+
+from cache import TTLCache
+from unittest import mock
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    @mock.patch("cache.time.monotonic")
+    def test_expiration(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+        mock_monotonic.return_value = 111
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert cache.stats()["expirations"] == 1
+
+    def test_pop_matching(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        for key in range(5):
+            cache.set(key, key)
+        assert cache.pop_matching(lambda key, value: value % 2) == 2
+        assert cache.get(1) is None
+        assert cache.get(2) == 2
+        assert cache.stats()["invalidations"] == 2
+
+    def test_set_after_invalidation(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        generation = cache.generation
+        cache.pop("a")
+        cache.set("a", 1, generation=generation)
+        assert cache.get("a") is None
+        cache.set("a", 1, generation=cache.generation)
+        assert cache.get("a") == 1
+
+    def test_disabled(self):
+        cache = TTLCache(maxsize=0, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") is None
@@ -0,0 +1,129 @@
+"""
+Implements tests for catalogue.py module
+"""
+import catalogue
+import unittest
+
+from datetime import datetime
+from test.helpers import DatabaseTestCase
+
+
+class TestCatalogue(DatabaseTestCase):
+    async def test_bump(self):
+        assert await catalogue.read(self.session) == (0, None)
+        first = await catalogue.bump(self.session)
+        await self.session.commit()
+        second = await catalogue.bump(self.session)
+        await self.session.rollback()
+        assert first[0] == 1
+        assert second[0] == 2
+        assert await catalogue.read(self.session) == first
+
+    async def test_version_cache(self):
+        changes = []
+        versions = catalogue.VersionCache(on_change=lambda: changes.append(1))
+        versions.ttl = 3600
+        await catalogue.bump(self.session)
+        await self.session.commit()
+        assert (await versions.get(self.session))[0] == 1
+
+        # read again once the ttl is over
+        await catalogue.bump(self.session)
+        await catalogue.bump(self.session)
+        await self.session.commit()
+        assert (await versions.get(self.session))[0] == 1
+        versions.expires_at = 0
+        assert (await versions.get(self.session))[0] == 3
+        assert changes == [1]
+
+        # the next version is a change of this process
+        versions.end_commit(versions.begin_commit(), (4, datetime.utcnow()))
+        versions.advance(2, datetime.utcnow())
+        assert versions.version == 4
+        assert changes == [1]
+
+    def test_version_cache_commits_out_of_order(self):
+        changes = []
+        versions = catalogue.VersionCache(on_change=lambda: changes.append(1))
+        versions.advance(1, datetime.utcnow())
+        first, second, third = (versions.begin_commit() for _ in range(3))
+        versions.end_commit(third, (4, datetime.utcnow()))
+        # read before the first two commits ended
+        versions.advance(4, datetime.utcnow())
+        versions.end_commit(first, (2, datetime.utcnow()))
+        versions.end_commit(second, (3, datetime.utcnow()))
+        assert versions.version == 4
+        assert changes == []
+
+        # 5 is another process' when the commit in flight ends with 6
+        commit = versions.begin_commit()
+        versions.advance(5, datetime.utcnow())
+        assert changes == []
+        versions.end_commit(commit, (6, datetime.utcnow()))
+        assert changes == [1]
+
+        # more versions than commits in flight
+        commit = versions.begin_commit()
+        versions.advance(9, datetime.utcnow())
+        assert changes == [1, 1]
+        versions.end_commit(commit)
+        assert versions.version == 9
+        assert changes == [1, 1]
+
+        # a rolled back commit doesn't explain a version
+        commit = versions.begin_commit()
+        versions.advance(10, datetime.utcnow())
+        versions.end_commit(commit)
+        assert changes == [1, 1, 1]
+
+    async def test_commit_change(self):
+        changes = []
+        versions = catalogue.VersionCache(on_change=lambda: changes.append(1))
+        versions.ttl = 3600
+        assert (await versions.get(self.session))[0] == 0
+        version = await catalogue.commit_change(self.session, versions)
+        assert version[0] == 1
+        assert (await versions.get(self.session)) == version
+        # without a cache only the table is bumped
+        assert (await catalogue.commit_change(self.session))[0] == 2
+        assert versions.version == 1
+        assert changes == []
+
+
+class TestConditional(unittest.TestCase):
+    def setUp(self):
+        self.headers = catalogue.validators(7, datetime(2026, 10, 18, 12, 0, 30, 500))
+
+    def test_validators(self):
+        assert self.headers["ETag"] == '"7"'
+        assert self.headers["Last-Modified"] == "Sun, 18 Oct 2026 12:00:30 GMT"
+
+    def test_if_none_match(self):
+        assert catalogue.not_modified({"if-none-match": '"7"'}, self.headers)
+        assert catalogue.not_modified({"if-none-match": '"6", W/"7"'}, self.headers)
+        assert catalogue.not_modified({"if-none-match": "*"}, self.headers)
+        assert not catalogue.not_modified({"if-none-match": '"6"'}, self.headers)
+        # wins over If-Modified-Since
+        assert not catalogue.not_modified(
+            {
+                "if-none-match": '"6"',
+                "if-modified-since": "Sun, 18 Oct 2026 12:00:30 GMT",
+            },
+            self.headers,
+        )
+
+    def test_if_modified_since(self):
+        assert catalogue.not_modified(
+            {"if-modified-since": "Sun, 18 Oct 2026 12:00:30 GMT"}, self.headers
+        )
+        assert not catalogue.not_modified(
+            {"if-modified-since": "Sun, 18 Oct 2026 12:00:29 GMT"}, self.headers
+        )
+        assert not catalogue.not_modified(
+            {"if-modified-since": "yesterday"}, self.headers
+        )
+        assert not catalogue.not_modified({}, self.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
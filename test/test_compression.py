@@ -0,0 +1,131 @@
+"""
+Implements tests for compression.py module
+"""
+import brotli
+import compression
+import gzip
+import unittest
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+BODY = b'{"title": "Batman"}' * 100
+
+
+class TestChooseEncoding(unittest.TestCase):
+    def test_choose_encoding(self):
+        assert compression.choose_encoding("gzip, deflate, br") == "br"
+        assert compression.choose_encoding("gzip, br;q=0.5") == "gzip"
+        assert compression.choose_encoding("GZIP") == "gzip"
+        assert compression.choose_encoding("br;q=0, *") == "gzip"
+        assert compression.choose_encoding("identity") is None
+        assert compression.choose_encoding("gzip;q=0, br;q=bad") is None
+        assert compression.choose_encoding("") is None
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+
+        @app.get("/json")
+        async def json_route():
+            return Response(
+                BODY, media_type="application/json", headers={"ETag": '"3"'}
+            )
+
+        @app.get("/small")
+        async def small_route():
+            return Response(
+                b"{}", media_type="application/json", headers={"ETag": '"3"'}
+            )
+
+        @app.get("/not-modified")
+        async def not_modified_route():
+            return Response(status_code=304, headers={"ETag": '"3"'})
+
+        @app.get("/image")
+        async def image_route():
+            return Response(BODY, media_type="image/png")
+
+        @app.get("/stream")
+        async def stream_route():
+            async def rows():
+                for _ in range(100):
+                    yield b'{"title": "Batman"}\n'
+
+            return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+        @app.get("/encoded")
+        async def encoded_route():
+            return PlainTextResponse(
+                gzip.compress(BODY), headers={"Content-Encoding": "gzip"}
+            )
+
+        app.add_middleware(compression.CompressionMiddleware)
+        self.client = TestClient(app)
+
+    def get(self, path, accept_encoding):
+        # raw bytes, without httpx decoding them
+        with self.client.stream(
+            "GET", path, headers={"Accept-Encoding": accept_encoding}
+        ) as response:
+            return response, b"".join(response.iter_raw())
+
+    def test_gzip(self):
+        response, body = self.get("/json", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == 'W/"3"'
+        assert int(response.headers["content-length"]) == len(body) < len(BODY)
+        assert gzip.decompress(body) == BODY
+
+    def test_brotli(self):
+        response, body = self.get("/json", "gzip, br")
+        assert response.headers["content-encoding"] == "br"
+        assert brotli.decompress(body) == BODY
+
+    def test_uncompressed(self):
+        for path, accept_encoding in [
+            ("/json", "identity"),
+            ("/small", "gzip"),
+            ("/image", "gzip"),
+        ]:
+            response, body = self.get(path, accept_encoding)
+            assert "content-encoding" not in response.headers
+            assert int(response.headers["content-length"]) == len(body)
+        # could have been compressed, its validators are those of a compressed one
+        response, _ = self.get("/small", "gzip")
+        assert response.headers["etag"] == 'W/"3"'
+        assert response.headers["vary"] == "Accept-Encoding"
+        response, _ = self.get("/image", "gzip")
+        assert "vary" not in response.headers
+
+    def test_not_modified(self):
+        response, body = self.get("/not-modified", "gzip")
+        assert response.status_code == 304
+        assert response.headers["etag"] == 'W/"3"'
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert body == b""
+        response, _ = self.get("/not-modified", "identity")
+        assert response.headers["etag"] == '"3"'
+        assert "vary" not in response.headers
+
+    def test_already_encoded(self):
+        response, body = self.get("/encoded", "br")
+        assert response.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(body) == BODY
+
+    def test_streamed(self):
+        for accept_encoding, decompress in [
+            ("gzip", gzip.decompress),
+            ("br", brotli.decompress),
+        ]:
+            response, body = self.get("/stream", accept_encoding)
+            assert response.headers["content-encoding"] == accept_encoding
+            assert "content-length" not in response.headers
+            assert decompress(body) == b'{"title": "Batman"}\n' * 100
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Implements tests for database.py module
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+
+from database import (
+    InstrumentedAsyncAdaptedQueuePool,
+    _database_url,
+    _pool_options,
+    instrument_queries,
+    query_duration,
+    query_errors,
+    upsert_statement,
+)
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from unittest import mock
+
+
+class TestDatabase(unittest.TestCase):
+    @mock.patch.dict(
+        os.environ,
+        {"DB_PASS": "secret", "INSTANCE_UNIX_SOCKET": "/cloudsql/instance"},
+        clear=True,
+    )
+    def test_database_url_unix_socket(self):
+        url = _database_url()
+        assert url.drivername == "mysql+aiomysql"
+        assert url.query == {"unix_socket": "/cloudsql/instance"}
+        assert url.host is None
+
+    @mock.patch.dict(
+        os.environ,
+        {
+            "DB_PASS": "secret",
+            "DB_CONNECTION_MODE": "tcp",
+            "DB_HOST": "10.0.0.3",
+            "DB_PORT": "3307",
+        },
+        clear=True,
+    )
+    def test_database_url_tcp(self):
+        url = _database_url()
+        assert (url.host, url.port) == ("10.0.0.3", 3307)
+        assert url.query == {}
+
+    @mock.patch.dict(os.environ, {"DATABASE_URL": "sqlite+aiosqlite:///brite.db"})
+    def test_database_url_override(self):
+        assert str(_database_url()) == "sqlite+aiosqlite:///brite.db"
+
+    @mock.patch.dict(os.environ, {"DATABASE_URL": "postgresql+asyncpg://db/brite"})
+    def test_database_url_unsupported(self):
+        with self.assertRaises(ValueError):
+            _database_url()
+
+    @mock.patch.dict(
+        os.environ,
+        {"DB_PASS": "secret", "DB_CONNECTION_MODE": "pigeon"},
+        clear=True,
+    )
+    def test_database_url_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            _database_url()
+
+    @mock.patch.dict(
+        os.environ, {"DB_POOL_SIZE": "20", "DB_POOL_PRE_PING": "false"}, clear=True
+    )
+    def test_pool_options(self):
+        options = _pool_options()
+        assert options["pool_size"] == 20
+        assert options["pool_pre_ping"] is False
+        assert options["max_overflow"] == 10
+
+    def test_pool_stats(self):
+        stats = InstrumentedAsyncAdaptedQueuePool.stats
+        checkouts, connects = stats.checkouts, stats.connects
+
+        async def query(engine):
+            for _ in range(3):
+                async with engine.connect() as conn:
+                    await conn.execute(text("select 1"))
+            await engine.dispose()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_async_engine(
+                f"sqlite+aiosqlite:///{tmp}/pool.db",
+                poolclass=InstrumentedAsyncAdaptedQueuePool,
+            )
+            asyncio.run(query(engine))
+
+        assert stats.checkouts - checkouts == 3
+        assert stats.connects - connects == 1
+        assert stats.checkout_wait_seconds_total > 0
+
+    def test_query_metrics(self):
+        selects = query_duration.count("select")
+        errors = query_errors.get("select")
+        engine = create_engine("sqlite://")
+        instrument_queries(engine)
+        with engine.connect() as conn:
+            conn.execute(text("select 1"))
+            with self.assertRaises(OperationalError):
+                conn.execute(text("select * from missing_table"))
+        assert query_duration.count("select") == selects + 1
+        assert query_errors.get("select") == errors + 1
+
+    def test_upsert_statement(self):
+        from models import Movie
+
+        table = Movie.__table__
+        rows = [{"imdbid": "tt1", "title": "Batman"}]
+        for dialect, conflict in [
+            (mysql, "ON DUPLICATE KEY UPDATE title = VALUES(title)"),
+            (sqlite, "ON CONFLICT (imdbid) DO UPDATE SET title = excluded.title"),
+        ]:
+            statement = upsert_statement(
+                table, rows, dialect.dialect.name, ["imdbid"], ["title"]
+            )
+            assert conflict in str(statement.compile(dialect=dialect.dialect()))
+        statement = upsert_statement(table, rows, "sqlite", ["imdbid"])
+        compiled = str(statement.compile(dialect=sqlite.dialect()))
+        assert "ON CONFLICT (imdbid) DO NOTHING" in compiled
+        with self.assertRaises(NotImplementedError):
+            upsert_statement(table, rows, "postgresql", ["imdbid"])
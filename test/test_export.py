@@ -0,0 +1,43 @@
+"""
+Implements tests for export.py module
+"""
+import csv
+import io
+import json
+
+from export import COLUMNS, stream_movies
+from models import Movie
+from test.helpers import DatabaseTestCase
+
+
+class TestExport(DatabaseTestCase):
+    async def add_movies(self, count):
+        self.session.add_all(
+            Movie(imdbid=f"tt{i}", title=f"Movie, {i}", year=2000 + i)
+            for i in range(count)
+        )
+        await self.session.commit()
+
+    async def export(self, format, batch_size=2):
+        return [
+            chunk async for chunk in stream_movies(self.session, format, batch_size)
+        ]
+
+    async def test_ndjson_is_streamed_in_batches(self):
+        await self.add_movies(5)
+        chunks = await self.export("ndjson")
+        assert len(chunks) == 3
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        assert [row["imdbid"] for row in rows] == [f"tt{i}" for i in range(5)]
+        assert list(rows[0]) == COLUMNS
+
+    async def test_csv(self):
+        await self.add_movies(3)
+        chunks = await self.export("csv")
+        rows = list(csv.reader(io.StringIO("".join(chunks))))
+        assert rows[0] == COLUMNS
+        assert [row[2] for row in rows[1:]] == ["Movie, 0", "Movie, 1", "Movie, 2"]
+
+    async def test_empty_table(self):
+        assert "".join(await self.export("csv")) == ",".join(COLUMNS) + "\r\n"
+        assert "".join(await self.export("ndjson")) == ""
@@ -0,0 +1,132 @@
+"""
+Implements tests for ingest.py module
+"""
+import asyncio
+import ingest
+
+from datetime import datetime, timedelta
+from models import IngestJob, Movie
+from sqlalchemy import select, update
+from test.helpers import DatabaseTestCase, FakeOperations
+
+
+class TestIngest(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.added = []
+        self.operations = FakeOperations()
+        self.workers = ingest.IngestWorkers(
+            self.operations, self.sessions, workers=2, on_added=self.added.append
+        )
+        self.workers.retry_delay = 0
+
+    async def asyncTearDown(self):
+        await self.workers.stop()
+        await super().asyncTearDown()
+
+    async def job(self, id):
+        self.session.expire_all()
+        return await self.session.get(IngestJob, id)
+
+    async def test_enqueue_dedupes_live_jobs(self):
+        first = await ingest.enqueue(self.session, ingest.TITLE, ["Batman", "Heat"])
+        again = await ingest.enqueue(self.session, ingest.TITLE, [" batman", "Ronin"])
+        assert again[0].id == first[0].id
+        assert [job.value for job in again] == ["Batman", "Ronin"]
+        assert all(job.status == ingest.QUEUED for job in first + again)
+
+    async def test_job_adds_movie(self):
+        (job,) = await ingest.enqueue(self.session, ingest.TITLE, ["Batman"])
+        assert await self.workers.run_once()
+        assert not await self.workers.run_once()
+
+        job = await self.job(job.id)
+        assert (job.status, job.attempts, job.dedupe_key) == (ingest.DONE, 1, None)
+        movie_id = job.movie_id
+        movie = await self.session.get(Movie, movie_id)
+        assert movie.title == "Batman"
+        assert [movie.id for movie in self.added] == [movie_id]
+
+        # a done job doesn't block fetching the movie again
+        (again,) = await ingest.enqueue(self.session, ingest.TITLE, ["Batman"])
+        assert again.id != job.id
+        assert await self.workers.run_once()
+        assert (await self.job(again.id)).movie_id == movie_id
+        assert len(self.added) == 1
+
+    async def test_imdbid_job(self):
+        (job,) = await ingest.enqueue(self.session, ingest.IMDBID, ["tt0096895"])
+        assert await self.workers.run_once()
+        assert (await self.job(job.id)).status == ingest.DONE
+        assert self.operations.calls == ["tt0096895"]
+
+    async def test_failed_job_is_retried(self):
+        self.operations.failures = 1
+        (job,) = await ingest.enqueue(self.session, ingest.TITLE, ["Batman"])
+        assert await self.workers.run_once()
+        job = await self.job(job.id)
+        assert (job.status, job.attempts) == (ingest.QUEUED, 1)
+        assert "OMDB is down" in job.last_error
+
+        assert await self.workers.run_once()
+        job = await self.job(job.id)
+        assert (job.status, job.attempts, job.last_error) == (ingest.DONE, 2, None)
+
+    async def test_retries_back_off(self):
+        self.workers.retry_delay = 60
+        self.operations.failures = 1
+        (job,) = await ingest.enqueue(self.session, ingest.TITLE, ["Batman"])
+        assert await self.workers.run_once()
+        job = await self.job(job.id)
+        assert job.available_at > datetime.utcnow() + timedelta(seconds=50)
+        assert not await self.workers.run_once()
+
+    async def test_job_dies_after_max_attempts(self):
+        self.workers.max_attempts = 2
+        self.operations.failures = 2
+        (job,) = await ingest.enqueue(self.session, ingest.TITLE, ["Batman"])
+        assert await self.workers.run_once()
+        assert await self.workers.run_once()
+        job = await self.job(job.id)
+        assert (job.status, job.attempts) == (ingest.DEAD, 2)
+
+    async def test_not_found_is_dead_right_away(self):
+        (job,) = await ingest.enqueue(self.session, ingest.TITLE, ["Unknown"])
+        assert await self.workers.run_once()
+        job = await self.job(job.id)
+        assert (job.status, job.attempts) == (ingest.DEAD, 1)
+        assert job.last_error == "Movie Not Found in OMDB."
+
+    async def test_expired_lease_is_claimed_again(self):
+        (job,) = await ingest.enqueue(self.session, ingest.TITLE, ["Batman"])
+        # the worker which claimed it died
+        await self.session.execute(
+            update(IngestJob)
+            .filter_by(id=job.id)
+            .values(status=ingest.RUNNING, attempts=1, locked_until=datetime.utcnow())
+        )
+        await self.session.commit()
+        assert await self.workers.run_once()
+        job = await self.job(job.id)
+        assert (job.status, job.attempts) == (ingest.DONE, 2)
+
+    async def test_running_job_is_not_claimed_twice(self):
+        await ingest.enqueue(self.session, ingest.TITLE, ["Batman"])
+        async with self.sessions() as first, self.sessions() as second:
+            assert await self.workers.claim(first) is not None
+            assert await self.workers.claim(second) is None
+
+    async def test_workers_process_queue(self):
+        self.workers.poll_interval = 10
+        self.workers.start()
+        jobs = await ingest.enqueue(self.session, ingest.TITLE, ["A", "B", "C"])
+        ids = [job.id for job in jobs]
+        self.workers.notify()
+        for _ in range(100):
+            statuses = [(await self.job(id)).status for id in ids]
+            if statuses == [ingest.DONE] * 3:
+                break
+            await asyncio.sleep(0.05)
+        assert statuses == [ingest.DONE] * 3
+        movies = await self.session.execute(select(Movie.title).order_by(Movie.title))
+        assert movies.scalars().all() == ["A", "B", "C"]
@@ -0,0 +1,47 @@
+"""
+Implements tests for leases.py module
+"""
+import leases
+import unittest
+
+from unittest import mock
+from test.helpers import DatabaseTestCase
+
+
+class TestLeases(DatabaseTestCase):
+    def as_other_process(self):
+        return mock.patch.object(leases, "owner", return_value="other:1")
+
+    async def test_acquire(self):
+        assert await leases.acquire(self.session, "seed", 60)
+        # renewing a held lease works, taking it from another process doesn't
+        assert await leases.acquire(self.session, "seed", 60)
+        with self.as_other_process():
+            assert not await leases.acquire(self.session, "seed", 60)
+            assert await leases.acquire(self.session, "refresh", 60)
+
+        await leases.release(self.session, "seed")
+        with self.as_other_process():
+            assert await leases.acquire(self.session, "seed", 60)
+
+    async def test_ended_lease_is_taken_over(self):
+        assert await leases.acquire(self.session, "seed", -1)
+        with self.as_other_process():
+            assert await leases.acquire(self.session, "seed", 60)
+        assert not await leases.acquire(self.session, "seed", 60)
+
+    async def test_hold(self):
+        async with leases.hold(self.sessions, "seed", 60) as held:
+            assert held
+            with self.as_other_process():
+                async with leases.hold(self.sessions, "seed", 60) as other_held:
+                    assert not other_held
+        with self.as_other_process():
+            async with leases.hold(self.sessions, "seed", 60, keep=True) as held:
+                assert held
+        # kept after the block
+        assert not await leases.acquire(self.session, "seed", 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,42 +1,49 @@
+import asyncio
 import json
 import os
 import sys
 import unittest
 
 from unittest import mock
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from database import Base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import create_engine, delete, insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 
 mock_omdb_util = mock.MagicMock()
-sys.modules["omdb_util"] = mock_omdb_util
-
 mock_operations = mock.MagicMock()
-sys.modules["operations"] = mock_operations
+mocked_modules = {"omdb_util": mock_omdb_util, "operations": mock_operations}
+real_modules = {name: sys.modules.get(name) for name in mocked_modules}
+sys.modules.update(mocked_modules)
 
 os.environ["fastApiUnittest"] = "unittests"
+import main
 from main import get_db, app, models
 
+# the tests of these modules collected after this one import the real ones
+for name, module in real_modules.items():
+    if module is None:
+        del sys.modules[name]
+    else:
+        sys.modules[name] = module
+
 SQLALCHEMY_DATABASE_URL = "sqlite:///test.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
 Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
 
+# TestClient runs every request on a new event loop,
+# so connections can't be shared between requests
+async_engine = create_async_engine("sqlite+aiosqlite:///test.db", poolclass=NullPool)
+TestingSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 app.dependency_overrides[get_db] = override_get_db
@@ -71,12 +78,24 @@ def test_single_route_failure():
 
 
 def test_add():
-    mock_operations.Operations().get_movie_info.return_value = models.Movie(**mock_data)
+    mock_operations.Operations().get_movie_info_async = mock.AsyncMock(
+        return_value=models.Movie(**mock_data)
+    )
     response = client.post("/add?title=Batman")
     assert response.status_code == 200
     assert response.json() == mock_data
 
 
+def test_add_inserted_concurrently():
+    # the title check passed, but another request inserted the movie first
+    mock_operations.Operations().get_movie_info_async = mock.AsyncMock(
+        return_value=models.Movie(**dict(mock_data, id=None, title="Batman (1989)"))
+    )
+    response = client.post("/add?title=Batman (1989)")
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Movie already exists in database"}
+
+
 def test_list_route():
     response = client.get("/list?page=1&perpage=10")
     assert response.status_code == 200
@@ -89,6 +108,78 @@ def test_list_route():
     }
 
 
+def test_list_route_not_modified():
+    response = client.get("/list?page=1&perpage=10")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+    hits = client.get("/stats/cache").json()["hits"]
+
+    response = client.get("/list?page=1&perpage=10", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    # answered before the response cache
+    assert client.get("/stats/cache").json()["hits"] == hits
+
+    last_modified = response.headers["last-modified"]
+    response = client.get("/single", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    response = client.get("/single", headers={"If-None-Match": '"0", W/"99"'})
+    assert response.status_code == 200
+    assert response.json() == mock_data
+
+
+def test_list_route_cursor():
+    response = client.get("/list?paging=cursor&perpage=10")
+    assert response.status_code == 200
+    assert response.json() == {
+        "items": [mock_data],
+        "size": 10,
+        "next_cursor": None,
+        "previous_cursor": None,
+    }
+
+
+def test_list_route_fields():
+    short = {"id": 1, "title": "Batman", "year": 1989}
+    response = client.get("/list?perpage=10&fields=year,title, id")
+    assert response.status_code == 200
+    assert response.json()["items"] == [short]
+    response = client.get("/list?paging=cursor&perpage=10&fields=id,title,year")
+    assert response.json()["items"] == [short]
+    response = client.get("/single?title=Batman&fields=title")
+    assert response.json() == {"title": "Batman"}
+    for path in ["/list?fields=id,plot", "/single?fields=,"]:
+        response = client.get(path)
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("fields must be")
+
+
+def test_list_route_compressed():
+    with mock.patch.dict(os.environ, {"COMPRESS_MIN_SIZE": "0"}):
+        app.middleware_stack = None
+        response = client.get("/list?perpage=10", headers={"Accept-Encoding": "gzip"})
+    app.middleware_stack = None
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].startswith('W/"')
+    assert response.json()["items"] == [mock_data]
+
+
+def test_health_routes():
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json()["seed"]["state"] == "pending"
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+def test_list_route_invalid_cursor():
+    response = client.get("/list?paging=cursor&cursor=invalid")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
 def test_single_route_without_title():
     response = client.get("/single")
     assert response.status_code == 200
@@ -135,8 +226,316 @@ def test_delete_route():
     assert response.json() == {"1 row": "removed"}
 
 
+def test_single_route_after_delete():
+    response = client.get("/single?title=Batman")
+    assert response.status_code == 404
+
+
+def test_etag_changes_after_delete():
+    response = client.get("/list?page=1&perpage=10")
+    etag = response.headers["etag"]
+    mock_operations.Operations().get_movie_info_async = mock.AsyncMock(
+        return_value=models.Movie(**dict(mock_data, id=2, imdbid="tt2", title="Heat"))
+    )
+    client.post("/add?title=Heat")
+    response = client.get("/list?page=1&perpage=10", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["total"] == 1
+    client.delete("/remove?id=2", headers={"Authorization": f"Bearer {access_token}"})
+
+
+def test_cache_stats_route():
+    hits = client.get("/stats/cache").json()["hits"]
+    client.get("/list?page=1&perpage=10")
+    client.get("/list?page=1&perpage=10")
+    response = client.get("/stats/cache")
+    assert response.status_code == 200
+    assert response.json()["hits"] == hits + 1
+    assert response.json()["invalidations"] > 0
+
+
 def test_delete_route_failure():
     headers = {"Authorization": f"Bearer {access_token}"}
     response = client.delete("/remove?id=123", headers=headers)
     assert response.status_code == 404
     assert response.json() == {"detail": "Movie with id: 123 not found"}
+
+
+def test_pool_stats_route():
+    response = client.get("/stats/pool")
+    assert response.status_code == 200
+    assert {"size", "checked_out", "checkouts", "checkout_wait_seconds_max"} <= set(
+        response.json()
+    )
+
+
+def test_metrics_route():
+    client.get("/list?page=1&perpage=10")
+    client.get("/ingest/424242")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    count = 'http_request_duration_seconds_count{method="GET",route="%s",status="%s"}'
+    assert any(line.startswith(count % ("/list", 200)) for line in lines)
+    # labelled by the route template, not the path
+    assert any(line.startswith(count % ("/ingest/{job_id}", 404)) for line in lines)
+    assert any(line.startswith("db_pool_checkouts_total ") for line in lines)
+    assert any(line.startswith("movie_cache_hits_total ") for line in lines)
+
+
+def test_profiles_route():
+    # the profiles show the requests of every user
+    assert client.get("/profiles").status_code == 401
+    assert client.get("/profiles/missing").status_code == 401
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get("/profiles", headers=headers)
+    assert response.status_code == 200
+    assert isinstance(response.json()["profiles"], list)
+    assert client.get("/profiles/missing", headers=headers).status_code == 404
+
+
+def test_bulk_add():
+    superman = dict(mock_data, imdbid="tt0078346", title="Superman", id=None)
+    mock_operations.Operations().get_movies_info_async = mock.AsyncMock(
+        return_value={
+            "Superman": models.Movie(**superman),
+            "Unknown": HTTPException(404, detail="Movie Not Found in OMDB."),
+        }
+    )
+    response = client.post(
+        "/add/bulk", json={"titles": ["Superman", "Unknown", "Superman"]}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(r["title"], r["status"]) for r in results] == [
+        ("Superman", "added"),
+        ("Unknown", "not_found"),
+    ]
+    mock_operations.Operations().get_movies_info_async.assert_called_with(
+        ["Superman", "Unknown"]
+    )
+    assert client.get("/single?title=Superman").json()["id"] == results[0]["id"]
+
+
+def test_bulk_add_existing():
+    superman = dict(mock_data, imdbid="tt0078346", title="Superman", id=None)
+    mock_operations.Operations().get_movies_info_async = mock.AsyncMock(
+        return_value={"superman": models.Movie(**superman)}
+    )
+    response = client.post("/add/bulk", json={"titles": ["Superman", "superman"]})
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["results"]] == ["exists", "exists"]
+
+
+def test_bulk_add_empty():
+    response = client.post("/add/bulk", json={"titles": []})
+    assert response.status_code == 422
+
+
+def test_export_ndjson():
+    response = client.get("/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == ["Superman"]
+
+
+def test_export_csv():
+    response = client.get("/export?format=csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    header, row = response.text.splitlines()
+    assert header.split(",")[:3] == ["id", "imdbid", "title"]
+    assert "Superman" in row
+
+
+def test_search():
+    response = client.get("/search?q=super")
+    assert response.status_code == 200
+    result = response.json()
+    assert result["total"] == 1
+    assert result["items"][0]["title"] == "Superman"
+    assert result["items"][0]["score"] > 0
+    assert result["facets"]["year"] == {"1989": 1}
+
+
+def test_search_after_remove():
+    headers = {"Authorization": f"Bearer {access_token}"}
+    id = client.get("/single?title=Superman").json()["id"]
+    assert client.delete(f"/remove?id={id}", headers=headers).status_code == 200
+    assert client.get("/search?q=superman").json()["total"] == 0
+
+
+def test_search_after_change_by_other_process():
+    # another app process adds a movie
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.Movie).values(
+                **dict(mock_data, id=50, imdbid="tt50", title="Batman Returns")
+            )
+        )
+        conn.execute(
+            update(models.CatalogueVersion).values(
+                version=models.CatalogueVersion.version + 2
+            )
+        )
+
+    async def read_version():
+        main.catalogue_versions.expires_at = 0
+        async with TestingSessionLocal() as db:
+            await main.catalogue_versions.get(db)
+        await main.movie_index_rebuild
+
+    with mock.patch.object(main, "AsyncSessionLocal", TestingSessionLocal):
+        asyncio.run(read_version())
+    assert client.get("/search?q=returns").json()["total"] == 1
+
+    with engine.begin() as conn:
+        conn.execute(delete(models.Movie).filter_by(id=50))
+    main.movie_index.remove(50)
+
+
+def test_search_index_read_failure():
+    db = mock.MagicMock()
+    db.stream = mock.AsyncMock(side_effect=RuntimeError("database gone"))
+    try:
+        asyncio.run(main.build_movie_index(db))
+    except RuntimeError as e:
+        assert str(e) == "database gone"
+    else:
+        raise AssertionError("the error wasn't raised")
+    # changes aren't recorded for a build which won't happen
+    assert main.movie_index.pending is None
+
+
+def test_search_invalid_perpage():
+    response = client.get("/search?q=superman&perpage=1000")
+    assert response.status_code == 400
+
+
+def bulk_add(*movies):
+    mock_operations.Operations().get_movies_info_async = mock.AsyncMock(
+        return_value={
+            movie["title"]: models.Movie(**dict(mock_data, id=None, **movie))
+            for movie in movies
+        }
+    )
+    response = client.post(
+        "/add/bulk", json={"titles": [movie["title"] for movie in movies]}
+    )
+    return [result["id"] for result in response.json()["results"]]
+
+
+def test_bulk_remove_requires_token():
+    response = client.post("/remove/bulk", json={"ids": [1]})
+    assert response.status_code == 401
+
+
+def test_bulk_remove_ids_or_filter():
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for body in [{}, {"ids": [1], "year": 1989}, {"ids": []}]:
+        response = client.post("/remove/bulk", json=body, headers=headers)
+        assert response.status_code == 422
+
+
+def test_bulk_remove_by_ids():
+    headers = {"Authorization": f"Bearer {access_token}"}
+    ids = bulk_add(
+        {"title": "Alien", "imdbid": "tt0078748"},
+        {"title": "Aliens", "imdbid": "tt0090605"},
+    )
+    client.get("/single?title=Alien")
+    with mock.patch("main.REMOVE_CHUNK_SIZE", 1):
+        response = client.post(
+            "/remove/bulk", json={"ids": ids + [ids[0], 123]}, headers=headers
+        )
+    assert response.status_code == 200
+    assert response.json() == {"removed": 2, "not_found": [123]}
+    assert client.get("/single?title=Alien").status_code == 404
+    assert client.get("/search?q=alien").json()["total"] == 0
+
+
+def test_bulk_remove_by_filter():
+    headers = {"Authorization": f"Bearer {access_token}"}
+    bulk_add(
+        {"title": "Heat", "imdbid": "tt0113277", "genre": "Crime, Drama"},
+        {"title": "Tár", "imdbid": "tt14444726", "genre": "Drama, Music"},
+        {"title": "Titanic", "imdbid": "tt0120338", "genre": "Melodrama"},
+        {"title": "Ronin", "imdbid": "tt0122690", "genre": "Action, Crime"},
+    )
+    with mock.patch("main.REMOVE_CHUNK_SIZE", 1):
+        response = client.post(
+            "/remove/bulk", json={"genre": "Drama", "year": 1989}, headers=headers
+        )
+    assert response.json() == {"removed": 2, "not_found": []}
+    remaining = client.get("/list?perpage=100").json()["items"]
+    assert [movie["title"] for movie in remaining] == ["Ronin", "Titanic"]
+
+
+def test_ingest():
+    response = client.post(
+        "/ingest", json={"titles": ["Jaws", "jaws"], "imdbids": ["tt0073195"]}
+    )
+    assert response.status_code == 202
+    jobs = response.json()["jobs"]
+    assert [(job["kind"], job["value"], job["status"]) for job in jobs] == [
+        ("title", "Jaws", "queued"),
+        ("imdbid", "tt0073195", "queued"),
+    ]
+
+    response = client.get(f"/ingest/{jobs[0]['id']}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    queued = client.get("/ingest?status=queued").json()["jobs"]
+    assert [job["id"] for job in queued] == [jobs[1]["id"], jobs[0]["id"]]
+
+
+def test_ingest_job_not_found():
+    response = client.get("/ingest/123")
+    assert response.status_code == 404
+
+
+def test_ingest_empty():
+    response = client.post("/ingest", json={})
+    assert response.status_code == 422
+
+
+def test_invalidate_movie_cache_ignores_case():
+    main.movie_cache.clear()
+    main.movie_cache.set(("single", "Heat", None), b"{}")
+    main.movie_cache.set(("single", "Batman", None), b"{}")
+    main.movie_cache.set(("cursor", 10, "a", None), (b"{}", ("Alien", "Jaws")))
+    main.movie_cache.set(("cursor", 10, "b", None), (b"{}", ("Jaws", None)))
+    main.invalidate_movie_cache("heat")
+    assert main.movie_cache.get(("single", "Heat", None)) is None
+    assert main.movie_cache.get(("single", "Batman", None)) is not None
+    assert main.movie_cache.get(("cursor", 10, "a", None)) is None
+    assert main.movie_cache.get(("cursor", 10, "b", None)) is not None
+    main.movie_cache.clear()
+
+
+def test_list_route_changed_while_read():
+    paginate_by_offset = main.pagination.paginate_by_offset
+
+    async def read_then_add(*args):
+        result = await paginate_by_offset(*args)
+        # /add commits and invalidates before the read stores its page
+        with engine.begin() as conn:
+            conn.execute(
+                insert(models.Movie).values(
+                    **dict(mock_data, id=60, imdbid="tt60", title="Zelig")
+                )
+            )
+        main.invalidate_movie_cache("Zelig")
+        return result
+
+    with mock.patch.object(main.pagination, "paginate_by_offset", read_then_add):
+        total = client.get("/list?perpage=50").json()["total"]
+    assert client.get("/list?perpage=50").json()["total"] == total + 1
+
+    with engine.begin() as conn:
+        conn.execute(delete(models.Movie).filter_by(id=60))
+    main.movie_cache.clear()
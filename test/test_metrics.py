@@ -0,0 +1,66 @@
+"""
+Implements tests for metrics.py module
+"""
+import unittest
+
+from metrics import Counter, Histogram, Registry, statement_operation
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = Counter("jobs_total", "Jobs", ["status"], registry=self.registry)
+        counter.inc("done")
+        counter.inc("done", amount=2)
+        counter.inc('de"ad')
+        assert counter.get("done") == 3
+        assert self.registry.render().splitlines() == [
+            "# HELP jobs_total Jobs",
+            "# TYPE jobs_total counter",
+            'jobs_total{status="done"} 3',
+            'jobs_total{status="de\\"ad"} 1',
+        ]
+
+    def test_histogram(self):
+        histogram = Histogram(
+            "latency_seconds", "Latency", ["route"], [0.1, 1], registry=self.registry
+        )
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, "/list")
+        assert histogram.count("/list") == 4
+        assert histogram.count("/single") == 0
+        assert self.registry.render().splitlines()[2:] == [
+            'latency_seconds_bucket{route="/list",le="0.1"} 2',
+            'latency_seconds_bucket{route="/list",le="1.0"} 3',
+            'latency_seconds_bucket{route="/list",le="+Inf"} 4',
+            'latency_seconds_sum{route="/list"} 3.65',
+            'latency_seconds_count{route="/list"} 4',
+        ]
+
+    def test_snapshot(self):
+        self.registry.register_snapshot(
+            "pool",
+            "Pool",
+            lambda: {"size": 5, "checkouts": 7, "wait_seconds_total": 0.5},
+            counters=("checkouts", "wait_seconds_total"),
+        )
+        lines = self.registry.render().splitlines()
+        assert "# TYPE pool_size gauge" in lines
+        assert "# TYPE pool_checkouts_total counter" in lines
+        assert {
+            "pool_size 5",
+            "pool_checkouts_total 7",
+            "pool_wait_seconds_total 0.5",
+        } <= set(lines)
+
+    def test_statement_operation(self):
+        assert statement_operation("SELECT 1") == "select"
+        assert statement_operation("\n  insert into t values (1)") == "insert"
+        assert statement_operation("PRAGMA table_info(t)") == "other"
+        assert statement_operation("") == "other"
+
+
+if __name__ == "__main__":
+    unittest.main()
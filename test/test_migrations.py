@@ -0,0 +1,61 @@
+"""
+Implements tests for the alembic migrations
+"""
+import tempfile
+import unittest
+
+from database import Base, run_migrations
+from models import Movie
+from sqlalchemy import create_engine, inspect, text
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.tmp.name}/migrations.db")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def _index_names(self):
+        return {
+            index["name"]
+            for index in inspect(self.engine).get_indexes(Movie.__tablename__)
+        }
+
+    def test_upgrade_empty_database(self):
+        with self.engine.begin() as conn:
+            run_migrations(conn)
+
+        tables = set(inspect(self.engine).get_table_names())
+        assert {Movie.__tablename__, "britetest_users", "alembic_version"} <= tables
+        assert f"ix_{Movie.__tablename__}_title_id" in self._index_names()
+
+    def test_upgrade_database_created_without_migrations(self):
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX ix_{Movie.__tablename__}_title_id"))
+            conn.execute(
+                text(
+                    f"INSERT INTO {Movie.__tablename__} (imdbid, title) "
+                    "VALUES ('tt0096895', 'Batman')"
+                )
+            )
+
+        with self.engine.begin() as conn:
+            run_migrations(conn)
+
+        assert f"ix_{Movie.__tablename__}_title_id" in self._index_names()
+        with self.engine.connect() as conn:
+            count = conn.execute(text(f"SELECT count(*) FROM {Movie.__tablename__}"))
+            assert count.scalar() == 1
+
+    def test_models_match_migrations(self):
+        from alembic.autogenerate import compare_metadata
+        from alembic.migration import MigrationContext
+
+        with self.engine.begin() as conn:
+            run_migrations(conn)
+            diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+        assert diff == []
@@ -0,0 +1,57 @@
+"""
+Implements tests for omdb_cache.py module
+"""
+import os
+import tempfile
+import unittest
+
+from omdb_cache import OMDBResponseCache
+from unittest import mock
+
+
+class TestOMDBResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = OMDBResponseCache(
+            os.path.join(self.tmp.name, "omdb.db"), ttl=100, negative_ttl=10
+        )
+
+    def tearDown(self):
+        self.cache.connection.close()
+        self.tmp.cleanup()
+
+    def test_key_ignores_apikey_and_case(self):
+        assert OMDBResponseCache.key(
+            {"t": " Batman ", "apikey": "123"}
+        ) == OMDBResponseCache.key({"T": "batman"})
+        assert OMDBResponseCache.key({"t": "Batman"}) != OMDBResponseCache.key(
+            {"t": "Batman", "y": 1989}
+        )
+
+    @mock.patch("omdb_cache.time.time")
+    def test_get_set(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.set({"t": "Batman", "apikey": "123"}, {"Title": "Batman"})
+        self.cache.set({"t": "Unknown"}, {"Response": "False"})
+        assert self.cache.get({"t": "batman"}) == {"Title": "Batman"}
+        assert self.cache.get({"t": "Unknown"}) == {"Response": "False"}
+
+        # negative responses expire first
+        mock_time.return_value = 1050
+        assert self.cache.get({"t": "Unknown"}) is None
+        assert self.cache.get({"t": "Batman"}) == {"Title": "Batman"}
+
+        mock_time.return_value = 1100
+        assert self.cache.get({"t": "Batman"}) is None
+
+    def test_dump_and_warm(self):
+        self.cache.set({"i": "tt0096895"}, {"Title": "Batman"})
+        path = os.path.join(self.tmp.name, "omdb.jsonl")
+        assert self.cache.dump_to_file(path) == 1
+
+        other = OMDBResponseCache(
+            os.path.join(self.tmp.name, "other.db"), ttl=100, negative_ttl=10
+        )
+        assert other.warm_from_file(path) == 1
+        assert other.get({"i": "tt0096895"}) == {"Title": "Batman"}
+        other.connection.close()
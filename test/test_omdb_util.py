@@ -1,17 +1,30 @@
 """
 Implements tests for omdb_util.py module
 """
+import asyncio
+import httpx
+import omdb_util as omdb_util_module
+import threading
+import time
 import unittest
 import os
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 from fastapi import HTTPException
-from omdb_util import OMDBUtil
+from omdb_util import (
+    AsyncOMDBUtil,
+    CircuitBreaker,
+    Coalescer,
+    OMDBUtil,
+    RateLimiter,
+)
 
 
 class TestOMDBUtil(unittest.TestCase):
     def setUp(self):
         os.environ["OMDB_API_KEY"] = "12345678"
+        omdb_util_module._circuit_breakers.clear()
 
     def tearDown(self):
         del os.environ["OMDB_API_KEY"]
@@ -72,3 +85,248 @@ class TestOMDBUtil(unittest.TestCase):
             headers={"Accept": "application/json"},
             params={"i": "tt4154664", "apikey": "12345678"},
         )
+
+    @mock.patch("omdb_util.OMDBUtil._create_request_session")
+    def test_query_omdb_cached(self, mock_create_request_session):
+        omdb_util = OMDBUtil()
+        omdb_util.response_cache = mock.MagicMock()
+        omdb_util.response_cache.get.return_value = {"Title": "Batman"}
+
+        result = omdb_util.query_omdb({"t": "Batman"})
+
+        self.assertDictEqual(result, {"Title": "Batman"})
+        mock_create_request_session().get.assert_not_called()
+
+    @mock.patch("omdb_util.OMDBUtil._create_request_session")
+    def test_query_omdb_cached_not_found(self, mock_create_request_session):
+        omdb_util = OMDBUtil()
+        omdb_util.response_cache = mock.MagicMock()
+        omdb_util.response_cache.get.return_value = {"Response": "False"}
+
+        with self.assertRaises(HTTPException):
+            omdb_util.query_omdb({"t": "Unknown"})
+        mock_create_request_session().get.assert_not_called()
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_disabled(self):
+        rate_limiter = RateLimiter(0)
+        assert [rate_limiter.reserve() for _ in range(100)] == [0] * 100
+
+    def test_reserve(self):
+        rate_limiter = RateLimiter(10)
+        delays = [rate_limiter.reserve() for _ in range(12)]
+        # a full bucket lets the first burst through, then callers queue
+        assert delays[:10] == [0] * 10
+        assert 0.05 < delays[10] < 0.15
+        assert 0.15 < delays[11] < 0.25
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(0.5, 4, window=60, open_seconds=30)
+
+    def assert_rejected(self):
+        with self.assertRaises(HTTPException) as e:
+            self.breaker.before_request()
+        assert e.exception.status_code == 503
+        assert int(e.exception.headers["Retry-After"]) >= 1
+
+    def test_opens_on_failure_rate(self):
+        for failed in (True, False, True):
+            self.breaker.before_request()
+            self.breaker.record(failed)
+        # too few queries to judge
+        assert self.breaker.state == CircuitBreaker.CLOSED
+        self.breaker.before_request()
+        self.breaker.record(False)
+        assert self.breaker.state == CircuitBreaker.OPEN
+        self.assert_rejected()
+
+    def test_half_open_probe(self):
+        opened = omdb_util_module.circuit_opened_total.get()
+        for _ in range(4):
+            self.breaker.record(True)
+        assert omdb_util_module.circuit_opened_total.get() == opened + 1
+
+        self.breaker.opened_at -= 30
+        self.breaker.before_request()
+        assert self.breaker.state == CircuitBreaker.HALF_OPEN
+        # one probe at a time
+        self.assert_rejected()
+        self.breaker.record(True)
+        assert self.breaker.state == CircuitBreaker.OPEN
+        self.assert_rejected()
+
+        self.breaker.opened_at -= 30
+        self.breaker.before_request()
+        self.breaker.record(False)
+        assert self.breaker.state == CircuitBreaker.CLOSED
+        self.breaker.before_request()
+
+    def test_old_outcomes_expire(self):
+        self.breaker.window = 0
+        for _ in range(8):
+            self.breaker.record(True)
+        assert self.breaker.state == CircuitBreaker.CLOSED
+
+    def test_disabled(self):
+        breaker = CircuitBreaker(0, 1, window=60, open_seconds=30)
+        for _ in range(10):
+            breaker.before_request()
+            breaker.record(True)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestCoalescer(unittest.TestCase):
+    def test_concurrent_fetches_share_one(self):
+        coalescer = Coalescer()
+        coalesced = omdb_util_module.coalesced_total.get("sync")
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"Title": "Batman"}
+
+        with ThreadPoolExecutor(4) as pool:
+            leader = pool.submit(coalescer.run, "batman", fetch)
+            started.wait(5)
+            followers = [pool.submit(coalescer.run, "batman", fetch) for _ in range(3)]
+            # counted once they found the fetch in flight
+            deadline = time.monotonic() + 5
+            while omdb_util_module.coalesced_total.get("sync") < coalesced + 3:
+                assert time.monotonic() < deadline
+                time.sleep(0.001)
+            release.set()
+            results = [leader.result()] + [f.result() for f in followers]
+
+        assert results == [{"Title": "Batman"}] * 4
+        assert calls == [1]
+        assert coalescer.in_flight == {}
+        # the next query is sent again
+        coalescer.run("batman", fetch)
+        assert calls == [1, 1]
+
+
+class TestAsyncOMDBUtil(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        os.environ["OMDB_API_KEY"] = "12345678"
+        omdb_util_module._circuit_breakers.clear()
+        self.requests = []
+        self.responses = []
+
+    def tearDown(self):
+        del os.environ["OMDB_API_KEY"]
+
+    def _create_client(self):
+        def handler(request):
+            self.requests.append(request)
+            status_code, body = self.responses.pop(0)
+            return httpx.Response(status_code, json=body)
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def test_query_omdb(self):
+        mocked_movie_data = {"Title": "Captain Marvel", "Response": "True"}
+        self.responses = [(200, mocked_movie_data)]
+        with mock.patch.object(AsyncOMDBUtil, "_create_client", self._create_client):
+            result = await AsyncOMDBUtil().query_omdb({"t": "Captain Marvel"})
+
+        self.assertDictEqual(result, mocked_movie_data)
+        assert dict(self.requests[0].url.params) == {
+            "t": "Captain Marvel",
+            "apikey": "12345678",
+        }
+
+    async def test_query_omdb_cache(self):
+        loop_thread = threading.get_ident()
+        threads = []
+        cache = mock.MagicMock()
+        cache.get.side_effect = lambda params: threads.append(threading.get_ident())
+        cache.set.side_effect = lambda params, response: threads.append(
+            threading.get_ident()
+        )
+        mocked_movie_data = {"Title": "Captain Marvel", "Response": "True"}
+        self.responses = [(200, mocked_movie_data)]
+        with mock.patch.object(AsyncOMDBUtil, "_create_client", self._create_client):
+            omdb_util = AsyncOMDBUtil()
+            omdb_util.response_cache = cache
+            result = await omdb_util.query_omdb({"t": "Captain Marvel"})
+
+            self.assertDictEqual(result, mocked_movie_data)
+            cache.set.assert_called_once_with(mock.ANY, mocked_movie_data)
+            # the sqlite file isn't touched on the event loop
+            assert len(threads) == 2 and loop_thread not in threads
+
+            cache.get.side_effect = None
+            cache.get.return_value = {"Response": "False"}
+            with self.assertRaises(HTTPException):
+                await omdb_util.query_omdb({"t": "Unknown"})
+            assert len(self.requests) == 1
+
+    async def test_query_omdb_retry(self):
+        retries = omdb_util_module.retries_total.get("async")
+        mocked_movie_data = {"Title": "Captain Marvel", "Response": "True"}
+        self.responses = [(503, {}), (502, {}), (200, mocked_movie_data)]
+        with mock.patch.object(AsyncOMDBUtil, "_create_client", self._create_client):
+            omdb_util = AsyncOMDBUtil()
+            omdb_util.retry_backoff_factor = 0
+            result = await omdb_util.query_omdb({"t": "Captain Marvel"})
+
+        self.assertDictEqual(result, mocked_movie_data)
+        assert len(self.requests) == 3
+        assert omdb_util_module.retries_total.get("async") - retries == 2
+
+    async def test_query_omdb_retries_exhausted(self):
+        self.responses = [(500, {})] * 6
+        with mock.patch.object(AsyncOMDBUtil, "_create_client", self._create_client):
+            omdb_util = AsyncOMDBUtil()
+            omdb_util.retry_backoff_factor = 0
+            with self.assertRaises(httpx.HTTPStatusError):
+                await omdb_util.query_omdb({"t": "Captain Marvel"})
+
+        assert len(self.requests) == 6
+
+    async def test_query_omdb_coalesced(self):
+        coalesced = omdb_util_module.coalesced_total.get("async")
+        mocked_movie_data = {"Title": "Captain Marvel", "Response": "True"}
+        self.responses = [(200, mocked_movie_data)]
+        with mock.patch.object(AsyncOMDBUtil, "_create_client", self._create_client):
+            omdb_util = AsyncOMDBUtil()
+            results = await asyncio.gather(
+                omdb_util.query_omdb({"t": "Captain Marvel"}),
+                omdb_util.query_omdb({"t": "captain marvel "}),
+            )
+
+        assert results == [mocked_movie_data, mocked_movie_data]
+        assert len(self.requests) == 1
+        assert omdb_util_module.coalesced_total.get("async") == coalesced + 1
+        assert omdb_util.coalescer.in_flight == {}
+
+    async def test_query_omdb_circuit_open(self):
+        self.responses = [(500, {})] * 6
+        with mock.patch.dict(
+            os.environ, {"OMDB_BREAKER_MIN_REQUESTS": "1"}
+        ), mock.patch.object(AsyncOMDBUtil, "_create_client", self._create_client):
+            omdb_util = AsyncOMDBUtil()
+            omdb_util.retry_backoff_factor = 0
+            with self.assertRaises(httpx.HTTPStatusError):
+                await omdb_util.query_omdb({"t": "Captain Marvel"})
+            with self.assertRaises(HTTPException) as e:
+                await omdb_util.query_omdb({"t": "Batman"})
+
+        assert e.exception.status_code == 503
+        # failed fast without a request
+        assert len(self.requests) == 6
+
+    async def test_query_omdb_failure(self):
+        not_found = omdb_util_module.errors_total.get("async", "not_found")
+        self.responses = [(200, {"Response": "False", "Error": "Item not found"})]
+        with mock.patch.object(AsyncOMDBUtil, "_create_client", self._create_client):
+            with self.assertRaises(HTTPException):
+                await AsyncOMDBUtil().query_omdb({"i": "tt4154664"})
+        assert omdb_util_module.errors_total.get("async", "not_found") == not_found + 1
@@ -1,9 +1,12 @@
 """
 Implements tests for omdb_util.py module
 """
+import asyncio
 import unittest
 from unittest import mock
 
+from fastapi import HTTPException
+
 from operations import Operations
 
 
@@ -76,3 +79,115 @@ class TestOperations(unittest.TestCase):
             ]
         )
         assert len(resutl) == 3
+
+    @mock.patch("operations.Movie")
+    def test_get_movie_model_objects_from_omdb_response_partial_failure(self, _):
+        def query_omdb(params):
+            if params["i"] == "imdbid2":
+                raise HTTPException(404, detail="Movie Not Found in OMDB.")
+            return mock.MagicMock()
+
+        self.operations.omdb_util = mock.MagicMock()
+        self.operations.omdb_util.query_omdb.side_effect = query_omdb
+        result = self.operations.get_movie_model_objects_from_omdb_response(
+            {
+                "Search": [
+                    {"title": "movie1", "imdbID": "imdbid1"},
+                    {"title": "movie2", "imdbID": "imdbid2"},
+                    {"title": "movie3", "imdbID": "imdbid3"},
+                ]
+            }
+        )
+        assert len(result) == 2
+
+    @mock.patch("operations.Movie")
+    def test_get_100_movies_information_from_omdb_async(self, _):
+        async def query_omdb(params):
+            if "s" in params:
+                page = params["page"]
+                return {"Search": [{"imdbID": f"imdbid{page}-{i}"} for i in range(10)]}
+            if params["i"] == "imdbid1-2":
+                raise HTTPException(404, detail="Movie Not Found in OMDB.")
+            return mock.MagicMock()
+
+        self.operations.async_omdb_util = mock.MagicMock()
+        self.operations.async_omdb_util.query_omdb.side_effect = query_omdb
+        result = asyncio.run(
+            self.operations.get_100_movies_information_from_omdb_async()
+        )
+        assert self.operations.async_omdb_util.query_omdb.call_count == 110
+        assert len(result) == 99
+
+    def test_search_imdbids_async_configured_searches(self):
+        async def query_omdb(params):
+            if params["s"] == "empty":
+                raise HTTPException(404, detail="Movie not found!")
+            # both searches find the same movies
+            return {"Search": [{"imdbID": f"imdbid{params['page']}"}]}
+
+        with mock.patch.dict(
+            "os.environ",
+            {
+                "OMDB_SEED_SEARCH_TERMS": "batman, empty,superman",
+                "OMDB_SEED_PAGES": "2",
+            },
+        ):
+            operations = Operations(self.mock_patch_omdb_util)
+        operations.async_omdb_util = mock.MagicMock()
+        operations.async_omdb_util.query_omdb.side_effect = query_omdb
+        result = asyncio.run(operations.search_imdbids_async())
+        assert [
+            (call.args[0]["s"], call.args[0]["page"])
+            for call in operations.async_omdb_util.query_omdb.call_args_list
+        ] == [
+            ("batman", 1),
+            ("batman", 2),
+            ("empty", 1),
+            ("empty", 2),
+            ("superman", 1),
+            ("superman", 2),
+        ]
+        assert result == ["imdbid1", "imdbid2"]
+
+    def test_get_movies_info_by_imdbid_async(self):
+        async def query_omdb(params):
+            if params["i"] == "tt0000000":
+                raise HTTPException(404, detail="Incorrect IMDb ID.")
+            return mock.MagicMock()
+
+        self.operations.async_omdb_util = mock.MagicMock()
+        self.operations.async_omdb_util.query_omdb.side_effect = query_omdb
+        with mock.patch("operations.Movie"):
+            result = asyncio.run(
+                self.operations.get_movies_info_by_imdbid_async(
+                    ["tt0096895", "tt0000000"]
+                )
+            )
+        assert list(result) == ["tt0096895", "tt0000000"]
+        assert isinstance(result["tt0000000"], HTTPException)
+        assert not isinstance(result["tt0096895"], Exception)
+
+    def test_get_movies_info_async(self):
+        async def query_omdb(params):
+            if params["t"] == "Unknown":
+                raise HTTPException(404, detail="Movie Not Found in OMDB.")
+            return mock.MagicMock()
+
+        self.operations.async_omdb_util = mock.MagicMock()
+        self.operations.async_omdb_util.query_omdb.side_effect = query_omdb
+        with mock.patch("operations.Movie"):
+            result = asyncio.run(
+                self.operations.get_movies_info_async(["Batman", "Unknown"])
+            )
+        assert list(result) == ["Batman", "Unknown"]
+        assert isinstance(result["Unknown"], HTTPException)
+        assert not isinstance(result["Batman"], Exception)
+
+    def test_get_movie_info_by_imdbid_async(self):
+        self.operations.async_omdb_util = mock.MagicMock()
+        self.operations.async_omdb_util.query_omdb = mock.AsyncMock()
+        with mock.patch("operations.Movie"):
+            asyncio.run(self.operations.get_movie_info_by_imdbid_async("tt0096895"))
+        self.operations.async_omdb_util.query_omdb.assert_called_with(
+            {"i": "tt0096895"}
+        )
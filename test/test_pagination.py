@@ -0,0 +1,123 @@
+"""
+Implements tests for pagination.py module
+"""
+import json
+import serializers
+import unittest
+
+from fastapi import HTTPException
+from fastapi_pagination import Page, Params
+from models import Movie
+from pagination import (
+    decode_cursor,
+    encode_cursor,
+    encode_page,
+    paginate_by_cursor,
+    paginate_by_offset,
+    parse_fields,
+    title_span,
+)
+from sqlalchemy import select
+from test.helpers import DatabaseTestCase
+
+
+class TestPagination(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        # two movies share a title so the id breaks the tie
+        titles = ["Movie B", "Movie A", "Movie C", "Movie B", "Movie E", "Movie D"]
+        self.session.add_all(
+            Movie(imdbid=f"tt{i}", title=title) for i, title in enumerate(titles)
+        )
+        await self.session.commit()
+
+    async def test_paginate_forward_and_back(self):
+        first = await paginate_by_cursor(self.session, 4)
+        assert [m.imdbid for m in first["items"]] == ["tt1", "tt0", "tt3", "tt2"]
+        assert first["previous_cursor"] is None
+
+        second = await paginate_by_cursor(self.session, 4, first["next_cursor"])
+        assert [m.imdbid for m in second["items"]] == ["tt5", "tt4"]
+        assert second["next_cursor"] is None
+
+        back = await paginate_by_cursor(self.session, 4, second["previous_cursor"])
+        assert [m.imdbid for m in back["items"]] == ["tt1", "tt0", "tt3", "tt2"]
+        assert back["previous_cursor"] is None
+        assert back["next_cursor"] is not None
+
+    async def test_title_span(self):
+        first = await paginate_by_cursor(self.session, 2)
+        assert title_span(first) == (None, "Movie B")
+
+        cursor = first["next_cursor"]
+        second = await paginate_by_cursor(self.session, 2, cursor)
+        assert title_span(second, cursor) == ("Movie B", "Movie C")
+
+        cursor = second["previous_cursor"]
+        back = await paginate_by_cursor(self.session, 2, cursor)
+        assert title_span(back, cursor) == (None, "Movie B")
+
+    async def test_encode_page_matches_pydantic(self):
+        movies = (await self.session.execute(select(Movie))).scalars().all()
+        for movie in movies:
+            movie.year, movie.genre, movie.released = 2000, "Drama", "01 Jan 2000"
+            movie.language, movie.director, movie.writer = "English", "Dïrector", "W"
+            movie.actors = 'Actor "One", Actor Two'
+        await self.session.commit()
+
+        page = await paginate_by_offset(self.session, Params(page=2, size=4))
+        assert [m.imdbid for m in page["items"]] == ["tt5", "tt4"]
+        expected = Page[serializers.Movie](
+            items=[
+                serializers.Movie.model_validate(movie, from_attributes=True)
+                for movie in page["items"]
+            ],
+            total=6,
+            page=2,
+            size=4,
+            pages=2,
+        )
+        assert encode_page(page) == expected.model_dump_json().encode()
+
+        page = await paginate_by_cursor(self.session, 4)
+        expected = serializers.MovieCursorPage.model_validate(
+            page, from_attributes=True
+        )
+        assert encode_page(page) == expected.model_dump_json().encode()
+
+    async def test_paginate_fields(self):
+        fields = parse_fields("imdbid")
+        first = await paginate_by_cursor(self.session, 4, fields=fields)
+        second = await paginate_by_cursor(self.session, 4, first["next_cursor"], fields)
+        assert json.loads(encode_page(second, fields))["items"] == [
+            {"imdbid": "tt5"},
+            {"imdbid": "tt4"},
+        ]
+        page = await paginate_by_offset(self.session, Params(page=1, size=1), fields)
+        assert json.loads(encode_page(page, fields))["items"] == [{"imdbid": "tt1"}]
+
+    async def test_paginate_invalid_size(self):
+        with self.assertRaises(HTTPException):
+            await paginate_by_cursor(self.session, 0)
+
+
+class TestFields(unittest.TestCase):
+    def test_parse_fields(self):
+        assert parse_fields(None) == tuple(serializers.Movie.model_fields)
+        assert parse_fields("year, title,id,title") == ("id", "title", "year")
+        for fields in ["title,plot", ","]:
+            with self.assertRaises(HTTPException) as e:
+                parse_fields(fields)
+            assert e.exception.status_code == 400
+
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor(Movie(id=7, title="Batman"), "next")
+        assert decode_cursor(cursor) == ("Batman", 7, "next")
+
+    def test_invalid_cursor(self):
+        for cursor in ["not a cursor", encode_cursor(Movie(id=7), "sideways")]:
+            with self.assertRaises(HTTPException) as e:
+                decode_cursor(cursor)
+            assert e.exception.status_code == 400
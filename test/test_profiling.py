@@ -0,0 +1,99 @@
+"""
+Implements tests for profiling.py module
+"""
+import os
+import profiling
+import tempfile
+import unittest
+
+from database import instrument_queries
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from test.helpers import sqlite_engine
+from unittest import mock
+
+
+class TestProfileStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = profiling.ProfileStore(self.tmp.name, maxsize=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_keeps_newest(self):
+        for id in ("20260101T000000-a", "20260103T000000-c", "20260102T000000-b"):
+            self.store.save({"id": id, "report": "", "statements": []})
+        assert self.store.ids() == ["20260103T000000-c", "20260102T000000-b"]
+        assert self.store.summaries(limit=1) == [{"id": "20260103T000000-c"}]
+        assert self.store.get("20260101T000000-a") is None
+        assert self.store.get("../20260103T000000-c") is None
+
+
+class TestProfilingMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = sqlite_engine(self.tmp.name)
+        instrument_queries(self.engine.sync_engine)
+        app = FastAPI()
+
+        @app.get("/slow")
+        async def slow_route():
+            async with self.engine.connect() as conn:
+                await conn.execute(text("select 1"))
+                await conn.execute(text("select 2"))
+            return {}
+
+        self.app = app
+        self.store = profiling.ProfileStore(f"{self.tmp.name}/profiles", 10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def client(self):
+        self.app.add_middleware(profiling.ProfilingMiddleware, store=self.store)
+        return TestClient(self.app)
+
+    @mock.patch.dict(os.environ, {"PROFILE_HEADER": "X-Profile"})
+    def test_header_profiles_request(self):
+        client = self.client()
+        client.get("/slow")
+        assert self.store.ids() == []
+
+        assert client.get("/slow?x=1", headers={"x-profile": "1"}).status_code == 200
+        (profile_id,) = self.store.ids()
+        profile = self.store.get(profile_id)
+        assert (profile["method"], profile["path"], profile["query"]) == (
+            "GET",
+            "/slow",
+            "x=1",
+        )
+        assert profile["status"] == 200
+        assert [s["statement"] for s in profile["statements"]] == [
+            "select 1",
+            "select 2",
+        ]
+        assert profile["statement_count"] == 2
+        assert "slow_route" in profile["report"]
+
+    @mock.patch.dict(
+        os.environ, {"PROFILE_SAMPLE_RATE": "1", "PROFILE_THRESHOLD_MS": "60000"}
+    )
+    def test_sampled_requests_below_threshold_are_dropped(self):
+        client = self.client()
+        client.get("/slow")
+        assert self.store.ids() == []
+
+    @mock.patch.dict(
+        os.environ, {"PROFILE_SAMPLE_RATE": "1", "PROFILE_THRESHOLD_MS": "0"}
+    )
+    def test_sampled_requests_above_threshold_are_kept(self):
+        client = self.client()
+        client.get("/slow")
+        client.get("/slow")
+        assert len(self.store.ids()) == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Implements tests for refresh.py module
+"""
+import refresh
+import unittest
+
+from datetime import datetime, timedelta
+from models import Movie
+from sqlalchemy import select
+from test.helpers import DatabaseTestCase, FakeOperations
+
+
+class TestRefresh(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.refreshed = []
+        self.operations = FakeOperations()
+        self.refresher = refresh.CatalogueRefresher(
+            self.operations, self.sessions, on_refreshed=self.refreshed.extend
+        )
+        self.refresher.batch_size = 2
+
+    async def asyncTearDown(self):
+        await self.refresher.stop()
+        await super().asyncTearDown()
+
+    async def titles(self):
+        rows = await self.session.execute(
+            select(Movie.imdbid, Movie.title).order_by(Movie.id)
+        )
+        await self.session.commit()
+        return dict(rows.all())
+
+    async def test_upsert_movies_updates_by_imdbid(self):
+        first = await refresh.upsert_movies(
+            self.session,
+            [Movie(imdbid="tt1", title="Old"), Movie(imdbid="tt2", title="Other")],
+        )
+        again = await refresh.upsert_movies(
+            self.session,
+            [Movie(imdbid="tt1", title="Older"), Movie(imdbid="tt1", title="New")],
+        )
+        assert [(movie.imdbid, movie.title) for movie in again] == [("tt1", "New")]
+        assert again[0].id == first[0].id
+        assert await self.titles() == {"tt1": "New", "tt2": "Other"}
+        assert await refresh.upsert_movies(self.session, []) == []
+
+    async def test_run_once_fetches_only_new_movies(self):
+        await refresh.upsert_movies(
+            self.session,
+            [Movie(imdbid="tt1", title="Stored", fetched_at=datetime.utcnow())],
+        )
+        self.operations.search_results = ["tt1", "tt2", "tt3", "unknown"]
+
+        counts = await self.refresher.run_once()
+
+        assert counts == {"added": 2, "refreshed": 0, "failed": 1}
+        assert self.operations.fetched == ["tt2", "tt3", "unknown"]
+        assert await self.titles() == {
+            "tt1": "Stored",
+            "tt2": "tt2 v1",
+            "tt3": "tt3 v1",
+        }
+        assert [movie.imdbid for movie in self.refreshed] == ["tt2", "tt3"]
+        assert all(movie.id for movie in self.refreshed)
+
+    async def test_run_once_refreshes_stale_rows(self):
+        old = datetime.utcnow() - timedelta(seconds=self.refresher.max_age + 60)
+        await refresh.upsert_movies(
+            self.session,
+            [
+                Movie(imdbid="tt1", title="Fresh", fetched_at=datetime.utcnow()),
+                Movie(imdbid="tt2", title="Old", fetched_at=old),
+                Movie(imdbid="tt3", title="Never"),
+                Movie(imdbid="tt4", title="Fresh", fetched_at=datetime.utcnow()),
+                Movie(imdbid="unknown", title="Gone", fetched_at=old),
+            ],
+        )
+        self.operations.generation = 2
+
+        counts = await self.refresher.run_once()
+
+        assert counts == {"added": 0, "refreshed": 2, "failed": 1}
+        assert self.operations.fetched == ["tt2", "tt3", "unknown"]
+        assert await self.titles() == {
+            "tt1": "Fresh",
+            "tt2": "tt2 v2",
+            "tt3": "tt3 v2",
+            "tt4": "Fresh",
+            "unknown": "Gone",
+        }
+        # refreshed rows aren't stale anymore
+        self.operations.fetched = []
+        counts = await self.refresher.run_once()
+        assert counts == {"added": 0, "refreshed": 0, "failed": 1}
+        assert self.operations.fetched == ["unknown"]
+
+    async def test_start_without_interval_does_nothing(self):
+        self.refresher.interval = 0
+        self.refresher.start()
+        assert self.refresher.task is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Implements tests for search_index.py module
+"""
+import unittest
+
+from search_index import SearchIndex, tokenize
+from types import SimpleNamespace
+
+
+def movie(id, title, genre="Drama", year=2000, actors="", director="", writer=""):
+    return SimpleNamespace(
+        id=id,
+        title=title,
+        genre=genre,
+        year=year,
+        actors=actors,
+        director=director,
+        writer=writer,
+    )
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.build(
+            [
+                movie(1, "Batman", "Action, Adventure", 1989, actors="Michael Keaton"),
+                movie(
+                    2, "Batman Returns", "Action, Crime", 1992, director="Tim Burton"
+                ),
+                movie(3, "Beetlejuice", "Comedy, Fantasy", 1988, director="Tim Burton"),
+                movie(4, "Ed Wood", "Biography, Drama", 1994, director="Tim Burton"),
+            ]
+        )
+
+    def ids(self, *args, **kwargs):
+        return [id for id, _ in self.index.search(*args, **kwargs)["hits"]]
+
+    def test_tokenize(self):
+        assert tokenize("Spider-Man: No Way Home") == [
+            "spider",
+            "man",
+            "no",
+            "way",
+            "home",
+        ]
+        assert tokenize(None) == []
+
+    def test_ranking(self):
+        # a title match ranks above a match in another field
+        self.index.add(movie(5, "Keaton", actors="Someone Else"))
+        assert self.ids("keaton") == [5, 1]
+        assert set(self.ids("batman")) == {1, 2}
+
+    def test_every_word_has_to_match(self):
+        assert self.ids("tim burton batman") == [2]
+        assert self.ids("batman wood") == []
+
+    def test_prefix(self):
+        assert set(self.ids("bat")) == {1, 2}
+        assert self.ids("beetle") == [3]
+        # an exact word ranks above words it is the prefix of
+        self.index.add(movie(6, "Ed", genre=""))
+        self.index.add(movie(7, "Eddie", genre=""))
+        assert self.ids("ed") == [4, 6, 7]
+
+    def test_facets(self):
+        found = self.index.search("burton")
+        assert found["total"] == 3
+        assert found["facets"]["genre"]["Drama"] == 1
+        assert found["facets"]["year"] == {1992: 1, 1988: 1, 1994: 1}
+
+        found = self.index.search("burton", genre="comedy")
+        assert [id for id, _ in found["hits"]] == [3]
+        assert found["facets"]["genre"] == {"Comedy": 1, "Fantasy": 1}
+        assert self.ids("", year=1989) == [1]
+        assert len(self.ids("", limit=10)) == 4
+
+    def test_paging(self):
+        everything = self.ids("", limit=10)
+        assert self.ids("", limit=2, offset=2) == everything[2:]
+
+    def test_add_and_remove(self):
+        self.index.add(movie(8, "Mars Attacks!", director="Tim Burton"))
+        assert 8 in self.ids("mars")
+        assert self.index.remove(8)
+        assert self.ids("mars") == []
+        assert "mars" not in self.index.words
+        assert not self.index.remove(8)
+
+    def test_changes_during_build_are_kept(self):
+        self.index.begin_build()
+        self.index.add(movie(9, "Big Fish"))
+        self.index.remove(4)
+        # the snapshot read before the changes were made
+        self.index.build([movie(4, "Ed Wood"), movie(1, "Batman")])
+        assert self.ids("fish") == [9]
+        assert self.ids("wood") == []
+        assert self.index.built
+
+    def test_abort_build(self):
+        self.index.begin_build()
+        self.index.add(movie(9, "Big Fish"))
+        self.index.abort_build()
+        assert self.index.pending is None
+        self.index.remove(9)
+        assert self.index.pending is None
@@ -0,0 +1,99 @@
+"""
+Implements tests for seeding.py module
+"""
+import leases
+import refresh
+import seeding
+import unittest
+
+from models import Lease, Movie
+from sqlalchemy import func, select
+from unittest import mock
+from test.helpers import DatabaseTestCase, FakeOperations
+
+
+class TestSeeder(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.operations = FakeOperations(["tt1", "tt2", "tt3"])
+        refresher = refresh.CatalogueRefresher(self.operations, self.sessions)
+        refresher.batch_size = 2
+        self.done = []
+        self.seeder = seeding.Seeder(refresher, self.sessions, on_done=self.on_done)
+
+    async def asyncTearDown(self):
+        await self.seeder.stop()
+        await super().asyncTearDown()
+
+    async def on_done(self):
+        self.done.append(True)
+
+    async def count(self):
+        async with self.sessions() as db:
+            return (await db.execute(select(func.count(Movie.id)))).scalar()
+
+    async def test_seeds_empty_table(self):
+        assert self.seeder.status()["state"] == seeding.PENDING
+        self.seeder.start()
+        await self.seeder.task
+
+        status = self.seeder.status()
+        assert status["state"] == seeding.DONE
+        assert (status["found"], status["added"], status["failed"]) == (3, 3, 0)
+        assert status["finished_at"] is not None
+        assert await self.count() == 3
+        assert self.done == [True]
+        # the lease is released
+        async with self.sessions() as db:
+            assert await db.get(Lease, seeding.LEASE) is None
+
+    async def test_skips_seeded_table(self):
+        async with self.sessions() as db:
+            db.add(Movie(imdbid="tt9", title="Stored"))
+            await db.commit()
+        await self.seeder.mark_seeded()
+
+        assert await self.seeder.run_once()
+        assert self.operations.fetched == []
+
+    async def test_completes_partial_seed(self):
+        # left by a seed which died after its first batch
+        async with self.sessions() as db:
+            db.add(Movie(imdbid="tt1", title="tt1"))
+            await db.commit()
+
+        assert await self.seeder.run_once()
+        assert self.operations.fetched == ["tt2", "tt3"]
+        assert await self.count() == 3
+        assert await self.seeder.is_seeded()
+
+    async def test_omdb_unavailable(self):
+        # failed searches are logged and skipped
+        self.operations.search_results = []
+        with self.assertRaises(RuntimeError):
+            await self.seeder.run_once()
+        assert not await self.seeder.is_seeded()
+
+        self.operations.search_results = ["tt1"]
+        assert await self.seeder.run_once()
+        assert await self.count() == 1
+
+    async def test_waits_for_other_process(self):
+        with mock.patch.object(leases, "owner", return_value="other:1"):
+            async with self.sessions() as db:
+                await leases.acquire(db, seeding.LEASE, 60)
+
+        assert not await self.seeder.run_once()
+        assert self.seeder.status()["state"] == seeding.WAITING
+        assert self.operations.fetched == []
+
+        # the other process is done
+        async with self.sessions() as db:
+            db.add(Movie(imdbid="tt9", title="Seeded"))
+            await db.commit()
+        await self.seeder.mark_seeded()
+        assert await self.seeder.run_once()
+
+
+if __name__ == "__main__":
+    unittest.main()